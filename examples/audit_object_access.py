@@ -31,35 +31,11 @@ def create_id_name_dict(listobjectheaders_response):
 def get_permissions_for_all_objects(object_type, listobjectheaders_response, permission_type='DEFINED',
                                     dependent_share=True):
     id_map = create_id_name_dict(listobjectheaders_response)
-    # Because the GUIDs pass in the URL, there is a limit to how many can be requested at a time
-    # Must batch through the full set, make whatever number of requests, then put the whole thing together
-    batch_size = 20
+    # The GUIDs pass in the URL, but the library splits long lists into as many requests as needed (run in parallel)
+    # and puts the responses back together, so the whole list can be requested at once
     guids_list = list(id_map.keys())
-    # Reverse the list so that pop can run from the end of the list, more efficient
-    guids_list.reverse()
-    # Pop out the first elements in the batch size
-    guids_to_retrieve = []
-    for i in range(batch_size):
-        guids_to_retrieve.append(guids_list.pop())
-    # Get the first permissions object, we'll add the elements from subsequent calls to it
-    perms = ts.security_metadata_permissions(object_type=object_type, object_guids=guids_to_retrieve,
+    perms = ts.security_metadata_permissions(object_type=object_type, object_guids=guids_list,
                                              dependent_share=dependent_share, permission_type=permission_type)
-    # The pop() action is reducing the list size so that eventually it will be at 0
-    while len(guids_list) > 0:
-        guids_to_retrieve = []
-        for i in range(batch_size):
-            # pop() throws IndexError once List is empty
-            try:
-                guids_to_retrieve.append(guids_list.pop())
-            # break the loop after the last item
-            except IndexError:
-                break
-        # Request the next batch of permissions by GUID
-        next_perms = ts.security_metadata_permissions(object_type=object_type, object_guids=guids_to_retrieve,
-                                                      dependent_share=dependent_share, permission_type=permission_type)
-        for p in next_perms:
-            perms[p] = next_perms[p]
-
     return perms
 
 
@@ -0,0 +1,113 @@
+# Compares the JSON codecs available to TSRestApiV1 / TSRestApiV2 (json_codec argument) on synthetic payloads
+# shaped like the large responses of metadata/search and metadata/tml/export, without needing a server
+#
+#   python json_codec_benchmark.py > bench_output.txt
+#
+# Install orjson and / or ujson first to include them in the comparison
+
+import json
+import time
+import uuid
+
+from thoughtspot_rest_api_v1.codec import JsonCodec, OrjsonCodec, UjsonCodec, orjson, ujson
+
+
+def metadata_search_payload(object_count: int) -> bytes:
+    objects = []
+    for i in range(object_count):
+        guid = str(uuid.uuid4())
+        objects.append({
+            'metadata_id': guid,
+            'metadata_name': 'Liveboard {}'.format(i),
+            'metadata_type': 'LIVEBOARD',
+            'metadata_obj_id': None,
+            'dependent_objects': None,
+            'incomplete_objects': None,
+            'metadata_detail': None,
+            'metadata_header': {
+                'id': guid,
+                'name': 'Liveboard {}'.format(i),
+                'description': 'Sales by region and quarter ' * 3,
+                'author': str(uuid.uuid4()),
+                'authorName': 'analyst_{}'.format(i % 50),
+                'created': 1700000000000 + i,
+                'modified': 1710000000000 + i,
+                'isDeleted': False,
+                'isHidden': False,
+                'tags': [{'id': str(uuid.uuid4()), 'name': 'tag_{}'.format(i % 10)}],
+                'owner': str(uuid.uuid4())
+            },
+            'visualization_headers': None,
+            'stats': None
+        })
+    return json.dumps(objects).encode('utf-8')
+
+
+def tml_export_payload(object_count: int, viz_per_object: int = 20) -> bytes:
+    # TML export returns every object as a JSON string inside the 'edoc' key of the envelope
+    objects = []
+    for i in range(object_count):
+        guid = str(uuid.uuid4())
+        edoc = {
+            'guid': guid,
+            'liveboard': {
+                'name': 'Liveboard {}'.format(i),
+                'visualizations': [{
+                    'id': 'Viz_{}'.format(v),
+                    'answer': {
+                        'name': 'Answer {}'.format(v),
+                        'tables': [{'id': 'Sales', 'name': 'Sales', 'fqn': str(uuid.uuid4())}],
+                        'search_query': '[Revenue] [Region] [Date].quarterly top 10',
+                        'answer_columns': [{'name': 'Revenue'}, {'name': 'Region'}, {'name': 'Quarter(Date)'}],
+                        'table': {'table_columns': [{'column_id': 'Revenue', 'headline_aggregation': 'SUM'}],
+                                  'ordered_column_ids': ['Region', 'Quarter(Date)', 'Revenue']},
+                        'chart': {'type': 'COLUMN', 'chart_columns': [{'column_id': 'Revenue'}],
+                                  'client_state_v2': '{"version": "V4DOT2", "chartProperties": {}}' * 5},
+                        'display_mode': 'CHART_MODE'
+                    }
+                } for v in range(viz_per_object)]
+            }
+        }
+        objects.append({
+            'info': {'name': 'Liveboard {}'.format(i), 'filename': 'lb_{}.liveboard.tml'.format(i), 'id': guid,
+                     'type': 'pinboard', 'status': {'status_code': 'OK'}},
+            'edoc': json.dumps(edoc)
+        })
+    return json.dumps({'object': objects}).encode('utf-8')
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    codecs = [JsonCodec()]
+    if orjson is not None:
+        codecs.append(OrjsonCodec())
+    if ujson is not None:
+        codecs.append(UjsonCodec())
+
+    payloads = {
+        'metadata/search (20k objects)': metadata_search_payload(20000),
+        'metadata/tml/export (500 liveboards)': tml_export_payload(500)
+    }
+
+    for payload_name, payload in payloads.items():
+        print('{} : {:.1f} MB'.format(payload_name, len(payload) / 1024 / 1024))
+        decoded = json.loads(payload)
+        for codec in codecs:
+            loads = best_of(lambda: codec.loads(payload))
+            loads_ordered = best_of(lambda: codec.loads(payload, ordered=True))
+            dumps = best_of(lambda: codec.dumps(decoded))
+            print('  {:8} loads {:7.1f} ms   loads (OrderedDict) {:7.1f} ms   dumps {:7.1f} ms'.format(
+                codec.name, loads * 1000, loads_ordered * 1000, dumps * 1000))
+
+
+if __name__ == '__main__':
+    run()
@@ -15,20 +15,18 @@ server = os.getenv('server')        # or type in yourself
 
 dest_org_name = 'Customer A'
 # Create two org objects, one for org0 and one of the destination org, to insure separation
-# in the actions
+# in the actions. OrgClientPool gives a client per org with its own token, all sharing one connection pool
 #
 # If you are doing transfer from non-primary org (org 0) to another, you may use the below to retrieve BOTH
 # org IDs from org0, then create an orig_org object along with dest_org below
 #
 
-org0: TSRestApiV2 = TSRestApiV2(server_url=server)
-try:
-    auth_token_response = org0.auth_token_full(username=username, password=password,
-                                               validity_time_in_sec=3000, org_id=0)
-    org0.bearer_token = auth_token_response['token']
-except requests.exceptions.HTTPError as e:
-    print(e)
-    print(e.response.content)
+ts: TSRestApiV2 = TSRestApiV2(server_url=server)
+orgs = OrgClientPool(ts, username=username, password=password, validity_time_in_sec=3000)
+org0 = orgs.client(0)
+login_errors = orgs.login([0])
+if login_errors[0] is not None:
+    print(login_errors[0])
     exit()
 
 # Get the org_id for the destination org (must be an admin level account)
@@ -50,15 +48,7 @@ else:
 
 
 # Create dest_org object using the org_id retrieved from request to primary org
-dest_org = TSRestApiV2 = TSRestApiV2(server_url=server)
-try:
-    auth_token_response = dest_org.auth_token_full(username=username, password=password, validity_time_in_sec=3000,
-                                                   org_id=dest_org_id)
-    dest_org.bearer_token = auth_token_response['token']
-except requests.exceptions.HTTPError as e:
-    print(e)
-    print(e.response.content)
-    exit()
+dest_org = orgs.client(dest_org_id)
 
 
 def create_new_connection_from_primary(connection_to_replicate, new_connection_name, new_connection_password):
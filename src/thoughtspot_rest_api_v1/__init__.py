@@ -4,5 +4,19 @@ from .tsrestapiv1 import (
     ShareModes, Privileges, PermissionTypes, MetadataTypes, MetadataSubtypes, GroupVisibility
 )
 from .tsrestapiv2 import TSRestApiV2, ReportTypes, TSTypesV2
+from .tsrestapiv2async import TSRestApiV2Async
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter, TokenBucket
+from .auth import BearerTokenManager, TrustedAuthTokenBroker
+from .cache import ResponseCache
+from .singleflight import RequestCoalescer
+from .orgs import OrgClientPool, OrgFanOutExecutor
+from .instrumentation import RequestRecord, LatencyHistogram, PrometheusFileExporter
+from .codec import JsonCodec, get_json_codec
+from .tml_export import TmlExporter
+from .tml_import import TmlImportJobManager
+from .tml_deploy import TmlDependencyGraph, TmlWaveImporter, IncrementalTmlDeployer
+from .resolver import GuidResolver
+from .snapshot import MetadataSnapshot
 from .details_objects import *
 from ._version import __version__
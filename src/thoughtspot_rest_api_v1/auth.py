@@ -0,0 +1,300 @@
+#
+# Bearer token lifecycle for long-running TSRestApiV2 / TSRestApiV1 jobs
+#
+# A token from auth_token_full() stops working once validity_time_in_sec has passed, and a job that outlives it fails
+# with 401 halfway through. BearerTokenManager holds the current token with its expiry time and fetches a new one
+# refresh_margin seconds before it expires: on a background thread when started, otherwise on the first request
+# inside the margin. Attached to a client, every request is sent with the current token, and a 401 triggers a single
+# refresh no matter how many threads received it, after which the request is sent once more:
+#
+#     ts = TSRestApiV2(server_url=server)
+#     ts.token_manager = BearerTokenManager.for_auth_token_full(ts, username=username, secret_key=secret_key,
+#                                                               validity_time_in_sec=3600)
+#     ts.token_manager.start()
+#
+# TrustedAuthTokenBroker is for embedding backends, which mint a token (auth_token_full / auth_token_object /
+# auth_token_custom with the secret_key) for every page view. It caches the tokens per user, org, object and ABAC
+# parameters until shortly before they expire, in a bounded LRU, and concurrent requests for the same token share one
+# call to the server
+#
+# fetch_token is always a plain (blocking) function. TSRestApiV2Async calls it on a worker thread, so it can be the
+# auth_token_full of a sync TSRestApiV2
+#
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import json
+import threading
+import time
+
+# Lifetime assumed for a token when fetch_token returns only the token string, or a response without expiry times
+DEFAULT_TOKEN_VALIDITY_SECONDS = 300
+
+
+def token_expiry(response: Union[str, Dict], fetched_at: float, validity: float) -> float:
+    """
+    time.time() at which a token from an auth/token/* response expires
+    """
+    if isinstance(response, dict):
+        if response.get('expiration_time_in_millis') is not None:
+            return response['expiration_time_in_millis'] / 1000.0
+        if response.get('creation_time_in_millis') is not None:
+            return response['creation_time_in_millis'] / 1000.0 + validity
+    return fetched_at + validity
+
+
+class BearerTokenManager:
+    """
+    - fetch_token: called to get a new token. Returns the token string, or the Dict response of auth_token_full /
+      auth_token_custom, whose expiration_time_in_millis (or creation_time_in_millis + validity) sets the expiry
+    - refresh_margin: seconds before the expiry at which the token is refreshed
+    - token_validity: lifetime in seconds used when the response has no expiry time
+
+    token() is cheap and safe to call from many threads. Refreshes happen under a lock, one at a time
+    """
+    def __init__(self, fetch_token: Callable[[], Union[str, Dict]], refresh_margin: float = 60.0,
+                 token_validity: float = DEFAULT_TOKEN_VALIDITY_SECONDS):
+        self.fetch_token = fetch_token
+        self.refresh_margin = refresh_margin
+        self.token_validity = token_validity
+        self._lock = threading.Lock()
+        # Set on the thread running fetch_token, whose own request must not wait for the refresh it is part of
+        self._refreshing = threading.local()
+        self._token: Optional[str] = None
+        # time.time() at which the current token expires
+        self._expires_at = 0.0
+        self.refresh_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def for_auth_token_full(cls, ts, username: str, password: Optional[str] = None, secret_key: Optional[str] = None,
+                            org_id: Optional[int] = None, validity_time_in_sec: int = 300,
+                            refresh_margin: Optional[float] = None) -> 'BearerTokenManager':
+        """
+        Manager fetching its tokens with ts.auth_token_full(). The margin defaults to 10% of the validity, at
+        least 5 seconds
+        """
+        def fetch_token() -> Dict:
+            return ts.auth_token_full(username=username, password=password, secret_key=secret_key, org_id=org_id,
+                                      validity_time_in_sec=validity_time_in_sec)
+        if refresh_margin is None:
+            refresh_margin = max(validity_time_in_sec * 0.1, 5.0)
+        return cls(fetch_token=fetch_token, refresh_margin=refresh_margin, token_validity=validity_time_in_sec)
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def _refresh(self) -> str:
+        # Called with self._lock held
+        self._refreshing.active = True
+        try:
+            fetched_at = time.time()
+            response = self.fetch_token()
+        finally:
+            self._refreshing.active = False
+        token = response['token'] if isinstance(response, dict) else response
+        self._expires_at = token_expiry(response, fetched_at, self.token_validity)
+        self._token = token
+        self.refresh_count += 1
+        return token
+
+    def refreshing_on_this_thread(self) -> bool:
+        """
+        True while fetch_token runs on the calling thread, e.g. for the auth/token/full request of
+        for_auth_token_full(), which goes through the same client and must not be sent with the old token
+        """
+        return getattr(self._refreshing, 'active', False)
+
+    def needs_refresh(self) -> bool:
+        return self._token is None or time.time() >= self._expires_at - self.refresh_margin
+
+    def token(self) -> Optional[str]:
+        """
+        The current token, refreshed first if it is missing or within refresh_margin of its expiry. Threads arriving
+        during a refresh use the current token if it has not expired yet, otherwise they wait for the refresh
+        """
+        if self.refreshing_on_this_thread():
+            return self._token
+        if not self.needs_refresh():
+            return self._token
+        # Inside the margin but not expired: keep using the current token while another thread refreshes it
+        if self._token is not None and time.time() < self._expires_at:
+            if not self._lock.acquire(blocking=False):
+                return self._token
+        else:
+            self._lock.acquire()
+        try:
+            if self.needs_refresh():
+                self._refresh()
+            return self._token
+        finally:
+            self._lock.release()
+
+    def refresh_after_unauthorized(self, rejected_token: str) -> Optional[str]:
+        """
+        Called when a request sent with rejected_token got a 401. Only the first caller for a given token fetches a
+        new one; the others get the token it fetched
+        """
+        if self.refreshing_on_this_thread():
+            return None
+        with self._lock:
+            if self._token != rejected_token:
+                return self._token
+            return self._refresh()
+
+    #
+    # Background refresh
+    #
+    def start(self):
+        """
+        Starts a daemon thread that refreshes the token refresh_margin seconds before it expires, so requests never
+        wait for a token. Fetches the first token immediately, raising any error from fetch_token
+        """
+        if self._thread is not None:
+            return
+        self.token()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ts-token-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        retry_delay = 1.0
+        while True:
+            wait = max(self._expires_at - self.refresh_margin - time.time(), 0.0)
+            if self._stop.wait(wait):
+                return
+            try:
+                with self._lock:
+                    if self.needs_refresh():
+                        self._refresh()
+                retry_delay = 1.0
+            except Exception:
+                # Requests still refresh on demand; try again shortly rather than spin
+                if self._stop.wait(retry_delay):
+                    return
+                retry_delay = min(retry_delay * 2, 60.0)
+
+
+class TrustedAuthTokenBroker:
+    """
+    Mints trusted authentication tokens with a TSRestApiV2 object and the secret_key, caching them per
+    (token type, username, org_id, object_id, other arguments such as ABAC parameters):
+
+        broker = TrustedAuthTokenBroker(ts, secret_key=secret_key, validity_time_in_sec=600)
+        token = broker.full_token(username='jane', org_id=2)
+        token = broker.custom_token(username='jane', additional_request_parameters={'parameters': [...]})
+
+    - refresh_margin: a cached token is returned only if it is valid for at least this many more seconds, so the
+      browser receives a token with time left to use it
+    - max_entries: the least recently used tokens are dropped beyond this number
+
+    hits, misses and coalesced (requests that waited for the same token being minted by another thread) are counted
+    """
+    def __init__(self, ts, secret_key: str, validity_time_in_sec: int = 300, refresh_margin: float = 30.0,
+                 max_entries: int = 10000):
+        self.ts = ts
+        self.secret_key = secret_key
+        self.validity_time_in_sec = validity_time_in_sec
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key: (token, expires_at), least recently used first
+        self._cache: 'OrderedDict[Tuple, Tuple[str, float]]' = OrderedDict()
+        self._in_flight: Dict[Tuple, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def cache_key(token_type: str, username: str, org_id: Optional[int], object_id: Optional[str],
+                  token_args: Dict) -> Tuple:
+        # Canonical JSON, so the same ABAC parameters in a different key order share a token
+        return (token_type, username, org_id, object_id, json.dumps(token_args, sort_keys=True, default=str))
+
+    def _mint(self, token_type: str, username: str, org_id: Optional[int], object_id: Optional[str],
+              token_args: Dict) -> Dict:
+        args = dict(token_args)
+        args.update({'username': username, 'org_id': org_id, 'secret_key': self.secret_key,
+                     'validity_time_in_sec': self.validity_time_in_sec})
+        if token_type == 'object':
+            return self.ts.auth_token_object(object_id=object_id, **args)
+        if token_type == 'custom':
+            return self.ts.auth_token_custom(**args)
+        return self.ts.auth_token_full(**args)
+
+    def token(self, token_type: str, username: str, org_id: Optional[int] = None, object_id: Optional[str] = None,
+              **token_args: Any) -> str:
+        """
+        token_type is 'full', 'object' or 'custom'. token_args are the other arguments of the auth_token_* method
+        """
+        key = self.cache_key(token_type, username, org_id, object_id, token_args)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.time() < cached[1] - self.refresh_margin:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            fetched_at = time.time()
+            response = self._mint(token_type, username, org_id, object_id, token_args)
+            token = response['token'] if isinstance(response, dict) else response
+            expires_at = token_expiry(response, fetched_at, self.validity_time_in_sec)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self._cache[key] = (token, expires_at)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        future.set_result(token)
+        return token
+
+    def full_token(self, username: str, org_id: Optional[int] = None, **token_args: Any) -> str:
+        return self.token('full', username=username, org_id=org_id, **token_args)
+
+    def object_token(self, username: str, object_id: str, org_id: Optional[int] = None, **token_args: Any) -> str:
+        return self.token('object', username=username, org_id=org_id, object_id=object_id, **token_args)
+
+    def custom_token(self, username: str, org_id: Optional[int] = None, **token_args: Any) -> str:
+        return self.token('custom', username=username, org_id=org_id, **token_args)
+
+    def invalidate(self, username: Optional[str] = None):
+        """
+        Drops the cached tokens of username (e.g. after changing their groups), or every cached token
+        """
+        with self._lock:
+            if username is None:
+                self._cache.clear()
+                return
+            for key in [k for k in self._cache if k[1] == username]:
+                del self._cache[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses,
+                    'coalesced': self.coalesced}
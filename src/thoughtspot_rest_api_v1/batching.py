@@ -0,0 +1,142 @@
+#
+# Splitting of requests that would be too large into several smaller ones
+#
+# For the V1 GET endpoints that take a JSON list of GUIDs in the URL (metadata/details,
+# security/metadata/permissions, dependency/*): servers and proxies reject URLs past a certain length (commonly
+# 8 KB), so the list is split into chunks sized to the real encoded URL. The chunks are requested in parallel by
+# the client and merge_responses() puts the results back together in the shape a single call returns
+#
+# For TML import: chunk_by_size() groups TML files into request bodies of a bounded size
+#
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import quote_plus, urlencode
+import json
+
+# Stays under the 8 KB request line limit of common servers and proxies, with room for the HTTP method and version
+DEFAULT_MAX_URL_LENGTH = 7500
+
+
+def split_ids_for_url(url: str, url_params: Dict, ids_param: str, ids: List[str],
+                      max_url_length: int = DEFAULT_MAX_URL_LENGTH) -> List[List[str]]:
+    """
+    Splits ids into chunks so that url + url_params + {ids_param: json.dumps(chunk)} stays under max_url_length
+    once encoded the way requests encodes query parameters. A single id too long to fit gets a chunk of its own
+    """
+    if len(ids) == 0:
+        return [ids]
+
+    base_length = len(url) + 1 + len(urlencode(url_params))
+    if len(url_params) > 0:
+        base_length += 1  # '&' before ids_param
+    # '<ids_param>=' plus the encoded '[' and ']'
+    base_length += len(quote_plus(ids_param)) + 1 + len(quote_plus('[]'))
+    separator_length = len(quote_plus(', '))
+
+    chunks = []
+    chunk = []
+    length = base_length
+    for id in ids:
+        id_length = len(quote_plus(json.dumps(id)))
+        added_length = id_length if len(chunk) == 0 else id_length + separator_length
+        if len(chunk) > 0 and length + added_length > max_url_length:
+            chunks.append(chunk)
+            chunk = []
+            length = base_length
+            added_length = id_length
+        chunk.append(id)
+        length += added_length
+    chunks.append(chunk)
+    return chunks
+
+
+def merge_responses(responses: List[Any]) -> Any:
+    """
+    Merges the responses of the chunks into one: lists are concatenated and objects merged key by key (recursively),
+    so {'storables': [...]} and {guid: {...}} responses come out as if from a single request
+    """
+    merged = responses[0]
+    for response in responses[1:]:
+        merged = _merge(merged, response)
+    return merged
+
+
+def _merge(a: Any, b: Any) -> Any:
+    if isinstance(a, list) and isinstance(b, list):
+        return a + b
+    if isinstance(a, dict) and isinstance(b, dict):
+        merged = dict(a)
+        for k, v in b.items():
+            merged[k] = _merge(merged[k], v) if k in merged else v
+        return merged
+    # Scalars (debug info, flags): the first response wins
+    return a
+
+
+def json_item_size(item: str) -> int:
+    # Encoded string plus the ', ' separator in a JSON list
+    return len(json.dumps(item).encode('utf-8')) + 2
+
+
+def form_item_size(item: str) -> int:
+    # As above, once form-encoded (V1 sends the JSON list as a form field)
+    return len(quote_plus(json.dumps(item))) + len(quote_plus(', '))
+
+
+def chunk_by_size(items: List[str], max_bytes: Optional[int], max_items: Optional[int] = None,
+                  size_of: Callable[[str], int] = json_item_size) -> List[List[int]]:
+    """
+    Groups the strings (e.g. TML files for a metadata/tml/import body) into chunks whose encoded size (size_of) stays
+    under max_bytes, and with at most max_items each. Returns the indexes of items for each chunk, in input order, so
+    the responses can be mapped back. An item larger than max_bytes gets a chunk of its own. None means no limit
+    """
+    chunks = []
+    chunk = []
+    size = 0
+    for index, item in enumerate(items):
+        item_size = size_of(item) if max_bytes is not None else 0
+        full = max_items is not None and len(chunk) >= max_items
+        if len(chunk) > 0 and (full or (max_bytes is not None and size + item_size > max_bytes)):
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+        chunk.append(index)
+        size += item_size
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks
+
+
+#
+# metadata/tml/import responses: V2 returns a list with one object per TML, V1 {'object': [...]}, and the async
+# import {'task_id': ...}
+#
+def tml_import_has_errors(response: Any) -> bool:
+    objects = response.get('object', []) if isinstance(response, dict) else response
+    if not isinstance(objects, list):
+        return False
+    for obj in objects:
+        status = obj.get('response', obj).get('status', {}) if isinstance(obj, dict) else {}
+        if status.get('status_code') == 'ERROR':
+            return True
+    return False
+
+
+def tml_import_not_sent(count: int) -> List[Dict]:
+    # Stands in for the objects of chunks that were not sent because an earlier ALL_OR_NONE chunk failed
+    return [{'response': {'status': {'status_code': 'ERROR',
+                                     'error_message': 'Not imported: an earlier chunk of the import failed'}}}
+            for _ in range(count)]
+
+
+def merge_tml_import_responses(responses: List[Any]) -> Any:
+    """
+    Merges the responses of the chunks of one import, in input order. Async import responses are merged into the
+    first, with 'task_ids' listing the task of every chunk
+    """
+    if all(isinstance(r, list) for r in responses):
+        return [obj for r in responses for obj in r]
+    if all(isinstance(r, dict) and 'task_id' in r for r in responses):
+        merged = dict(responses[0])
+        merged['task_ids'] = [r['task_id'] for r in responses]
+        return merged
+    return merge_responses(responses)
@@ -0,0 +1,197 @@
+#
+# Read-through cache for the responses of read-only endpoints, for TSRestApiV1, TSRestApiV2 and TSRestApiV2Async
+#
+# Scripts often ask for the same system configuration, orgs, tags, roles or metadata headers many times in one run.
+# With a ResponseCache set on a client, successful responses of the endpoints in `ttls` are kept for their TTL and
+# returned without a request. Entries are keyed by method, URL, request body and the caller's credentials
+# (Authorization and Cookie headers, so each user and org has its own entries). Any other POST / PUT / DELETE sent by
+# a client using the cache drops the entries of its endpoint family, the first part of the path, once it has succeeded:
+# tags/create invalidates tags/search, admin/configinfo/update invalidates admin/configinfo. A read that was already in
+# flight when the family was invalidated is not cached, as it may have been answered before the change:
+#
+#     ts.response_cache = ResponseCache()
+#     ts.response_cache = ResponseCache(ttls={'system/config': 600, 'metadata/search': 0}, max_bytes=128 * 1024 * 1024)
+#
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Dict, Mapping, Optional, Tuple
+import hashlib
+import threading
+import time
+
+import requests
+
+from .ratelimit import endpoint_from_url
+from .endpoints import is_read_only_endpoint
+
+# Endpoint patterns (V1 and V2, fnmatch-style as in RateLimiter) and seconds to keep their responses
+DEFAULT_CACHE_TTLS = {
+    'system': 300,
+    'system/config': 300,
+    'admin/configinfo': 300,
+    'session/info': 60,
+    'auth/session/user': 60,
+    'orgs/search': 60,
+    'tags/search': 60,
+    'roles/search': 60,
+    'metadata/search': 30,
+}
+
+# Families whose entries are also dropped by a mutating call in another family. '*' drops everything, e.g. switching
+# org in a V1 session, which keeps the same cookie
+DEFAULT_CACHE_INVALIDATES = {
+    'tags': ('metadata',),
+    'security': ('metadata',),
+    'session': ('*',),
+}
+
+
+def endpoint_family(endpoint: str) -> str:
+    return endpoint.split('/', 1)[0]
+
+
+def request_key(method: str, url: str, body, headers: Mapping[str, str]) -> Tuple:
+    """
+    Identifies a request by method, URL, body and the credentials sent (hashed Authorization and Cookie headers)
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    credentials = '{}\n{}'.format(headers.get('Authorization', ''), headers.get('Cookie', ''))
+    return (method, url, body, hashlib.sha256(credentials.encode('utf-8')).hexdigest())
+
+
+class ResponseCache:
+    """
+    - ttls: endpoint pattern: seconds. First matching pattern wins; a TTL of 0 disables caching for that endpoint
+    - max_bytes: total size of the cached response bodies. The least recently used entries are dropped beyond it
+    - invalidates: extra families to drop on a mutating call, see DEFAULT_CACHE_INVALIDATES
+
+    Thread-safe; can be shared by several clients of the same server. hits and misses are counted per pattern
+    """
+    def __init__(self, ttls: Optional[Mapping[str, float]] = None, max_bytes: int = 64 * 1024 * 1024,
+                 invalidates: Optional[Mapping[str, Tuple[str, ...]]] = None):
+        self.ttls = dict(DEFAULT_CACHE_TTLS)
+        if ttls is not None:
+            # Given patterns are checked before the defaults
+            self.ttls = dict(ttls, **{k: v for k, v in self.ttls.items() if k not in ttls})
+        self.max_bytes = max_bytes
+        self.invalidates = dict(invalidates) if invalidates is not None else dict(DEFAULT_CACHE_INVALIDATES)
+        self._lock = threading.Lock()
+        # key: (response, expires_at, size, family)
+        self._entries: 'OrderedDict[Tuple, Tuple[requests.Response, float, int, str]]' = OrderedDict()
+        self._bytes = 0
+        # Bumped by invalidate(): responses to reads started before an invalidation are not stored
+        self._generation = 0
+        self._family_generations: Dict[str, int] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.invalidations = 0
+
+    def ttl_for_endpoint(self, endpoint: str) -> Tuple[Optional[str], float]:
+        for pattern, ttl in self.ttls.items():
+            if fnmatchcase(endpoint, pattern):
+                return pattern, ttl
+        return None, 0
+
+    @staticmethod
+    def key(method: str, url: str, body, headers: Mapping[str, str]) -> Tuple:
+        return request_key(method, url, body, headers)
+
+    def generation(self, url: str) -> Tuple[int, int]:
+        """
+        Taken before sending a cacheable request and passed to put(), which ignores the response if the family of
+        url was invalidated in between
+        """
+        family = endpoint_family(endpoint_from_url(url))
+        with self._lock:
+            return self._generation, self._family_generations.get(family, 0)
+
+    def get(self, method: str, url: str, body, headers: Mapping[str, str]
+            ) -> Tuple[Optional[Tuple], Optional[requests.Response]]:
+        """
+        Returns (key, cached response). key is None for a request that is not cached. A None response with a key is a
+        miss: pass the response received to put()
+        """
+        endpoint = endpoint_from_url(url)
+        pattern, ttl = self.ttl_for_endpoint(endpoint)
+        if pattern is None or ttl <= 0 or not is_read_only_endpoint(method, endpoint):
+            return None, None
+
+        key = self.key(method, url, body, headers)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits[pattern] = self.hits.get(pattern, 0) + 1
+                return key, entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses[pattern] = self.misses.get(pattern, 0) + 1
+        return key, None
+
+    def put(self, key: Tuple, url: str, response: requests.Response, generation: Optional[Tuple[int, int]] = None):
+        if not 200 <= response.status_code < 300:
+            return
+        endpoint = endpoint_from_url(url)
+        pattern, ttl = self.ttl_for_endpoint(endpoint)
+        size = len(response.content) + len(key[2] or b'')
+        if pattern is None or size > self.max_bytes:
+            return
+        family = endpoint_family(endpoint)
+        with self._lock:
+            if generation is not None and generation != (self._generation, self._family_generations.get(family, 0)):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (response, time.monotonic() + ttl, size, family)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def response_received(self, method: str, url: str, status_code: int):
+        """
+        Called with the response of a request that was not cached: a successful mutating call invalidates its family
+        """
+        endpoint = endpoint_from_url(url)
+        if 200 <= status_code < 300 and not is_read_only_endpoint(method, endpoint):
+            self.invalidate(endpoint_family(endpoint))
+
+    def _remove(self, key: Tuple):
+        # Called with self._lock held
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def invalidate(self, family: Optional[str] = None):
+        """
+        Drops the entries of an endpoint family (e.g. 'tags') and the families it invalidates, or all entries
+        """
+        families = {family} if family is not None else {'*'}
+        if family is not None:
+            families.update(self.invalidates.get(family, ()))
+        with self._lock:
+            if '*' in families:
+                self._generation += 1
+                keys = list(self._entries)
+            else:
+                for f in families:
+                    self._family_generations[f] = self._family_generations.get(f, 0) + 1
+                keys = [k for k, entry in self._entries.items() if entry[3] in families]
+            for key in keys:
+                self._remove(key)
+            if len(keys) > 0:
+                self.invalidations += 1
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': sum(self.hits.values()),
+                'misses': sum(self.misses.values()),
+                'invalidations': self.invalidations,
+                'hits_by_endpoint': dict(self.hits),
+                'misses_by_endpoint': dict(self.misses)
+            }
@@ -0,0 +1,119 @@
+#
+# JSON encoding / decoding used by TSRestApiV1 and TSRestApiV2
+#
+# The stdlib json module is always available. orjson and ujson are used when installed and requested, and are
+# several times faster on the very large responses of metadata/search, metadata/tml/export, etc.:
+#
+#     ts = TSRestApiV2(server_url=server, json_codec='auto')   # fastest installed library
+#
+# Decoding errors are always raised as requests.exceptions.JSONDecodeError, matching response.json()
+#
+from collections import OrderedDict
+from typing import Any, Union
+import json
+
+import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _decode_error(e: Exception, data) -> requests.exceptions.JSONDecodeError:
+    doc = data.decode('utf-8', errors='replace') if isinstance(data, (bytes, bytearray)) else data
+    return requests.exceptions.JSONDecodeError(str(e), doc, getattr(e, 'pos', 0) or 0)
+
+
+class JsonCodec:
+    """
+    stdlib json implementation, and the interface for the others:
+
+    - loads(data, ordered=False): data is bytes or str. ordered=True returns OrderedDict for every JSON object
+      (plain dicts keep key order too, so this is only needed when the OrderedDict type itself is expected)
+    - dumps(obj): returns bytes, ready to send as a request body
+    """
+    name = 'json'
+
+    def loads(self, data: Union[bytes, str], ordered: bool = False) -> Any:
+        try:
+            if ordered:
+                return json.loads(data, object_pairs_hook=OrderedDict)
+            return json.loads(data)
+        except ValueError as e:
+            raise _decode_error(e, data) from e
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    def dumps_str(self, obj: Any) -> str:
+        return self.dumps(obj).decode('utf-8')
+
+    def __repr__(self):
+        return '{}()'.format(type(self).__name__)
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed: pip install orjson")
+
+    def loads(self, data: Union[bytes, str], ordered: bool = False) -> Any:
+        # Building OrderedDicts afterwards is slower than the stdlib's object_pairs_hook
+        if ordered:
+            return super().loads(data, ordered=True)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise _decode_error(e, data) from e
+
+    def dumps(self, obj: Any) -> bytes:
+        # OPT_NON_STR_KEYS matches the stdlib, which accepts int keys in the TML / request dicts
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise ImportError("ujson is not installed: pip install ujson")
+
+    def loads(self, data: Union[bytes, str], ordered: bool = False) -> Any:
+        if ordered:
+            return super().loads(data, ordered=True)
+        try:
+            return ujson.loads(data)
+        except ValueError as e:
+            raise _decode_error(e, data) from e
+
+    def dumps(self, obj: Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+
+def get_json_codec(codec: Union[str, JsonCodec, None] = 'json') -> JsonCodec:
+    """
+    codec: a JsonCodec instance, or one of 'json' (stdlib), 'orjson', 'ujson', or 'auto' for the fastest installed
+    """
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec is None or codec == 'json':
+        return JsonCodec()
+    if codec == 'orjson':
+        return OrjsonCodec()
+    if codec == 'ujson':
+        return UjsonCodec()
+    if codec == 'auto':
+        if orjson is not None:
+            return OrjsonCodec()
+        if ujson is not None:
+            return UjsonCodec()
+        return JsonCodec()
+    raise ValueError("Unknown json_codec '{}', use 'json', 'orjson', 'ujson' or 'auto'".format(codec))
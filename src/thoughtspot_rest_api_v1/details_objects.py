@@ -2,72 +2,185 @@ from typing import Optional, Dict, List, Union
 #
 # Helper objects to help with parsing the very complex metadata/details responses
 #
+# The wrappers read fields from the response only when asked for, and keep what they read in __slots__. With
+# compact=True (or after compact()), the fields are read up front and the response itself is released, so auditing
+# thousands of objects keeps only the small parts used rather than every full response. The objects created by one
+# from_details_response() call share a single copy of equal GUID strings and of equal privilege / group lists:
+#
+#     response = ts.metadata_details(object_type=TSTypes.LIVEBOARD, object_guids=guids)
+#     for liveboard in LiveboardDetails.from_details_response(response, compact=True):
+#         print(liveboard.name(), liveboard.referenced_data_sources())
+#
+
+_UNSET = object()
+
+
+def shared_tuple(values, shared: Optional[Dict] = None) -> tuple:
+    """
+    values as a tuple. With shared (a Dict used as a pool), equal strings and equal tuples are kept once: many users
+    and groups have identical privilege and group lists. The pool lives as long as the objects using it, not longer
+    """
+    if shared is None:
+        return tuple(values)
+    values = tuple(shared.setdefault(v, v) if isinstance(v, str) else v for v in values)
+    try:
+        return shared.setdefault(values, values)
+    except TypeError:
+        # Unhashable items (Dicts) cannot be shared
+        return values
+
+
+def storables(details_response: Union[Dict, List]) -> List[Dict]:
+    # metadata/details returns {'storables': [one object per GUID]}
+    if isinstance(details_response, dict):
+        return details_response.get('storables', [details_response])
+    return details_response
 
 
-class UserDetails:
-    def __init__(self, details_obj):
+class _Details:
+    __slots__ = ('details_obj', '_shared')
+    # Read by compact() before releasing details_obj
+    _compact_fields = ()
+
+    def __init__(self, details_obj, compact: bool = False, shared: Optional[Dict] = None):
+        # A full metadata/details response is reduced to its first object
+        if isinstance(details_obj, dict) and 'storables' in details_obj:
+            details_obj = details_obj['storables'][0]
         self.details_obj = details_obj
+        self._shared = shared
+        if compact:
+            self.compact()
+
+    @classmethod
+    def from_details_response(cls, details_response: Union[Dict, List], compact: bool = False) -> List:
+        # One pool for the objects of this response, released with them
+        shared = {}
+        return [cls(s, compact=compact, shared=shared) for s in storables(details_response)]
+
+    def _tuple(self, values) -> tuple:
+        return shared_tuple(values, self._shared)
+
+    def _field(self, slot: str, read):
+        value = getattr(self, slot)
+        if value is _UNSET:
+            if self.details_obj is None:
+                raise ValueError("{} was not read before compact()".format(slot.lstrip('_')))
+            value = read(self.details_obj)
+            setattr(self, slot, value)
+        return value
+
+    def compact(self):
+        """
+        Reads the fields of _compact_fields and drops the reference to the full response
+        """
+        for method in self._compact_fields:
+            getattr(self, method)()
+        self.details_obj = None
+        # Every field is read: the values stay shared, the pool itself is no longer needed here
+        self._shared = None
+        return self
+
+
+class UserDetails(_Details):
+    __slots__ = ('_privileges', '_assigned_groups', '_inherited_groups', '_header', '_state', '_is_superuser')
+    _compact_fields = ('privileges', 'assigned_groups', 'inherited_groups', 'user_info', 'state_of_user',
+                       'is_user_superuser')
+
+    def __init__(self, details_obj, compact: bool = False, shared: Optional[Dict] = None):
+        self._privileges = self._assigned_groups = self._inherited_groups = _UNSET
+        self._header = self._state = self._is_superuser = _UNSET
+        super().__init__(details_obj, compact=compact, shared=shared)
 
     def privileges(self) -> List[str]:
-        return self.details_obj['privileges']
+        return list(self._field('_privileges', lambda d: self._tuple(d['privileges'])))
 
     def assigned_groups(self) -> List[str]:
-        return self.details_obj['assignedGroups']
+        return list(self._field('_assigned_groups', lambda d: self._tuple(d['assignedGroups'])))
 
     def inherited_groups(self) -> List[str]:
-        return self.details_obj['inheritedGroups']
+        return list(self._field('_inherited_groups', lambda d: self._tuple(d['inheritedGroups'])))
 
     def state_of_user(self) -> str:
-        return self.details_obj['state']
+        return self._field('_state', lambda d: d['state'])
 
     def is_user_superuser(self) -> bool:
-        return self.details_obj['isSuperUser']
+        return self._field('_is_superuser', lambda d: d['isSuperUser'])
 
     def user_info(self) -> Dict:
-        return self.details_obj['header']
+        return self._field('_header', lambda d: d['header'])
 
     def display_name(self) -> str:
-        return self.details_obj['header']['displayName']
+        return self.user_info()['displayName']
 
     def username(self) -> str:
-        return self.details_obj['header']['name']
+        return self.user_info()['name']
 
     def created_timestamp(self) -> int:
-        return self.details_obj['header']['created']
+        return self.user_info()['created']
 
     def last_modified_timestamp(self) -> int:
-        return self.details_obj['header']['modified']
+        return self.user_info()['modified']
 
 
-class GroupDetails:
-    def __init__(self, details_obj):
-        self.details_obj = details_obj
+class GroupDetails(_Details):
+    __slots__ = ('_privileges', '_assigned_groups', '_inherited_groups')
+    _compact_fields = ('privileges', 'assigned_groups', 'inherited_groups')
+
+    def __init__(self, details_obj, compact: bool = False, shared: Optional[Dict] = None):
+        self._privileges = self._assigned_groups = self._inherited_groups = _UNSET
+        super().__init__(details_obj, compact=compact, shared=shared)
 
     def privileges(self):
-        return self.details_obj['privileges']
+        return list(self._field('_privileges', lambda d: self._tuple(d['privileges'])))
 
     # Does this even make sense?
     def assigned_groups(self):
-        return self.details_obj['assignedGroups']
+        return list(self._field('_assigned_groups', lambda d: self._tuple(d['assignedGroups'])))
 
     def inherited_groups(self):
-        return self.details_obj['inheritedGroups']
-
-
-class LiveboardDetails:
-    def __init__(self, details_obj):
-        self.details_obj = details_obj
-
-    #
-    # Not finished
-    #
-    def referenced_data_sources(self):
-        details = self.details_obj
-        # Once you get to the resolvedObjects part of the response, you have to iterate because the keys are the
-        # GUIDs of each answer on the pinboard
-        for ro in details["storables"][0]['header']['resolvedObjects']:
-            tables = details["storables"][0]['header']['resolvedObjects'][ro]['reportContent']["sheets"][0]['sheetContent']['visualizations'][0]['vizContent']['columns'] #['column'] ## ['referencedTableHeaders']
-            # can be multiple columns
-            # each column may or may not have a 'column' key to get to its inner contents
-            print(len(tables))
-            print(tables)
+        return list(self._field('_inherited_groups', lambda d: self._tuple(d['inheritedGroups'])))
+
+
+class LiveboardDetails(_Details):
+    __slots__ = ('_guid', '_name', '_data_sources')
+    _compact_fields = ('guid', 'name', 'referenced_data_source_names')
+
+    def __init__(self, details_obj, compact: bool = False, shared: Optional[Dict] = None):
+        self._guid = self._name = self._data_sources = _UNSET
+        super().__init__(details_obj, compact=compact, shared=shared)
+
+    def guid(self) -> str:
+        return self._field('_guid', lambda d: d['header']['id'])
+
+    def name(self) -> str:
+        return self._field('_name', lambda d: d['header']['name'])
+
+    def _read_data_sources(self, details: Dict) -> Dict[str, Optional[str]]:
+        # resolvedObjects is keyed by the GUIDs of the answers (visualizations) on the liveboard. Each column either
+        # has referencedTableHeaders itself or inside a 'column' key
+        sources = {}
+        resolved_objects = details.get('header', {}).get('resolvedObjects', {})
+        for resolved_object in resolved_objects.values():
+            for sheet in resolved_object.get('reportContent', {}).get('sheets', []):
+                for viz in sheet.get('sheetContent', {}).get('visualizations', []):
+                    for column in viz.get('vizContent', {}).get('columns', []):
+                        inner = column.get('column', column)
+                        for table in inner.get('referencedTableHeaders', []):
+                            if table.get('id') is not None and table['id'] not in sources:
+                                guid = table['id']
+                                if self._shared is not None:
+                                    guid = self._shared.setdefault(guid, guid)
+                                sources[guid] = table.get('name')
+        return sources
+
+    def referenced_data_source_names(self) -> Dict[str, Optional[str]]:
+        """
+        {table GUID: table name} of the tables / worksheets / models used by the visualizations of the liveboard
+        """
+        return dict(self._field('_data_sources', self._read_data_sources))
+
+    def referenced_data_sources(self) -> List[str]:
+        """
+        GUIDs of the tables / worksheets / models used by the visualizations, in the order first found
+        """
+        return list(self._field('_data_sources', self._read_data_sources))
@@ -0,0 +1,49 @@
+#
+# Which requests only read, shared by RetryPolicy (safe to send again), ResponseCache (can be cached, does not
+# invalidate anything) and RequestCoalescer (identical requests in flight can share one response)
+#
+# Patterns are fnmatch-style, matched against the endpoint path without the API prefix (see
+# ratelimit.endpoint_from_url), so 'metadata/tml/export' covers V1 and V2 alike
+#
+from fnmatch import fnmatchcase
+from typing import Iterable
+
+from .ratelimit import endpoint_from_url
+
+# Methods that can always be sent twice without changing anything on the server
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# POST endpoints that only read
+READ_ONLY_POST_ENDPOINTS = (
+    # V2
+    '*search',      # users/search, metadata/search, tags/search, vcs/git/commits/search ...
+    'searchdata',
+    'metadata/*/data',
+    'metadata/*/sql',
+    'metadata/tml/export',
+    'metadata/tml/export/batch',
+    'metadata/tml/async/status',
+    'security/*/fetch-permissions',
+    'report/*',
+    'logs/fetch',
+    # Not auth/token/full, object or custom: each call mints a new token, which must not be handed to another caller
+    'auth/token/validate',
+    # V1
+    'pinboarddata',
+    'export/pinboard/pdf',
+    'dependency/listdependents',
+    'security/effectivepermissionbulk',
+    'connection/fetch*',
+)
+
+
+def is_read_only_endpoint(method: str, endpoint: str,
+                          read_only_post_endpoints: Iterable[str] = READ_ONLY_POST_ENDPOINTS) -> bool:
+    method = method.upper()
+    if method in IDEMPOTENT_METHODS:
+        return True
+    return method == 'POST' and any(fnmatchcase(endpoint, p) for p in read_only_post_endpoints)
+
+
+def is_read_only(method: str, url: str, read_only_post_endpoints: Iterable[str] = READ_ONLY_POST_ENDPOINTS) -> bool:
+    return is_read_only_endpoint(method, endpoint_from_url(url), read_only_post_endpoints)
@@ -0,0 +1,295 @@
+#
+# Per-request instrumentation for TSRestApiV1, TSRestApiV2 and TSRestApiV2Async
+#
+# Every request made by a client produces one RequestRecord, which is passed to each hook registered with
+# add_instrumentation_hook(). A hook is any callable taking a RequestRecord. LatencyHistogram is a built-in hook
+# that aggregates in memory, and PrometheusFileExporter writes its contents in Prometheus text format, e.g. for the
+# node_exporter textfile collector:
+#
+#     histogram = LatencyHistogram()
+#     ts.add_instrumentation_hook(histogram)
+#     exporter = PrometheusFileExporter(histogram, '/var/lib/node_exporter/thoughtspot_api.prom')
+#     exporter.start(interval_seconds=15)
+#
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import re
+import threading
+import time
+
+from .ratelimit import endpoint_from_url
+
+# Endpoints where the URL contains an identifier that may be a name rather than a GUID
+ENDPOINT_TEMPLATES = (
+    'users/{}/update', 'users/{}/delete',
+    'groups/{}/update', 'groups/{}/delete',
+    'orgs/{}/update', 'orgs/{}/delete',
+    'tags/{}/update', 'tags/{}/delete',
+    'roles/{}/update', 'roles/{}/delete',
+    'schedules/{}/update', 'schedules/{}/delete',
+    'connections/{}/update', 'connections/{}/delete',
+    'customization/custom-actions/{}/update', 'customization/custom-actions/{}/delete',
+    'template/variables/{}/update', 'template/variables/{}/delete',
+    'vcs/git/branches/{}/pull', 'vcs/git/commits/{}/revert',
+    'ai/conversation/{}/converse',
+    'security/metadata/{}/permissions',
+    'session/orgs/users/{}',
+    'group/{}/user/{}', 'group/{}/users', 'user/{}/groups',
+    'admin/embed/actions/{}/associations',
+)
+
+_template_patterns = [(re.compile('^' + re.escape(t).replace(r'\{\}', '[^/]+') + '$'), t)
+                      for t in ENDPOINT_TEMPLATES]
+# GUIDs and numeric ids anywhere else in the path
+_id_segment = re.compile(r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def endpoint_template(url: str) -> str:
+    """
+    Returns the endpoint path with identifiers replaced by {}, e.g. 'users/{}/update', so metrics group by endpoint
+    """
+    endpoint = endpoint_from_url(url)
+    for pattern, template in _template_patterns:
+        if pattern.match(endpoint):
+            return template
+    return '/'.join('{}' if _id_segment.match(segment) else segment for segment in endpoint.split('/'))
+
+
+class RequestRecord:
+    """
+    One completed (or failed) call. latency_seconds is the wall time of the whole call as seen by the caller,
+    including any retries and rate-limit waits. status is None when no response was received, with the exception
+    class name in error
+    """
+    __slots__ = ('endpoint', 'method', 'status', 'latency_seconds', 'request_bytes', 'response_bytes', 'retries',
+                 'error', 'timestamp')
+
+    def __init__(self, endpoint: str, method: str, status: Optional[int], latency_seconds: float,
+                 request_bytes: int, response_bytes: int, retries: int = 0, error: Optional[str] = None,
+                 timestamp: Optional[float] = None):
+        self.endpoint = endpoint
+        self.method = method
+        self.status = status
+        self.latency_seconds = latency_seconds
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.retries = retries
+        self.error = error
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def as_dict(self) -> Dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return 'RequestRecord({method} {endpoint} {status} {latency:.3f}s)'.format(
+            method=self.method, endpoint=self.endpoint, status=self.status, latency=self.latency_seconds)
+
+
+def body_length(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    # Streamed / file bodies
+    return 0
+
+
+class Instrumentation:
+    """
+    The list of hooks for one client. A failing hook never breaks the API call itself
+    """
+    def __init__(self):
+        self.hooks: List[Callable[[RequestRecord], None]] = []
+
+    def __bool__(self):
+        return len(self.hooks) > 0
+
+    def add_hook(self, hook: Callable[[RequestRecord], None]):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[RequestRecord], None]):
+        self.hooks.remove(hook)
+
+    def emit(self, record: RequestRecord):
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception:
+                pass
+
+
+# Prometheus default buckets, extended for long-running exports and TML imports
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _EndpointStats:
+    __slots__ = ('bucket_counts', 'count', 'latency_sum', 'latency_max', 'request_bytes', 'response_bytes',
+                 'retries', 'statuses')
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.statuses: Dict[str, int] = {}
+
+
+class LatencyHistogram:
+    """
+    In-memory aggregation of RequestRecords by (endpoint template, method). Register the object itself as a hook
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], _EndpointStats] = {}
+
+    def __call__(self, record: RequestRecord):
+        self.observe(record)
+
+    def observe(self, record: RequestRecord):
+        key = (record.endpoint, record.method)
+        status = str(record.status) if record.status is not None else (record.error or 'error')
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _EndpointStats(len(self.buckets))
+            for i, upper_bound in enumerate(self.buckets):
+                if record.latency_seconds <= upper_bound:
+                    stats.bucket_counts[i] += 1
+                    break
+            stats.count += 1
+            stats.latency_sum += record.latency_seconds
+            stats.latency_max = max(stats.latency_max, record.latency_seconds)
+            stats.request_bytes += record.request_bytes
+            stats.response_bytes += record.response_bytes
+            stats.retries += record.retries
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def _quantile(self, stats: _EndpointStats, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation (the same estimate as Prometheus histogram_quantile)
+        target = q * stats.count
+        running = 0
+        for upper_bound, bucket_count in zip(self.buckets, stats.bucket_counts):
+            running += bucket_count
+            if running >= target:
+                return upper_bound
+        return stats.latency_max
+
+    def summary(self) -> List[Dict]:
+        """
+        One Dict per endpoint and method, sorted with the endpoints that took the most total time first
+        """
+        with self._lock:
+            rows = []
+            for (endpoint, method), stats in self._stats.items():
+                rows.append({
+                    'endpoint': endpoint,
+                    'method': method,
+                    'count': stats.count,
+                    'total_seconds': stats.latency_sum,
+                    'mean_seconds': stats.latency_sum / stats.count,
+                    'p50_seconds': self._quantile(stats, 0.5),
+                    'p95_seconds': self._quantile(stats, 0.95),
+                    'p99_seconds': self._quantile(stats, 0.99),
+                    'max_seconds': stats.latency_max,
+                    'request_bytes': stats.request_bytes,
+                    'response_bytes': stats.response_bytes,
+                    'retries': stats.retries,
+                    'statuses': dict(stats.statuses)
+                })
+        rows.sort(key=lambda r: r['total_seconds'], reverse=True)
+        return rows
+
+    def to_prometheus(self, prefix: str = 'thoughtspot_api') -> str:
+        lines = []
+
+        def header(name, metric_type, help_text):
+            lines.append('# HELP {p}_{n} {h}'.format(p=prefix, n=name, h=help_text))
+            lines.append('# TYPE {p}_{n} {t}'.format(p=prefix, n=name, t=metric_type))
+
+        def labels(endpoint, method, **extra):
+            pairs = [('endpoint', endpoint), ('method', method)] + list(extra.items())
+            escaped = ['{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs]
+            return '{' + ','.join(escaped) + '}'
+
+        with self._lock:
+            items = sorted(self._stats.items())
+
+            header('request_duration_seconds', 'histogram', 'Latency of ThoughtSpot REST API calls')
+            for (endpoint, method), stats in items:
+                running = 0
+                for upper_bound, bucket_count in zip(self.buckets, stats.bucket_counts):
+                    running += bucket_count
+                    lines.append('{p}_request_duration_seconds_bucket{l} {v}'.format(
+                        p=prefix, l=labels(endpoint, method, le=repr(float(upper_bound))), v=running))
+                lines.append('{p}_request_duration_seconds_bucket{l} {v}'.format(
+                    p=prefix, l=labels(endpoint, method, le='+Inf'), v=stats.count))
+                lines.append('{p}_request_duration_seconds_sum{l} {v}'.format(
+                    p=prefix, l=labels(endpoint, method), v=repr(stats.latency_sum)))
+                lines.append('{p}_request_duration_seconds_count{l} {v}'.format(
+                    p=prefix, l=labels(endpoint, method), v=stats.count))
+
+            for name, attr, help_text in (('request_bytes_total', 'request_bytes', 'Bytes sent in request bodies'),
+                                          ('response_bytes_total', 'response_bytes', 'Bytes received in responses'),
+                                          ('retries_total', 'retries', 'Retries made by the retry policy')):
+                header(name, 'counter', help_text)
+                for (endpoint, method), stats in items:
+                    lines.append('{p}_{n}{l} {v}'.format(p=prefix, n=name, l=labels(endpoint, method),
+                                                         v=getattr(stats, attr)))
+
+            header('responses_total', 'counter', 'Responses by HTTP status (or exception name)')
+            for (endpoint, method), stats in items:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append('{p}_responses_total{l} {v}'.format(
+                        p=prefix, l=labels(endpoint, method, status=status), v=count))
+
+        return '\n'.join(lines) + '\n'
+
+
+class PrometheusFileExporter:
+    """
+    Writes a LatencyHistogram to a file in Prometheus text format. The file is replaced atomically, so a collector
+    never reads a half-written file. Call write() yourself, or start() a background thread that writes periodically
+    """
+    def __init__(self, histogram: LatencyHistogram, file_path: str, prefix: str = 'thoughtspot_api'):
+        self.histogram = histogram
+        self.file_path = file_path
+        self.prefix = prefix
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self):
+        tmp_path = '{}.tmp'.format(self.file_path)
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            fh.write(self.histogram.to_prometheus(prefix=self.prefix))
+        os.replace(tmp_path, self.file_path)
+
+    def start(self, interval_seconds: float = 15.0):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.wait(interval_seconds):
+                self.write()
+
+        self._thread = threading.Thread(target=run, name='PrometheusFileExporter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        # Final write so the file has the last numbers
+        self.write()
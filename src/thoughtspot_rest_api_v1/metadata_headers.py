@@ -0,0 +1,117 @@
+#
+# Object headers in one shape for TSRestApiV1 (metadata/listobjectheaders) and TSRestApiV2 (metadata/search)
+#
+# iter_headers() pages through the headers of one metadata type, most recently modified first, and can stop at a
+# modified time so that only objects changed since an earlier load are requested. Each header is a Dict:
+#
+#     {'guid', 'type', 'name', 'obj_id', 'modified', 'author', 'author_name', 'owner', 'tags'}
+#
+# modified is in milliseconds since the epoch, author and owner are GUIDs, tags a list of tag names.
+# iter_guids() lists only the GUIDs, for finding deleted objects with less data transferred.
+# client_types() gives the type names each client expects ('LIVEBOARD' is 'PINBOARD_ANSWER_BOOK' for V1)
+#
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .tsrestapiv1 import TSRestApiV1, MetadataTypes
+
+
+def client_type(ts, metadata_type: str) -> str:
+    # V2 names ('LIVEBOARD', 'ANSWER', 'CONNECTION') become the V1 names via MetadataTypes. Others are kept
+    if isinstance(ts, TSRestApiV1) and metadata_type.isupper():
+        return getattr(MetadataTypes, metadata_type, metadata_type)
+    return metadata_type
+
+
+def client_types(ts, metadata_types: Iterable[str]) -> List[str]:
+    types = []
+    for metadata_type in metadata_types:
+        metadata_type = client_type(ts, metadata_type)
+        if metadata_type not in types:
+            types.append(metadata_type)
+    return types
+
+
+def _tag_names(tags) -> List[str]:
+    names = []
+    for tag in tags or []:
+        if isinstance(tag, dict):
+            names.append(tag.get('name'))
+        else:
+            names.append(tag)
+    return names
+
+
+def normalize_v2_header(item: Dict) -> Dict:
+    header = item.get('metadata_header') or {}
+    return {
+        'guid': item.get('metadata_id', header.get('id')),
+        'type': item.get('metadata_type', header.get('type')),
+        'name': item.get('metadata_name', header.get('name')),
+        'obj_id': item.get('metadata_obj_id', header.get('objId')),
+        'modified': header.get('modified'),
+        'author': header.get('author'),
+        'author_name': header.get('authorName'),
+        'owner': header.get('owner'),
+        'tags': _tag_names(header.get('tags'))
+    }
+
+
+def normalize_v1_header(header: Dict, metadata_type: str) -> Dict:
+    return {
+        'guid': header.get('id'),
+        'type': header.get('type', metadata_type),
+        'name': header.get('name'),
+        'obj_id': header.get('objId'),
+        'modified': header.get('modified'),
+        'author': header.get('author'),
+        'author_name': header.get('authorName'),
+        'owner': header.get('owner'),
+        'tags': _tag_names(header.get('tags'))
+    }
+
+
+def iter_headers(ts, metadata_type: str, modified_since: Optional[int] = None, page_size: int = 500,
+                 prefetch: int = 1) -> Iterator[Dict]:
+    """
+    Yields the headers of metadata_type ('LIVEBOARD', 'LOGICAL_TABLE'...), most recently modified first. With
+    modified_since (ms), stops at the first header modified before it, so the pages after are never requested
+    """
+    if isinstance(ts, TSRestApiV1):
+        raw_headers = ts.metadata_listobjectheaders_iter(object_type=metadata_type, sort='MODIFIED',
+                                                         sort_ascending=False, batchsize=page_size, prefetch=prefetch)
+    else:
+        request = {
+            'metadata': [{'type': metadata_type}],
+            'sort_options': {'field_name': 'MODIFIED', 'order': 'DESC'},
+            # metadata_header holds the modified time, author, owner and tags
+            'include_headers': True
+        }
+        raw_headers = ts.metadata_search_iter(request=request, page_size=page_size, prefetch=prefetch)
+
+    try:
+        for raw_header in raw_headers:
+            if isinstance(ts, TSRestApiV1):
+                header = normalize_v1_header(raw_header, metadata_type)
+            else:
+                header = normalize_v2_header(raw_header)
+            # Headers modified at exactly modified_since are yielded again: another object may share that time
+            if modified_since is not None and header['modified'] is not None and header['modified'] < modified_since:
+                return
+            yield header
+    finally:
+        # Cancels any page being read ahead when stopping early
+        raw_headers.close()
+
+
+def iter_guids(ts, metadata_type: str, page_size: int = 1000, prefetch: int = 1) -> Iterator[str]:
+    """
+    Yields the GUID of every object of metadata_type. With V2 the headers are not requested, so the pages are small
+    """
+    if isinstance(ts, TSRestApiV1):
+        for header in ts.metadata_listobjectheaders_iter(object_type=metadata_type, batchsize=page_size,
+                                                         prefetch=prefetch):
+            yield header['id']
+    else:
+        request = {'metadata': [{'type': metadata_type}], 'include_headers': False}
+        for item in ts.metadata_search_iter(request=request, page_size=page_size, prefetch=prefetch):
+            yield item['metadata_id']
@@ -0,0 +1,168 @@
+#
+# Working with many orgs from one TSRestApiV2 object
+#
+# A token from auth_token_full(org_id=...) is only valid for its org, so multi-org scripts create one client per org,
+# each with its own connection pool and an up-front login. OrgClientPool keeps one lightweight client per org that
+# shares the connection pools (and retry policy, rate limiter and instrumentation) of the base client. Each org
+# client gets its token on its first request and keeps it fresh with a BearerTokenManager:
+#
+#     ts = TSRestApiV2(server_url=server, pool_maxsize=16)
+#     orgs = OrgClientPool(ts, username=username, secret_key=secret_key, validity_time_in_sec=3600)
+#     for org in ts.orgs_search_iter():
+#         print(org['name'], len(orgs.client(org['id']).connection_search(request={})))
+#
+# OrgFanOutExecutor runs one function over the client of every org (or a list of orgs) on a bounded pool of threads,
+# and returns a row per org, whether the function succeeded or failed:
+#
+#     rows = OrgFanOutExecutor(orgs, workers=8).run(lambda org_ts: org_ts.connection_search(request={}))
+#
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+import threading
+import time
+
+import requests
+
+from .tsrestapiv2 import TSRestApiV2
+from .auth import BearerTokenManager
+
+
+class OrgClientPool:
+    """
+    One client per org_id, created on first use by client(org_id) and reused afterwards. Tokens are requested with
+    ts.auth_token_full(username, password or secret_key, org_id) and refreshed refresh_margin seconds before they
+    expire (default 10% of validity_time_in_sec). The base client ts needs no token of its own
+    """
+    def __init__(self, ts: TSRestApiV2, username: str, password: Optional[str] = None,
+                 secret_key: Optional[str] = None, validity_time_in_sec: int = 3600,
+                 refresh_margin: Optional[float] = None):
+        if password is None and secret_key is None:
+            raise ValueError("Either password or secret_key is required")
+        self.ts = ts
+        self.username = username
+        self.password = password
+        self.secret_key = secret_key
+        self.validity_time_in_sec = validity_time_in_sec
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._clients: Dict[int, TSRestApiV2] = {}
+
+    def token_manager(self, org_id: int) -> BearerTokenManager:
+        return BearerTokenManager.for_auth_token_full(self.ts, username=self.username, password=self.password,
+                                                      secret_key=self.secret_key, org_id=org_id,
+                                                      validity_time_in_sec=self.validity_time_in_sec,
+                                                      refresh_margin=self.refresh_margin)
+
+    def client(self, org_id: int) -> TSRestApiV2:
+        """
+        The client for org_id. No request is made until it is used
+        """
+        with self._lock:
+            client = self._clients.get(org_id)
+            if client is None:
+                client = self.ts.shared_transport_client()
+                client.token_manager = self.token_manager(org_id)
+                self._clients[org_id] = client
+            return client
+
+    def __getitem__(self, org_id: int) -> TSRestApiV2:
+        return self.client(org_id)
+
+    @property
+    def org_ids(self) -> List[int]:
+        with self._lock:
+            return list(self._clients.keys())
+
+    def login(self, org_ids: Iterable[int], workers: int = 8) -> Dict[int, Optional[Exception]]:
+        """
+        Gets the tokens of many orgs in parallel instead of on the first request to each org. Returns the error of
+        each org whose token request failed, or None
+        """
+        def get_token(org_id: int) -> Optional[Exception]:
+            try:
+                self.client(org_id).token_manager.token()
+                return None
+            except Exception as e:
+                return e
+
+        org_ids = list(org_ids)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(org_ids)))) as executor:
+            return dict(zip(org_ids, executor.map(get_token, org_ids)))
+
+    def remove(self, org_id: int):
+        with self._lock:
+            client = self._clients.pop(org_id, None)
+        if client is not None:
+            client.token_manager.stop()
+
+
+class OrgFanOutExecutor:
+    """
+    Runs func(org_client) for many orgs at once, at most `workers` at a time. An exception in one org is recorded
+    in its row and does not stop the others
+    """
+    def __init__(self, pool: OrgClientPool, workers: int = 8):
+        self.pool = pool
+        self.workers = workers
+
+    def all_orgs(self, page_size: int = 100) -> List[Dict]:
+        # Needs a base client allowed to search all orgs, e.g. a token for org 0 with admin privileges
+        return list(self.pool.ts.orgs_search_iter(page_size=page_size))
+
+    @staticmethod
+    def error_message(e: Exception) -> str:
+        if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+            return 'HTTP {}: {}'.format(e.response.status_code, e.response.text)
+        return '{}: {}'.format(type(e).__name__, e)
+
+    def _run_one(self, func: Callable[[Any], Any], org_id: int, org_name: Optional[str]) -> Dict:
+        started_at = time.perf_counter()
+        row = {'org_id': org_id, 'org_name': org_name, 'status': 'OK', 'result': None, 'error': None}
+        try:
+            row['result'] = func(self.pool.client(org_id))
+        except Exception as e:
+            row['status'] = 'ERROR'
+            row['error'] = self.error_message(e)
+            row['exception'] = e
+        row['duration_seconds'] = time.perf_counter() - started_at
+        return row
+
+    def run(self, func: Callable[[Any], Any], orgs: Optional[Iterable[Union[int, Dict]]] = None,
+            progress: Optional[Callable[[int, int, Dict], None]] = None) -> List[Dict]:
+        """
+        orgs: org ids, or org Dicts from orgs_search (with 'id' and 'name'). All orgs when None.
+        progress(done, total, row) is called as each org finishes, on the thread that called run().
+        Returns one row per org, in the order of orgs:
+        {'org_id', 'org_name', 'status': 'OK' or 'ERROR', 'result', 'error', 'duration_seconds'}, plus 'exception'
+        for failed orgs
+        """
+        if orgs is None:
+            orgs = self.all_orgs()
+        targets = []
+        for org in orgs:
+            if isinstance(org, dict):
+                targets.append((org['id'], org.get('name')))
+            else:
+                targets.append((org, None))
+
+        rows: List[Optional[Dict]] = [None] * len(targets)
+        if len(targets) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(targets)), thread_name_prefix='ts-org') as executor:
+            futures = {executor.submit(self._run_one, func, org_id, org_name): i
+                       for i, (org_id, org_name) in enumerate(targets)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                row = future.result()
+                rows[futures[future]] = row
+                if progress is not None:
+                    progress(done, len(targets), row)
+        return rows
+
+    @staticmethod
+    def summary(rows: List[Dict]) -> Dict:
+        return {
+            'orgs': len(rows),
+            'succeeded': sum(1 for r in rows if r['status'] == 'OK'),
+            'failed': sum(1 for r in rows if r['status'] == 'ERROR'),
+            'failed_org_ids': [r['org_id'] for r in rows if r['status'] == 'ERROR']
+        }
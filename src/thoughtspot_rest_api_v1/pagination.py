@@ -0,0 +1,133 @@
+#
+# Offset-based pagination with read-ahead, for the search / list endpoints of TSRestApiV1 and TSRestApiV2
+#
+# fetch_page(offset, page_size) makes one request and returns the page. While the caller works through
+# one page, the next `prefetch` pages are already being requested on a background thread (or as asyncio tasks for
+# TSRestApiV2Async), so at most prefetch + 1 pages are held in memory at any time
+#
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Awaitable, AsyncIterator, Callable, Iterator, List, Optional
+import asyncio
+
+
+def _is_last_page(page: List, page_size: int) -> bool:
+    # A short page is the last one. A page larger than page_size means the endpoint ignored the paging arguments
+    # and returned everything at once
+    return len(page) != page_size
+
+
+def _repeats(page: Any, previous_page: Any) -> bool:
+    # An endpoint that ignores the offset returns the same page again: stop rather than loop forever
+    return previous_page is not None and len(page) > 0 and page == previous_page
+
+
+def iter_offset_pages(fetch_page: Callable[[int, int], Any], page_size: int = 100, prefetch: int = 1,
+                      start_offset: int = 0, is_last_page: Optional[Callable[[Any, int], bool]] = None
+                      ) -> Iterator[Any]:
+    """
+    Yields pages from fetch_page(offset, page_size) until a page is shorter than page_size (or is_last_page(page,
+    page_size) returns True). prefetch=0 fetches each page only when the previous one has been consumed
+    """
+    if page_size <= 0:
+        raise ValueError("page_size must be greater than 0, use the non-paginated method to retrieve everything")
+    if is_last_page is None:
+        is_last_page = _is_last_page
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ts-prefetch') if prefetch > 0 else None
+    pending = deque()
+    next_offset = start_offset
+    previous_page = None
+    try:
+        while True:
+            if pending:
+                page = pending.popleft().result()
+            else:
+                page = fetch_page(next_offset, page_size)
+                next_offset += page_size
+            if _repeats(page, previous_page):
+                return
+            if is_last_page(page, page_size):
+                yield page
+                return
+            # Keep prefetch pages in flight while the caller processes this one. Read-ahead only starts once the
+            # first page shows there is more than one page
+            while len(pending) < prefetch:
+                pending.append(executor.submit(fetch_page, next_offset, page_size))
+                next_offset += page_size
+            previous_page = page
+            yield page
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+async def aiter_offset_pages(fetch_page: Callable[[int, int], Awaitable[Any]], page_size: int = 100,
+                             prefetch: int = 1, start_offset: int = 0,
+                             is_last_page: Optional[Callable[[Any, int], bool]] = None) -> AsyncIterator[Any]:
+    """
+    asyncio version of iter_offset_pages: the read-ahead pages are requested as tasks on the running event loop
+    """
+    if page_size <= 0:
+        raise ValueError("page_size must be greater than 0, use the non-paginated method to retrieve everything")
+    if is_last_page is None:
+        is_last_page = _is_last_page
+
+    pending = deque()
+    next_offset = start_offset
+    previous_page = None
+    try:
+        while True:
+            if pending:
+                page = await pending.popleft()
+            else:
+                page = await fetch_page(next_offset, page_size)
+                next_offset += page_size
+            if _repeats(page, previous_page):
+                return
+            if is_last_page(page, page_size):
+                yield page
+                return
+            while len(pending) < prefetch:
+                pending.append(asyncio.ensure_future(fetch_page(next_offset, page_size)))
+                next_offset += page_size
+            previous_page = page
+            yield page
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def is_last_batch(items_key: str) -> Callable[[Any, int], bool]:
+    """
+    is_last_page for the V1 list endpoints, which return {items_key: [...], 'isLastBatch': bool}. Endpoints without
+    the isLastBatch flag (or returning a bare list) end on a short page
+    """
+    def check(page: Any, page_size: int) -> bool:
+        if isinstance(page, dict):
+            items = page.get(items_key, [])
+            if len(items) == 0:
+                return True
+            if 'isLastBatch' in page:
+                return page['isLastBatch'] is True
+            return len(items) != page_size
+        return _is_last_page(page, page_size)
+    return check
+
+
+def page_items(page: Any, items_key: str) -> List:
+    if isinstance(page, dict):
+        return page.get(items_key, [])
+    return page
+
+
+def as_page(response: Any) -> List:
+    # The search endpoints return a JSON array; anything else is treated as a single, final page
+    if isinstance(response, list):
+        return response
+    # post_request() returns True for an empty response
+    if response is None or response is True:
+        return []
+    return [response]
@@ -0,0 +1,140 @@
+#
+# Client-side rate limiting for TSRestApiV1, TSRestApiV2 and TSRestApiV2Async
+#
+# Buckets work by reservation: a caller takes its token immediately (the balance may go negative) and is told how
+# long to wait before sending. This makes waiting FIFO-fair between threads, and lets the sync session use
+# time.sleep() while the asyncio client uses asyncio.sleep() with the same limiter object
+#
+from fnmatch import fnmatchcase
+from typing import Dict, Optional, Tuple, Union
+import threading
+import time
+
+import requests
+
+# URL path prefixes removed before matching endpoint families, so 'metadata/tml/*' matches V1 and V2 alike
+API_PATH_PREFIXES = ('/api/rest/2.0/', '/callosum/v1/tspublic/v1/', '/callosum/v1/', '/tspublic/rest/v2/')
+
+
+def endpoint_from_url(url: str) -> str:
+    path = requests.utils.urlparse(url).path
+    for prefix in API_PATH_PREFIXES:
+        if path.startswith(prefix):
+            return path[len(prefix):]
+    return path.lstrip('/')
+
+
+class TokenBucket:
+    """
+    rate: tokens added per second. burst: bucket capacity, i.e. how many calls can go out at once after idling
+    """
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Takes tokens from the bucket and returns the number of seconds the caller must wait before sending
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Token-bucket limits for a ThoughtSpot server: an optional overall rate across all calls, plus optional budgets for
+    endpoint families matched with fnmatch-style patterns against the endpoint path (first match wins):
+
+        limiter = RateLimiter(rate=20, families={'metadata/tml/*': 2, 'searchdata': (5, 10), 'report/*': 1})
+        ts = TSRestApiV2(server_url=server, rate_limiter=limiter)
+
+    Family values are a rate in calls per second, or a (rate, burst) tuple. The limiter is thread-safe; pass the same
+    object to every client that talks to the same server (or use RateLimiter.for_server()) so they share the budget.
+    """
+    # Shared limiters by server URL, see for_server()
+    _shared: Dict[str, 'RateLimiter'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None,
+                 families: Optional[Dict[str, Union[float, Tuple[float, float]]]] = None):
+        self.overall_bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.family_buckets = []
+        if families is not None:
+            for pattern, limit in families.items():
+                if isinstance(limit, (tuple, list)):
+                    bucket = TokenBucket(limit[0], limit[1])
+                else:
+                    bucket = TokenBucket(limit)
+                self.family_buckets.append((pattern, bucket))
+        # Time spent waiting, to tell whether the limits (rather than the server) are the bottleneck
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.delayed_calls = 0
+        self.total_wait_seconds = 0.0
+
+    @classmethod
+    def for_server(cls, server_url: str, **kwargs) -> 'RateLimiter':
+        """
+        Returns the process-wide limiter for server_url, creating it with kwargs on first use. Every client (any org,
+        V1 or V2) given this limiter draws from the same budget
+        """
+        key = server_url.rstrip('/').lower()
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(**kwargs)
+            return cls._shared[key]
+
+    def family_for_endpoint(self, endpoint: str) -> Optional[str]:
+        for pattern, bucket in self.family_buckets:
+            if fnmatchcase(endpoint, pattern):
+                return pattern
+        return None
+
+    def reserve(self, url: str) -> float:
+        """
+        Takes a token for the call to url from the overall bucket and its family bucket, returns the seconds to wait
+        """
+        endpoint = endpoint_from_url(url)
+        wait = 0.0
+        if self.overall_bucket is not None:
+            wait = self.overall_bucket.reserve()
+        for pattern, bucket in self.family_buckets:
+            if fnmatchcase(endpoint, pattern):
+                wait = max(wait, bucket.reserve())
+                break
+
+        with self._stats_lock:
+            self.calls += 1
+            if wait > 0:
+                self.delayed_calls += 1
+                self.total_wait_seconds += wait
+        return wait
+
+    def acquire(self, url: str):
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'calls': self.calls,
+                'delayed_calls': self.delayed_calls,
+                'total_wait_seconds': self.total_wait_seconds
+            }
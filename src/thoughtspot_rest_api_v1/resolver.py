@@ -0,0 +1,174 @@
+#
+# Name / obj_id to GUID resolution without a request per lookup
+#
+# metadata_list_find_guid() (V1), or a metadata_search by name (V2), costs a round trip for every name resolved.
+# GuidResolver loads the headers of the types it is given once (paged, see metadata_headers.iter_headers) and looks
+# names, case-insensitive names, obj_ids and GUIDs up in dicts. refresh() only requests the objects modified since
+# the previous load. With db_path, the index is kept in a local SQLite file, so the next run starts from it:
+#
+#     resolver = GuidResolver(ts, types=['LOGICAL_TABLE', 'LIVEBOARD'], db_path='guid_index.sqlite')
+#     resolver.refresh()
+#     guid = resolver.guid('Sales Model', metadata_type='LOGICAL_TABLE')
+#     guid = resolver.guid_for_obj_id('Conn.DB_Name.TableName')
+#
+from typing import Dict, Iterable, List, Optional, Set
+import sqlite3
+import threading
+
+from .metadata_headers import iter_headers, client_type, client_types
+
+# V2 type names. For a TSRestApiV1 client they are changed to the V1 names (MetadataTypes)
+DEFAULT_RESOLVER_TYPES = ('LOGICAL_TABLE', 'LIVEBOARD', 'ANSWER', 'CONNECTION')
+
+
+class GuidResolver:
+    """
+    - types: metadata types loaded by refresh(). V2 names work with either client, V1 names with TSRestApiV1
+    - db_path: SQLite file the index is saved to and loaded from. In memory only when None
+
+    Lookups raise LookupError when nothing matches, like metadata_list_find_guid(), and when a name matches several
+    objects (use guids() to get them all)
+    """
+    def __init__(self, ts, types: Iterable[str] = DEFAULT_RESOLVER_TYPES, db_path: Optional[str] = None,
+                 page_size: int = 500):
+        self.ts = ts
+        self.types = client_types(ts, types)
+        self.db_path = db_path
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        # guid: (type, name, obj_id, modified)
+        self._by_guid: Dict[str, tuple] = {}
+        self._by_name: Dict[str, Set[str]] = {}
+        self._by_folded_name: Dict[str, Set[str]] = {}
+        self._by_obj_id: Dict[str, str] = {}
+        # Highest modified time loaded, per type
+        self.watermarks: Dict[str, int] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            self._open_db()
+
+    #
+    # SQLite persistence
+    #
+    def _open_db(self):
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS headers (guid TEXT PRIMARY KEY, type TEXT, name TEXT, '
+                         'obj_id TEXT, modified INTEGER)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS watermarks (type TEXT PRIMARY KEY, modified INTEGER)')
+        self._db.commit()
+        for guid, metadata_type, name, obj_id, modified in self._db.execute(
+                'SELECT guid, type, name, obj_id, modified FROM headers'):
+            self._add(guid, metadata_type, name, obj_id, modified)
+        for metadata_type, modified in self._db.execute('SELECT type, modified FROM watermarks'):
+            self.watermarks[metadata_type] = modified
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    #
+    # In-memory index
+    #
+    def _add(self, guid: str, metadata_type: str, name: Optional[str], obj_id: Optional[str],
+             modified: Optional[int]):
+        self._remove(guid)
+        self._by_guid[guid] = (metadata_type, name, obj_id, modified)
+        if name is not None:
+            self._by_name.setdefault(name, set()).add(guid)
+            self._by_folded_name.setdefault(name.casefold(), set()).add(guid)
+        if obj_id is not None:
+            self._by_obj_id[obj_id] = guid
+
+    def _remove(self, guid: str):
+        entry = self._by_guid.pop(guid, None)
+        if entry is None:
+            return
+        metadata_type, name, obj_id, modified = entry
+        if name is not None:
+            for index, key in ((self._by_name, name), (self._by_folded_name, name.casefold())):
+                guids = index.get(key)
+                if guids is not None:
+                    guids.discard(guid)
+                    if len(guids) == 0:
+                        del index[key]
+        if obj_id is not None and self._by_obj_id.get(obj_id) == guid:
+            del self._by_obj_id[obj_id]
+
+    def __len__(self) -> int:
+        return len(self._by_guid)
+
+    def refresh(self, full: bool = False) -> Dict[str, int]:
+        """
+        Loads the headers modified since the last refresh of each type (all of them the first time, or when full is
+        True). A full refresh also drops objects that no longer exist. Returns the number of headers loaded per type
+        """
+        loaded = {}
+        for metadata_type in self.types:
+            since = None if full else self.watermarks.get(metadata_type)
+            # An incremental load usually ends in the first page, so no page is read ahead
+            headers = list(iter_headers(self.ts, metadata_type, modified_since=since, page_size=self.page_size,
+                                        prefetch=0 if since is not None else 1))
+            with self._lock:
+                if since is None:
+                    seen = {h['guid'] for h in headers}
+                    stale = [g for g, entry in self._by_guid.items() if entry[0] == metadata_type and g not in seen]
+                    for guid in stale:
+                        self._remove(guid)
+                    if self._db is not None and len(stale) > 0:
+                        self._db.executemany('DELETE FROM headers WHERE guid = ?', [(g,) for g in stale])
+                for h in headers:
+                    self._add(h['guid'], metadata_type, h['name'], h['obj_id'], h['modified'])
+                modified_times = [h['modified'] for h in headers if h['modified'] is not None]
+                if len(modified_times) > 0:
+                    self.watermarks[metadata_type] = max(max(modified_times), self.watermarks.get(metadata_type, 0))
+                if self._db is not None:
+                    self._db.executemany('INSERT OR REPLACE INTO headers (guid, type, name, obj_id, modified) '
+                                         'VALUES (?, ?, ?, ?, ?)',
+                                         [(h['guid'], metadata_type, h['name'], h['obj_id'], h['modified'])
+                                          for h in headers])
+                    if metadata_type in self.watermarks:
+                        self._db.execute('INSERT OR REPLACE INTO watermarks (type, modified) VALUES (?, ?)',
+                                         (metadata_type, self.watermarks[metadata_type]))
+                    self._db.commit()
+            loaded[metadata_type] = len(headers)
+        return loaded
+
+    #
+    # Lookups
+    #
+    def guids(self, name: str, metadata_type: Optional[str] = None, case_sensitive: bool = True) -> List[str]:
+        if metadata_type is not None:
+            metadata_type = client_type(self.ts, metadata_type)
+        with self._lock:
+            if case_sensitive:
+                guids = self._by_name.get(name, ())
+            else:
+                guids = self._by_folded_name.get(name.casefold(), ())
+            return sorted(g for g in guids if metadata_type is None or self._by_guid[g][0] == metadata_type)
+
+    def guid(self, name: str, metadata_type: Optional[str] = None, case_sensitive: bool = True) -> str:
+        guids = self.guids(name, metadata_type=metadata_type, case_sensitive=case_sensitive)
+        if len(guids) == 0:
+            raise LookupError("No object named '{}'".format(name))
+        if len(guids) > 1:
+            raise LookupError("{} objects named '{}': {}".format(len(guids), name, guids))
+        return guids[0]
+
+    def guid_for_obj_id(self, obj_id: str) -> str:
+        with self._lock:
+            guid = self._by_obj_id.get(obj_id)
+        if guid is None:
+            raise LookupError("No object with obj_id '{}'".format(obj_id))
+        return guid
+
+    def header(self, guid: str) -> Dict:
+        with self._lock:
+            entry = self._by_guid.get(guid)
+        if entry is None:
+            raise LookupError("No object with GUID '{}'".format(guid))
+        metadata_type, name, obj_id, modified = entry
+        return {'guid': guid, 'type': metadata_type, 'name': name, 'obj_id': obj_id, 'modified': modified}
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self._by_guid
@@ -0,0 +1,119 @@
+#
+# Retry policy used by the request path of TSRestApiV1, TSRestApiV2 and TSRestApiV2Async
+#
+# The policy only makes decisions (retry or not, how long to wait); the clients' sessions do the sleeping and
+# re-sending, so the same object works for the sync requests.Session and the asyncio client
+#
+from email.utils import parsedate_to_datetime
+from typing import Optional, Iterable
+import datetime
+import random
+import threading
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from .endpoints import READ_ONLY_POST_ENDPOINTS, is_read_only
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter, honoring Retry-After, for transient failures (HTTP 429 / 502 / 503 / 504 and
+    connection errors).
+
+    Only idempotent requests are retried (GET etc., plus the read-only POST endpoints in
+    endpoints.READ_ONLY_POST_ENDPOINTS), with the exception of HTTP 429, which means the server rejected the request
+    without processing it.
+
+    retry_budget caps the total number of retries made through one policy (i.e. one client) across all calls, so a
+    cluster that is down fails fast instead of every call waiting out its own backoff. None means no cap.
+    """
+    def __init__(self, max_retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 backoff_max: float = 30.0,
+                 jitter: bool = True,
+                 retry_statuses: Iterable[int] = (429, 502, 503, 504),
+                 always_retry_statuses: Iterable[int] = (429,),
+                 respect_retry_after: bool = True,
+                 retry_after_max: float = 120.0,
+                 retry_budget: Optional[int] = None,
+                 read_only_post_endpoints: Iterable[str] = READ_ONLY_POST_ENDPOINTS):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.always_retry_statuses = frozenset(always_retry_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.retry_after_max = retry_after_max
+        self.read_only_post_endpoints = tuple(read_only_post_endpoints)
+
+        self.retry_budget = retry_budget
+        self._lock = threading.Lock()
+        self.retries_used = 0
+
+    def is_idempotent(self, method: str, url: str) -> bool:
+        return is_read_only(method, url, self.read_only_post_endpoints)
+
+    def _take_from_budget(self) -> bool:
+        with self._lock:
+            if self.retry_budget is not None and self.retries_used >= self.retry_budget:
+                return False
+            self.retries_used += 1
+            return True
+
+    def should_retry_response(self, method: str, url: str, status_code: int, attempt: int) -> bool:
+        if attempt >= self.max_retries or status_code not in self.retry_statuses:
+            return False
+        if status_code not in self.always_retry_statuses and not self.is_idempotent(method, url):
+            return False
+        return self._take_from_budget()
+
+    # connect_failure: the request never reached the server, so it is safe to send again whatever the method
+    def should_retry_error(self, method: str, url: str, attempt: int, connect_failure: bool = False) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        if not connect_failure and not self.is_idempotent(method, url):
+            return False
+        return self._take_from_budget()
+
+    def should_retry_exception(self, method: str, url: str, exception: Exception, attempt: int) -> bool:
+        if not isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return False
+        # requests wraps urllib3's MaxRetryError, whose reason is NewConnectionError when the connect was refused
+        reason = getattr(exception.args[0], 'reason', None) if exception.args else None
+        connect_failure = (isinstance(exception, requests.exceptions.ConnectTimeout)
+                           or isinstance(reason, NewConnectionError))
+        return self.should_retry_error(method, url, attempt, connect_failure=connect_failure)
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            # "Full jitter": spreads out clients that all failed at the same moment
+            delay = random.uniform(0, delay)
+        return delay
+
+    def parse_retry_after(self, retry_after: Optional[str]) -> Optional[float]:
+        if not retry_after:
+            return None
+        retry_after = retry_after.strip()
+        if retry_after.isdigit():
+            seconds = float(retry_after)
+        else:
+            try:
+                retry_date = parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                return None
+            seconds = (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        return min(max(seconds, 0.0), self.retry_after_max)
+
+    def delay_for_response(self, headers, attempt: int) -> float:
+        if self.respect_retry_after:
+            retry_after = self.parse_retry_after(headers.get('Retry-After'))
+            if retry_after is not None:
+                return retry_after
+        return self.backoff(attempt)
+
+    def reset_budget(self):
+        with self._lock:
+            self.retries_used = 0
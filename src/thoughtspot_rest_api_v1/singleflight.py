@@ -0,0 +1,116 @@
+#
+# Coalescing of identical concurrent requests, for TSRestApiV1, TSRestApiV2 and TSRestApiV2Async
+#
+# When many threads (or asyncio tasks) share a client, the same read is often sent several times at once: the same
+# metadata_search, auth_session_user, system_config... With a RequestCoalescer set on a client, a read-only request
+# that is identical (method, URL, body and credentials) to one already in flight is not sent again: it waits for the
+# request in flight and gets the same response. Each caller still decodes the response body into its own objects,
+# so one caller changing its result does not affect the others:
+#
+#     ts.request_coalescer = RequestCoalescer()
+#
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Mapping, Tuple
+import asyncio
+import threading
+
+import requests
+
+from .cache import request_key
+from .endpoints import is_read_only
+
+
+class RequestCoalescer:
+    """
+    Requests are coalesced when they are read-only: GET, or a POST to an endpoint in endpoints.READ_ONLY_POST_ENDPOINTS
+    (searches, exports, data). An error (or error response) is returned to every caller that waited for it.
+    Thread-safe; calls counts the read-only requests seen and coalesced those that did not go to the server
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Tuple, Future] = {}
+        # Keyed by event loop as well, as an asyncio future can only be awaited on its own loop
+        self._async_in_flight: Dict[Tuple, 'asyncio.Future'] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def is_coalesced(method: str, url: str) -> bool:
+        return is_read_only(method, url)
+
+    def send(self, method: str, url: str, body, headers: Mapping[str, str],
+             send: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Returns send(), or the response of an identical request already in flight
+        """
+        if not self.is_coalesced(method, url):
+            return send()
+        key = request_key(method, url, body, headers)
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                owner = True
+        if not owner:
+            return future.result()
+
+        try:
+            response = send()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(response)
+        return response
+
+    async def send_async(self, method: str, url: str, body, headers: Mapping[str, str],
+                         send: Callable[[], Awaitable[requests.Response]]) -> requests.Response:
+        """
+        asyncio version of send(), coalescing the requests made on the same event loop
+        """
+        if not self.is_coalesced(method, url):
+            return await send()
+        loop = asyncio.get_running_loop()
+        key = (loop,) + request_key(method, url, body, headers)
+        with self._lock:
+            self.calls += 1
+            future = self._async_in_flight.get(key)
+            owner = False
+            if future is not None:
+                self.coalesced += 1
+            else:
+                future = loop.create_future()
+                self._async_in_flight[key] = future
+                owner = True
+        if not owner:
+            # shield: a waiter being cancelled must not cancel the request the others are waiting for
+            return await asyncio.shield(future)
+
+        try:
+            response = await send()
+        except BaseException as e:
+            with self._lock:
+                del self._async_in_flight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Retrieved here, so there is no 'exception never retrieved' warning when nobody else was waiting
+                future.exception()
+            raise
+        with self._lock:
+            del self._async_in_flight[key]
+        future.set_result(response)
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._in_flight)}
@@ -0,0 +1,207 @@
+#
+# Local snapshot of the object headers of a ThoughtSpot instance, kept up to date incrementally
+#
+# An inventory job that downloads every header each night spends most of its time on objects that did not change.
+# MetadataSnapshot loads every header once into a SQLite database. Each later sync() requests only the headers
+# modified since the previous sync (sorted by modified time, stopping at the first older one) and finds deleted
+# objects by comparing the GUIDs on the server with the stored ones. Queries by type, owner, author, tag or name are
+# then answered locally:
+#
+#     snapshot = MetadataSnapshot(ts, db_path='inventory.sqlite', types=['LIVEBOARD', 'ANSWER', 'LOGICAL_TABLE'])
+#     print(snapshot.sync())
+#     for obj in snapshot.find(metadata_type='LIVEBOARD', tag='Finance'):
+#         print(obj['guid'], obj['name'], obj['author_name'])
+#
+from typing import Dict, Iterable, List, Optional
+import sqlite3
+import threading
+import time
+
+from .metadata_headers import iter_headers, iter_guids, client_type, client_types
+
+# V2 type names. For a TSRestApiV1 client they are changed to the V1 names (MetadataTypes)
+DEFAULT_SNAPSHOT_TYPES = ('LIVEBOARD', 'ANSWER', 'LOGICAL_TABLE', 'CONNECTION')
+
+_COLUMNS = ('guid', 'type', 'name', 'obj_id', 'modified', 'author', 'author_name', 'owner')
+# Separates the tags of an object in GROUP_CONCAT
+_TAG_SEPARATOR = '\x1f'
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS objects (guid TEXT PRIMARY KEY, type TEXT, name TEXT, obj_id TEXT, '
+    'modified INTEGER, author TEXT, author_name TEXT, owner TEXT)',
+    'CREATE INDEX IF NOT EXISTS objects_type ON objects (type)',
+    'CREATE INDEX IF NOT EXISTS objects_owner ON objects (owner)',
+    'CREATE INDEX IF NOT EXISTS objects_author ON objects (author)',
+    'CREATE INDEX IF NOT EXISTS objects_author_name ON objects (author_name)',
+    'CREATE TABLE IF NOT EXISTS object_tags (guid TEXT, tag TEXT, PRIMARY KEY (guid, tag))',
+    'CREATE INDEX IF NOT EXISTS object_tags_tag ON object_tags (tag)',
+    'CREATE TABLE IF NOT EXISTS sync_state (type TEXT PRIMARY KEY, watermark INTEGER, synced_at REAL)',
+)
+
+
+class MetadataSnapshot:
+    """
+    - ts: a TSRestApiV2 or TSRestApiV1 object
+    - db_path: SQLite file holding the snapshot between runs. ':memory:' keeps it for this process only
+    - types: metadata types included in the snapshot. V2 names work with either client
+    """
+    def __init__(self, ts, db_path: str = ':memory:', types: Iterable[str] = DEFAULT_SNAPSHOT_TYPES,
+                 page_size: int = 500):
+        self.ts = ts
+        self.db_path = db_path
+        self.types = client_types(ts, types)
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def watermark(self, metadata_type: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute('SELECT watermark FROM sync_state WHERE type = ?',
+                                   (client_type(self.ts, metadata_type),)).fetchone()
+        return row[0] if row is not None else None
+
+    #
+    # Sync
+    #
+    def _store(self, metadata_type: str, headers: List[Dict], deleted: Iterable[str], watermark: Optional[int]):
+        # Called with self._lock held
+        db = self._db
+        deleted = [(guid,) for guid in deleted]
+        db.executemany('DELETE FROM objects WHERE guid = ?', deleted)
+        db.executemany('DELETE FROM object_tags WHERE guid = ?', deleted)
+        db.executemany('INSERT OR REPLACE INTO objects ({}) VALUES ({})'.format(', '.join(_COLUMNS),
+                                                                               ', '.join('?' * len(_COLUMNS))),
+                       [tuple(metadata_type if c == 'type' else h.get(c) for c in _COLUMNS) for h in headers])
+        db.executemany('DELETE FROM object_tags WHERE guid = ?', [(h['guid'],) for h in headers])
+        db.executemany('INSERT OR IGNORE INTO object_tags (guid, tag) VALUES (?, ?)',
+                       [(h['guid'], tag) for h in headers for tag in h['tags'] if tag is not None])
+        db.execute('INSERT OR REPLACE INTO sync_state (type, watermark, synced_at) VALUES (?, ?, ?)',
+                   (metadata_type, watermark, time.time()))
+        db.commit()
+
+    def sync_type(self, metadata_type: str, detect_deletions: bool = True, full: bool = False) -> Dict:
+        """
+        Brings the snapshot of one type up to date. Returns {'type', 'full', 'added', 'updated', 'deleted'}
+        """
+        metadata_type = client_type(self.ts, metadata_type)
+        since = None if full else self.watermark(metadata_type)
+        # An incremental sync usually ends in the first page, so no page is read ahead
+        headers = list(iter_headers(self.ts, metadata_type, modified_since=since, page_size=self.page_size,
+                                    prefetch=0 if since is not None else 1))
+        with self._lock:
+            stored = dict(self._db.execute('SELECT guid, modified FROM objects WHERE type = ?', (metadata_type,)))
+        fetched = {h['guid'] for h in headers}
+        modified_times = [h['modified'] for h in headers if h['modified'] is not None]
+        # iter_headers also returns the objects modified exactly at the watermark, which are usually already stored
+        headers = [h for h in headers if h['guid'] not in stored or stored[h['guid']] != h['modified']]
+        changed = {h['guid'] for h in headers}
+
+        if since is None:
+            # A full sync fetched every object on the server, changed or not
+            on_server = fetched
+        elif detect_deletions:
+            on_server = set(iter_guids(self.ts, metadata_type, page_size=max(self.page_size, 1000)))
+            on_server.update(fetched)
+        else:
+            on_server = set(stored) | changed
+        deleted = set(stored) - on_server
+
+        watermark = max(modified_times + ([since] if since is not None else []), default=None)
+        with self._lock:
+            self._store(metadata_type, headers, deleted, watermark)
+        return {
+            'type': metadata_type,
+            'full': since is None,
+            'added': len(changed - stored.keys()),
+            'updated': len(changed & stored.keys()),
+            'deleted': len(deleted)
+        }
+
+    def sync(self, detect_deletions: bool = True, full: bool = False) -> Dict:
+        """
+        Syncs every type: all headers the first time (or with full=True), then only those modified since the last
+        sync. detect_deletions=False skips listing the GUIDs on the server, so deleted objects stay in the snapshot
+        until the next full sync
+        """
+        started_at = time.perf_counter()
+        results = [self.sync_type(t, detect_deletions=detect_deletions, full=full) for t in self.types]
+        return {
+            'types': results,
+            'added': sum(r['added'] for r in results),
+            'updated': sum(r['updated'] for r in results),
+            'deleted': sum(r['deleted'] for r in results),
+            'duration_seconds': time.perf_counter() - started_at
+        }
+
+    #
+    # Local queries
+    #
+    def find(self, metadata_type: Optional[str] = None, owner: Optional[str] = None, author: Optional[str] = None,
+             tag: Optional[str] = None, name_like: Optional[str] = None,
+             modified_after: Optional[int] = None) -> List[Dict]:
+        """
+        Objects matching all the given conditions. author is a GUID or an author name, name_like an SQL LIKE pattern
+        ('Sales%'), modified_after is in ms
+        """
+        conditions = []
+        params = []
+        if metadata_type is not None:
+            conditions.append('o.type = ?')
+            params.append(client_type(self.ts, metadata_type))
+        if owner is not None:
+            conditions.append('o.owner = ?')
+            params.append(owner)
+        if author is not None:
+            conditions.append('(o.author = ? OR o.author_name = ?)')
+            params.extend([author, author])
+        if tag is not None:
+            conditions.append('o.guid IN (SELECT guid FROM object_tags WHERE tag = ?)')
+            params.append(tag)
+        if name_like is not None:
+            conditions.append('o.name LIKE ?')
+            params.append(name_like)
+        if modified_after is not None:
+            conditions.append('o.modified > ?')
+            params.append(modified_after)
+
+        return self._select(conditions, params)
+
+    def _select(self, conditions: List[str], params: List) -> List[Dict]:
+        query = ('SELECT {}, GROUP_CONCAT(t.tag, ?) FROM objects o LEFT JOIN object_tags t ON t.guid = o.guid'
+                 .format(', '.join('o.' + c for c in _COLUMNS)))
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' GROUP BY o.guid ORDER BY o.type, o.name'
+        with self._lock:
+            rows = self._db.execute(query, [_TAG_SEPARATOR] + params).fetchall()
+        results = []
+        for row in rows:
+            obj = dict(zip(_COLUMNS, row[:-1]))
+            obj['tags'] = row[-1].split(_TAG_SEPARATOR) if row[-1] else []
+            results.append(obj)
+        return results
+
+    def get(self, guid: str) -> Dict:
+        objects = self._select(['o.guid = ?'], [guid])
+        if len(objects) == 0:
+            raise LookupError("No object with GUID '{}' in the snapshot".format(guid))
+        return objects[0]
+
+    def count_by(self, field: str) -> Dict[str, int]:
+        """
+        Number of objects per 'type', 'owner', 'author', 'author_name' or 'tag'
+        """
+        if field == 'tag':
+            query = 'SELECT tag, COUNT(*) FROM object_tags GROUP BY tag'
+        elif field in ('type', 'owner', 'author', 'author_name'):
+            query = 'SELECT {0}, COUNT(*) FROM objects GROUP BY {0}'.format(field)
+        else:
+            raise ValueError("Cannot count by '{}'".format(field))
+        with self._lock:
+            return dict(self._db.execute(query).fetchall())
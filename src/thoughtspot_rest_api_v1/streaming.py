@@ -0,0 +1,264 @@
+#
+# Helpers for handling large responses without holding them in memory
+#
+from typing import Dict, Iterator, List, Optional, Union, BinaryIO
+import codecs
+import json
+import os
+import time
+
+import requests
+
+# 1 MB: large enough that per-chunk overhead is negligible, small enough that memory stays flat
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+FileDestination = Union[str, os.PathLike, BinaryIO]
+
+
+def stream_response_to_file(response: requests.Response, destination: FileDestination,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE, started_at: Optional[float] = None) -> Dict:
+    """
+    Writes the body of a response requested with stream=True to destination chunk by chunk.
+
+    destination is a file path, or any object with a write() method (an open binary file, a socket wrapper, etc.).
+    When a path is given and the transfer fails, the partial file is removed.
+
+    Returns the details of the transfer rather than the content:
+    {'bytes_written', 'content_type', 'duration_seconds', 'file_path'}
+    """
+    if started_at is None:
+        started_at = time.perf_counter()
+
+    bytes_written = 0
+    file_path = None
+    try:
+        if hasattr(destination, 'write'):
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                destination.write(chunk)
+                bytes_written += len(chunk)
+        else:
+            file_path = os.fspath(destination)
+            try:
+                with open(file_path, 'wb') as fh:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        fh.write(chunk)
+                        bytes_written += len(chunk)
+            except BaseException:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                raise
+    finally:
+        response.close()
+
+    return {
+        'bytes_written': bytes_written,
+        'content_type': response.headers.get('Content-Type'),
+        'duration_seconds': time.perf_counter() - started_at,
+        'file_path': file_path
+    }
+
+
+#
+# Incremental parsing of large JSON data responses
+#
+# The data endpoints return a small envelope around very large arrays of rows, e.g. V2 searchdata:
+#   {"contents": [{"column_names": [...], "data_rows": [[...], [...], ...], ...}]}
+# JsonRowsParser walks the envelope as text arrives and decodes the rows one at a time with the C json scanner,
+# handing back batches of rows, so only one batch of rows (plus one network chunk) is in memory at a time
+#
+_NEED_MORE = object()
+_WHITESPACE = ' \t\n\r'
+# Characters that can continue a number: '-1.' or '1e' at the end of a chunk are decoded as -1 and 1
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+class JsonRowsParser:
+    """
+    Push parser: feed() it decoded text as it arrives, and it returns the completed batches. Each batch is a Dict:
+
+        {'path': ('contents', 0), 'fields': {'column_names': [...]}, 'rows': [...]}
+
+    - path: the keys / list indexes leading to the object holding the rows array
+    - fields: values of capture_keys found in that same object *so far* (the server usually sends the column names
+      before the rows, but JSON does not guarantee order)
+    - rows: up to batch_size decoded elements of an array whose key is in rows_keys
+    """
+    def __init__(self, rows_keys=('data_rows',), capture_keys=('column_names',), batch_size: int = 1000):
+        self.rows_keys = frozenset(rows_keys)
+        self.capture_keys = frozenset(capture_keys)
+        self.batch_size = batch_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._walker = self._walk_value((), None, None)
+        self._done = False
+
+    def feed(self, text: str) -> List[Dict]:
+        # Drop the consumed part of the buffer now and then, rather than on every chunk
+        if self._pos > 1024 * 1024:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += text
+        return self._run()
+
+    def close(self) -> List[Dict]:
+        self._eof = True
+        batches = self._run()
+        if not self._done:
+            raise ValueError("Incomplete JSON document")
+        return batches
+
+    def _run(self) -> List[Dict]:
+        batches = []
+        if self._done:
+            return batches
+        try:
+            while True:
+                item = next(self._walker)
+                if item is _NEED_MORE:
+                    return batches
+                batches.append(item)
+        except StopIteration:
+            self._done = True
+        return batches
+
+    # The helpers below are generators: they yield _NEED_MORE until enough text has been fed
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                return ''
+            yield _NEED_MORE
+
+    def _expect(self, chars: str):
+        c = yield from self._peek()
+        if c == '' or c not in chars:
+            raise ValueError("Invalid JSON: expected one of '{}' at offset {}, found '{}'".format(
+                chars, self._pos, c))
+        self._pos += 1
+        return c
+
+    def _decode(self):
+        yield from self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number or literal running to the end of the buffer, or stopping at a character that a number can
+                # go on with, may continue in the next chunk
+                if self._eof or self._buf[self._pos] in '{["' or (
+                        end < len(self._buf) and self._buf[end] not in _NUMBER_CHARS):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            yield _NEED_MORE
+
+    # Fast path for the rows: decodes every complete row already in the buffer (up to the batch size) without going
+    # through the generator helpers. Returns True when the closing ']' of the rows array was reached
+    def _take_rows(self, rows: List) -> bool:
+        buf = self._buf
+        length = len(buf)
+        pos = self._pos
+        raw_decode = self._decoder.raw_decode
+        while len(rows) < self.batch_size:
+            while pos < length and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= length:
+                break
+            try:
+                value, end = raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break
+            if end < length and buf[end] in _NUMBER_CHARS and buf[pos] not in '{["':
+                # A number cut by the end of the chunk, left to _decode()
+                break
+            while end < length and buf[end] in _WHITESPACE:
+                end += 1
+            if end >= length:
+                break
+            separator = buf[end]
+            if separator == ',':
+                rows.append(value)
+                pos = end + 1
+            elif separator == ']':
+                rows.append(value)
+                self._pos = end + 1
+                return True
+            else:
+                raise ValueError("Invalid JSON: expected ',' or ']' at offset {}, found '{}'".format(end, separator))
+        self._pos = pos
+        return False
+
+    def _walk_value(self, path, key, fields):
+        if key is not None and key in self.capture_keys:
+            fields[key] = yield from self._decode()
+            return
+        c = yield from self._peek()
+        if c == '{':
+            self._pos += 1
+            object_fields = {}
+            if (yield from self._peek()) == '}':
+                self._pos += 1
+                return
+            while True:
+                child_key = yield from self._decode()
+                yield from self._expect(':')
+                yield from self._walk_value(path + (child_key,), child_key, object_fields)
+                if (yield from self._expect(',}')) == '}':
+                    return
+        elif c == '[':
+            self._pos += 1
+            rows_mode = key is not None and key in self.rows_keys
+            rows = []
+            index = 0
+            if (yield from self._peek()) == ']':
+                self._pos += 1
+            else:
+                while True:
+                    if rows_mode:
+                        ended = self._take_rows(rows)
+                        if not ended and len(rows) < self.batch_size:
+                            # The buffer ends mid-row: wait for the rest of it
+                            rows.append((yield from self._decode()))
+                            ended = (yield from self._expect(',]')) == ']'
+                        if len(rows) >= self.batch_size:
+                            yield {'path': path[:-1], 'fields': fields, 'rows': rows}
+                            rows = []
+                        if ended:
+                            break
+                        continue
+                    yield from self._walk_value(path + (index,), None, None)
+                    index += 1
+                    if (yield from self._expect(',]')) == ']':
+                        break
+            if rows:
+                yield {'path': path[:-1], 'fields': fields, 'rows': rows}
+        elif c == '':
+            raise ValueError("Incomplete JSON document")
+        else:
+            # Scalars outside of the captured keys are skipped
+            yield from self._decode()
+
+
+def iter_response_rows(response: requests.Response, rows_keys=('data_rows',), capture_keys=('column_names',),
+                       batch_size: int = 1000, chunk_size: int = 256 * 1024) -> Iterator[Dict]:
+    """
+    Yields the row batches of a response requested with stream=True, see JsonRowsParser
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='strict')
+    parser = JsonRowsParser(rows_keys=rows_keys, capture_keys=capture_keys, batch_size=batch_size)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            for batch in parser.feed(decoder.decode(chunk)):
+                yield batch
+        for batch in parser.feed(decoder.decode(b'', final=True)):
+            yield batch
+        for batch in parser.close():
+            yield batch
+    finally:
+        response.close()
@@ -0,0 +1,412 @@
+#
+# Dependency-ordered import of a set of TML files with TSRestApiV2
+#
+# Tables, worksheets / models, answers and liveboards refer to each other by name, GUID and fqn. TmlDependencyGraph
+# parses the TML set and works out which files must be imported before which. TmlWaveImporter then imports it in
+# waves: every object in a wave only depends on objects of earlier waves, so each wave is split into several
+# metadata/tml/import calls (bounded by payload size) that run in parallel:
+#
+#     importer = TmlWaveImporter(ts, workers=4, max_payload_bytes=2 * 1024 * 1024)
+#     results = importer.run(metadata_tmls=tmls)
+#
+# IncrementalTmlDeployer keeps a state file of content hashes, so a repeated deployment (e.g. from CI) only imports
+# the files that changed since the last one, plus the objects depending on them:
+#
+#     deployer = IncrementalTmlDeployer(ts, state_path='deploy_state.json')
+#     summary = deployer.deploy(metadata_tmls=tmls, keys=file_names)
+#
+# Both need a TSRestApiV2 client: they call the V2 metadata/tml/import endpoint directly.
+# YAML TML requires PyYAML: pip install thoughtspot_rest_api_v1[yaml]
+#
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+import datetime
+import hashlib
+import json
+import os
+import re
+
+import requests
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from .tsrestapiv2 import TSRestApiV2
+from .batching import chunk_by_size
+from .tml_export import write_file_atomic, _require_v2
+
+# Keys of the TML document that are not the object type
+_TML_NON_TYPE_KEYS = frozenset(['guid', 'obj_id', 'id'])
+
+# Lists of references to data objects: worksheet / answer / view 'tables', model 'model_tables'
+_REFERENCE_LIST_KEYS = frozenset(['tables', 'model_tables'])
+# Single references: table joins_with 'destination', the 'connection' of tables and SQL views
+_REFERENCE_KEYS = frozenset(['destination', 'connection'])
+
+
+def parse_tml(tml: str) -> Dict:
+    """
+    Parses a TML file given as a string, in JSON or YAML
+    """
+    if tml.lstrip().startswith('{'):
+        return json.loads(tml)
+    if yaml is None:
+        raise ImportError("Parsing YAML TML requires PyYAML: pip install thoughtspot_rest_api_v1[yaml]")
+    return yaml.safe_load(tml)
+
+
+def tml_content_hash(tml: str) -> str:
+    """
+    SHA-256 of the parsed TML, so formatting, key order and YAML vs. JSON do not count as changes
+    """
+    normalized = json.dumps(parse_tml(tml), sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+_YAML_GUID_LINE = re.compile(r'^guid:.*$', re.MULTILINE)
+
+
+def set_tml_guid(tml: str, guid: str) -> str:
+    """
+    Returns the TML with its top-level guid set to guid, so importing it updates that object. YAML is edited as
+    text, keeping the rest of the file as it was
+    """
+    if tml.lstrip().startswith('{'):
+        doc = json.loads(tml)
+        return json.dumps(dict([('guid', guid)] + [(k, v) for k, v in doc.items() if k != 'guid']), indent=2)
+    line = 'guid: {}'.format(guid)
+    if _YAML_GUID_LINE.search(tml):
+        return _YAML_GUID_LINE.sub(lambda m: line, tml, count=1)
+    return line + '\n' + tml
+
+
+def tml_type(tml_doc: Dict) -> Optional[str]:
+    for key in tml_doc:
+        if key not in _TML_NON_TYPE_KEYS:
+            return key
+    return None
+
+
+def _collect_references(value, references: Set[Tuple[Optional[str], Optional[str]]]):
+    # references are (fqn or GUID, name) pairs
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k in _REFERENCE_LIST_KEYS and isinstance(v, list):
+                for ref in v:
+                    if isinstance(ref, dict):
+                        references.add((ref.get('fqn'), ref.get('name', ref.get('id'))))
+            elif k in _REFERENCE_KEYS and isinstance(v, dict):
+                references.add((v.get('fqn'), v.get('name')))
+            _collect_references(v, references)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_references(v, references)
+
+
+class TmlObject:
+    __slots__ = ('index', 'tml', 'type', 'name', 'guid', 'references')
+
+    def __init__(self, index: int, tml: str):
+        self.index = index
+        self.tml = tml
+        doc = parse_tml(tml)
+        self.type = tml_type(doc)
+        content = doc.get(self.type, {}) if self.type is not None else {}
+        self.name = content.get('name') if isinstance(content, dict) else None
+        self.guid = doc.get('guid')
+        self.references: Set[Tuple[Optional[str], Optional[str]]] = set()
+        _collect_references(content, self.references)
+
+    def __repr__(self):
+        return 'TmlObject({} {} {})'.format(self.type, self.name, self.guid)
+
+
+class TmlDependencyGraph:
+    """
+    Dependencies between the TML files of one set, by index in the metadata_tmls list. A reference is matched on
+    GUID (fqn) first, then on name. References to objects outside of the set are assumed to exist on the server
+    and ignored
+    """
+    def __init__(self, metadata_tmls: List[str]):
+        self.objects = [TmlObject(i, tml) for i, tml in enumerate(metadata_tmls)]
+        by_guid = {}
+        by_name: Dict[str, List[int]] = {}
+        for obj in self.objects:
+            if obj.guid is not None:
+                by_guid[obj.guid] = obj.index
+            if obj.name is not None:
+                by_name.setdefault(obj.name, []).append(obj.index)
+
+        # parents: the objects each object depends on. children: the reverse
+        self.parents: List[Set[int]] = [set() for _ in self.objects]
+        self.children: List[Set[int]] = [set() for _ in self.objects]
+        for obj in self.objects:
+            for fqn, name in obj.references:
+                if fqn is not None and fqn in by_guid:
+                    matches = [by_guid[fqn]]
+                elif name is not None:
+                    # An ambiguous name depends on all the objects with that name
+                    matches = by_name.get(name, [])
+                else:
+                    matches = []
+                for parent in matches:
+                    if parent != obj.index:
+                        self.parents[obj.index].add(parent)
+                        self.children[parent].add(obj.index)
+
+    def waves(self, indexes: Optional[Set[int]] = None) -> List[List[int]]:
+        """
+        Groups the objects (or the subset in indexes) into waves, where each object only depends on objects in
+        earlier waves. Objects in a dependency cycle are put together in a final wave
+        """
+        if indexes is None:
+            indexes = set(range(len(self.objects)))
+        remaining = {i: len(self.parents[i] & indexes) for i in indexes}
+        waves = []
+        ready = sorted(i for i, count in remaining.items() if count == 0)
+        while ready:
+            waves.append(ready)
+            next_ready = []
+            for i in ready:
+                del remaining[i]
+            for i in ready:
+                for child in self.children[i]:
+                    if child in remaining:
+                        remaining[child] -= 1
+                        if remaining[child] == 0:
+                            next_ready.append(child)
+            ready = sorted(next_ready)
+        if remaining:
+            waves.append(sorted(remaining))
+        return waves
+
+    def dependents(self, indexes: Set[int]) -> Set[int]:
+        """
+        All objects that depend, directly or through others, on any of indexes (not including indexes themselves)
+        """
+        found = set()
+        stack = list(indexes)
+        while stack:
+            for child in self.children[stack.pop()]:
+                if child not in found and child not in indexes:
+                    found.add(child)
+                    stack.append(child)
+        return found
+
+
+def import_object_result(index: int, obj: Dict) -> Dict:
+    """
+    Flattens one object of a metadata/tml/import response:
+    {'index', 'status_code', 'error_message', 'guid', 'name', 'type', 'response'}
+    """
+    response = obj.get('response', obj)
+    status = response.get('status', {})
+    header = response.get('header', {})
+    return {
+        'index': index,
+        'status_code': status.get('status_code'),
+        'error_message': status.get('error_message'),
+        'guid': header.get('id_guid', header.get('id')),
+        'name': header.get('name'),
+        'type': header.get('type', header.get('metadata_type')),
+        'response': obj
+    }
+
+
+class TmlWaveImporter:
+    """
+    Imports a set of TML files in dependency order (see TmlDependencyGraph.waves()).
+
+    - workers: metadata/tml/import calls running at once within a wave
+    - max_payload_bytes / max_tmls_per_request: limits for the TML in each call
+    - max_retries: rounds of re-importing only the failed objects of a wave, before moving on
+    - import_options: other arguments of metadata_tml_import, e.g. {'skip_diff_check': True}
+
+    Objects depending on an object that failed are not imported, with status_code 'SKIPPED'
+    """
+    def __init__(self, ts: TSRestApiV2, import_policy: str = 'PARTIAL', create_new: bool = False,
+                 workers: int = 4, max_payload_bytes: int = 2 * 1024 * 1024, max_tmls_per_request: int = 50,
+                 max_retries: int = 1, import_options: Optional[Dict] = None):
+        _require_v2(ts, 'TmlWaveImporter')
+        self.ts = ts
+        self.import_policy = import_policy
+        self.create_new = create_new
+        self.workers = workers
+        self.max_payload_bytes = max_payload_bytes
+        self.max_tmls_per_request = max_tmls_per_request
+        self.max_retries = max_retries
+        self.import_options = import_options if import_options is not None else {}
+
+    def _import_chunk(self, metadata_tmls: List[str], indexes: List[int]) -> List[Dict]:
+        try:
+            response = self.ts.metadata_tml_import(metadata_tmls=[metadata_tmls[i] for i in indexes],
+                                                   import_policy=self.import_policy, create_new=self.create_new,
+                                                   **self.import_options)
+        except requests.exceptions.RequestException as e:
+            if getattr(e, 'response', None) is not None:
+                error = 'HTTP {}: {}'.format(e.response.status_code, e.response.text)
+            else:
+                error = '{}: {}'.format(type(e).__name__, e)
+            return [{'index': i, 'status_code': 'ERROR', 'error_message': error, 'guid': None, 'name': None,
+                     'type': None, 'response': None} for i in indexes]
+        # One response object per TML, in the order sent
+        results = []
+        for position, index in enumerate(indexes):
+            if position < len(response):
+                results.append(import_object_result(index, response[position]))
+            else:
+                results.append({'index': index, 'status_code': 'ERROR', 'error_message': 'No response for object',
+                                'guid': None, 'name': None, 'type': None, 'response': None})
+        return results
+
+    def import_wave(self, metadata_tmls: List[str], indexes: List[int],
+                    executor: ThreadPoolExecutor) -> Dict[int, Dict]:
+        """
+        Imports one wave, re-importing only the failed objects up to max_retries times. Returns {index: result}
+        """
+        results = {}
+        to_import = indexes
+        for attempt in range(self.max_retries + 1):
+            chunks = [[to_import[i] for i in chunk]
+                      for chunk in chunk_by_size([metadata_tmls[i] for i in to_import],
+                                                 max_bytes=self.max_payload_bytes,
+                                                 max_items=self.max_tmls_per_request)]
+            for chunk_results in executor.map(lambda c: self._import_chunk(metadata_tmls, c), chunks):
+                for result in chunk_results:
+                    result['attempts'] = attempt + 1
+                    results[result['index']] = result
+            to_import = [i for i in to_import if results[i]['status_code'] == 'ERROR']
+            if len(to_import) == 0:
+                break
+        return results
+
+    def run(self, metadata_tmls: List[str], graph: Optional[TmlDependencyGraph] = None,
+            indexes: Optional[Set[int]] = None) -> List[Dict]:
+        """
+        Imports the TMLs (or only those in indexes) and returns one result per TML imported, in input order:
+        {'index', 'wave', 'attempts', 'status_code', 'error_message', 'guid', 'name', 'type', 'response'}
+        """
+        if graph is None:
+            graph = TmlDependencyGraph(metadata_tmls)
+        results: Dict[int, Dict] = {}
+        failed = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ts-tml-import') as executor:
+            for wave_number, wave in enumerate(graph.waves(indexes)):
+                skipped = [i for i in wave if graph.parents[i] & failed]
+                for i in skipped:
+                    results[i] = {'index': i, 'wave': wave_number, 'attempts': 0, 'status_code': 'SKIPPED',
+                                  'error_message': 'Depends on an object that failed to import', 'guid': None,
+                                  'name': graph.objects[i].name, 'type': graph.objects[i].type, 'response': None}
+                    failed.add(i)
+                to_import = [i for i in wave if i not in failed]
+                if len(to_import) == 0:
+                    continue
+                for i, result in self.import_wave(metadata_tmls, to_import, executor).items():
+                    result['wave'] = wave_number
+                    results[i] = result
+                    if result['status_code'] == 'ERROR':
+                        failed.add(i)
+        return [results[i] for i in sorted(results)]
+
+
+class IncrementalTmlDeployer:
+    """
+    Imports only the TML files whose content changed since the last deployment recorded in state_path, plus every
+    object depending on them (so that e.g. the liveboards on a changed worksheet are imported again too).
+
+    The state file is JSON, with an entry per object key: {'hash', 'guid', 'type', 'name', 'deployed_at'}. The guid is
+    the one returned by the import, and is written into the TML of that key on the next deployment, so the object is
+    updated rather than created again. Keys identify the same object across deployments: pass the file names (or any
+    stable ids) as keys, otherwise the TML guid is used, or 'type:name' for TML without a guid.
+    Only objects imported successfully are recorded, so failed objects are tried again on the next deployment.
+    Requires a TSRestApiV2 client
+    """
+    def __init__(self, ts: TSRestApiV2, state_path: str, importer: Optional[TmlWaveImporter] = None):
+        _require_v2(ts, 'IncrementalTmlDeployer')
+        self.ts = ts
+        self.state_path = state_path
+        self.importer = importer if importer is not None else TmlWaveImporter(ts)
+
+    def load_state(self) -> Dict:
+        if not os.path.exists(self.state_path):
+            return {'objects': {}}
+        with open(self.state_path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+
+    def save_state(self, state: Dict):
+        write_file_atomic(self.state_path, json.dumps(state, indent=2, sort_keys=True).encode('utf-8'))
+
+    @staticmethod
+    def default_keys(graph: TmlDependencyGraph) -> List[str]:
+        return [obj.guid if obj.guid is not None else '{}:{}'.format(obj.type, obj.name) for obj in graph.objects]
+
+    def plan(self, metadata_tmls: List[str], keys: Optional[List[str]] = None,
+             graph: Optional[TmlDependencyGraph] = None) -> Dict:
+        """
+        Works out what deploy() would import, without importing:
+        {'keys', 'hashes', 'changed': [index], 'dependents': [index], 'unchanged': [index]}
+        """
+        if graph is None:
+            graph = TmlDependencyGraph(metadata_tmls)
+        if keys is None:
+            keys = self.default_keys(graph)
+        if len(keys) != len(metadata_tmls):
+            raise ValueError("keys must have one entry per TML")
+        if len(set(keys)) != len(keys):
+            raise ValueError("keys must be unique")
+
+        deployed = self.load_state()['objects']
+        hashes = [tml_content_hash(tml) for tml in metadata_tmls]
+        changed = {i for i, key in enumerate(keys) if key not in deployed or deployed[key]['hash'] != hashes[i]}
+        dependents = graph.dependents(changed)
+        return {
+            'keys': keys,
+            'hashes': hashes,
+            'changed': sorted(changed),
+            'dependents': sorted(dependents),
+            'unchanged': sorted(set(range(len(metadata_tmls))) - changed - dependents)
+        }
+
+    def deploy(self, metadata_tmls: List[str], keys: Optional[List[str]] = None, force: bool = False) -> Dict:
+        """
+        Imports the changed TMLs and their dependents (all of them with force=True) in dependency order, and
+        records the successful ones in the state file. Returns the plan (see plan()) with 'results' added,
+        one per imported TML (see TmlWaveImporter.run())
+        """
+        graph = TmlDependencyGraph(metadata_tmls)
+        plan = self.plan(metadata_tmls, keys=keys, graph=graph)
+        if force:
+            plan['changed'] = list(range(len(metadata_tmls)))
+            plan['dependents'] = []
+            plan['unchanged'] = []
+        to_import = set(plan['changed']) | set(plan['dependents'])
+
+        # Objects deployed before are imported with the GUID they were given, so they are updated in place
+        state = self.load_state()
+        tmls_to_send = list(metadata_tmls)
+        for i in to_import:
+            deployed = state['objects'].get(plan['keys'][i])
+            if deployed is not None and deployed.get('guid') is not None and deployed['guid'] != graph.objects[i].guid:
+                tmls_to_send[i] = set_tml_guid(metadata_tmls[i], deployed['guid'])
+
+        results = []
+        if len(to_import) > 0:
+            results = self.importer.run(tmls_to_send, graph=graph, indexes=to_import)
+
+        deployed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        for result in results:
+            if result['status_code'] in ('OK', 'WARNING'):
+                i = result['index']
+                state['objects'][plan['keys'][i]] = {
+                    'hash': plan['hashes'][i],
+                    'guid': result['guid'] if result['guid'] is not None else graph.objects[i].guid,
+                    'type': graph.objects[i].type,
+                    'name': graph.objects[i].name,
+                    'deployed_at': deployed_at
+                }
+        self.save_state(state)
+
+        plan['results'] = results
+        return plan
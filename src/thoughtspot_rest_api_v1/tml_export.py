@@ -0,0 +1,189 @@
+#
+# Parallel TML export to disk, for backing up many objects (or a whole org) with TSRestApiV2
+#
+# GUIDs (given directly, or found with a metadata/search request) are grouped into metadata/tml/export calls of
+# objects_per_request objects each, run on a pool of `workers` threads. Each edoc is written to its own file as
+# soon as its response arrives, so memory use depends on the number of workers, not the number of objects.
+# A manifest.json listing every object (guid, type, name, file, bytes, sha256, status) is written at the end:
+#
+#     ts = TSRestApiV2(server_url=server, pool_maxsize=8)
+#     ts.bearer_token = ...
+#     exporter = TmlExporter(ts, output_dir='backup/2024-06-01', workers=8)
+#     summary = exporter.export(metadata_search_request={'metadata': [{'type': 'LIVEBOARD'}]})
+#
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterable, Iterator, List, Optional
+import hashlib
+import json
+import os
+import re
+import time
+
+import requests
+
+from .tsrestapiv2 import TSRestApiV2
+from .tsrestapiv2async import TSRestApiV2Async
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+_unsafe_file_chars = re.compile(r'[^A-Za-z0-9_.\-]+')
+
+
+def _require_v2(ts, user: str):
+    # TSRestApiV2Async is a TSRestApiV2 too, but its methods return awaitables
+    if not isinstance(ts, TSRestApiV2) or isinstance(ts, TSRestApiV2Async):
+        raise TypeError("{} requires a TSRestApiV2 client, not {}".format(user, type(ts).__name__))
+
+
+def write_file_atomic(file_path: str, content: bytes):
+    # Written to a temporary name first, so an interrupted run never leaves a truncated file in place
+    tmp_path = '{}.tmp'.format(file_path)
+    with open(tmp_path, 'wb') as fh:
+        fh.write(content)
+    os.replace(tmp_path, file_path)
+
+
+class TmlExporter:
+    """
+    Exports TML with a bounded pool of threads and writes each object to output_dir as '{guid}.{type}.tml'.
+
+    - workers: number of concurrent metadata/tml/export calls. Set pool_maxsize on the TSRestApiV2 object to at least
+      this number, so the connections are reused
+    - objects_per_request: GUIDs sent in each metadata/tml/export call. Fewer, larger calls reduce round trips, but
+      one failing object fails its whole call, whose objects are then retried one by one
+    - edoc_format: 'YAML' or 'JSON'
+    - export_options: passed through as the export_options of metadata/tml/export
+
+    Only TSRestApiV2 is supported: TSRestApiV1.metadata_tml_export_string() returns a single object per call with
+    no info block, so use a loop over it for V1
+    """
+    def __init__(self, ts: TSRestApiV2, output_dir: str, workers: int = 8, objects_per_request: int = 10,
+                 edoc_format: str = 'YAML', export_fqn: bool = True, export_options: Optional[Dict] = None):
+        _require_v2(ts, 'TmlExporter')
+        self.ts = ts
+        self.output_dir = output_dir
+        self.workers = workers
+        self.objects_per_request = objects_per_request
+        self.edoc_format = edoc_format.upper()
+        self.export_fqn = export_fqn
+        self.export_options = export_options
+
+    @staticmethod
+    def file_name(guid: str, tml_type: Optional[str]) -> str:
+        if tml_type is None:
+            return '{}.tml'.format(_unsafe_file_chars.sub('_', guid))
+        return '{}.{}.tml'.format(_unsafe_file_chars.sub('_', guid), _unsafe_file_chars.sub('_', tml_type.lower()))
+
+    def _manifest_row(self, guid: str, info: Optional[Dict] = None, edoc: Optional[str] = None,
+                      error: Optional[str] = None) -> Dict:
+        info = info if info is not None else {}
+        row = {
+            'guid': guid,
+            'type': info.get('type'),
+            'name': info.get('name'),
+            'file': None,
+            'bytes': 0,
+            'sha256': None,
+            'status': 'OK' if error is None else 'ERROR',
+            'error': error
+        }
+        if edoc is not None and error is None:
+            content = edoc.encode('utf-8')
+            file_name = self.file_name(guid, info.get('type'))
+            write_file_atomic(os.path.join(self.output_dir, file_name), content)
+            row['file'] = file_name
+            row['bytes'] = len(content)
+            row['sha256'] = hashlib.sha256(content).hexdigest()
+        return row
+
+    def _export_request(self, guids: List[str]) -> List[Dict]:
+        return self.ts.metadata_tml_export(metadata_ids=guids, export_fqn=self.export_fqn,
+                                           edoc_format=self.edoc_format, export_options=self.export_options)
+
+    def _export_chunk(self, guids: List[str]) -> List[Dict]:
+        """
+        Runs on a worker thread: one metadata/tml/export call, with each edoc written to disk as soon as it returns
+        """
+        try:
+            response = self._export_request(guids)
+        except requests.exceptions.RequestException as e:
+            if len(guids) > 1:
+                # Isolate the object(s) causing the failure
+                rows = []
+                for guid in guids:
+                    rows.extend(self._export_chunk([guid]))
+                return rows
+            if e.response is not None:
+                error = 'HTTP {}: {}'.format(e.response.status_code, e.response.text)
+            else:
+                error = '{}: {}'.format(type(e).__name__, e)
+            return [self._manifest_row(guids[0], error=error)]
+
+        rows = []
+        returned = set()
+        for obj in response:
+            info = obj.get('info', {})
+            guid = info.get('id')
+            status = info.get('status', {})
+            if status.get('status_code', 'OK') == 'ERROR':
+                rows.append(self._manifest_row(guid, info=info, error=status.get('error_message', 'ERROR')))
+            else:
+                rows.append(self._manifest_row(guid, info=info, edoc=obj.get('edoc')))
+            returned.add(guid)
+        for guid in guids:
+            if guid not in returned:
+                rows.append(self._manifest_row(guid, error='Not returned by metadata/tml/export'))
+        return rows
+
+    def _chunks(self, guids: Iterable[str]) -> Iterator[List[str]]:
+        chunk = []
+        for guid in guids:
+            chunk.append(guid)
+            if len(chunk) == self.objects_per_request:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    def export(self, guids: Optional[Iterable[str]] = None, metadata_search_request: Optional[Dict] = None,
+               search_page_size: int = 500) -> Dict:
+        """
+        Exports the GUIDs, or the objects found by metadata_search_request (paged through with metadata_search_iter,
+        so exports start while the search is still being paged). Returns a summary:
+        {'exported', 'errors', 'bytes_written', 'duration_seconds', 'manifest_path'}
+        """
+        if guids is None and metadata_search_request is None:
+            raise ValueError("Either guids or metadata_search_request is required")
+        if guids is None:
+            guids = (header['metadata_id'] for header in
+                     self.ts.metadata_search_iter(request=metadata_search_request, page_size=search_page_size))
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        started_at = time.perf_counter()
+        manifest = []
+        seen = set()
+        unique_guids = (g for g in guids if not (g in seen or seen.add(g)))
+
+        # At most 2 chunks per worker are queued, so a very long GUID list is not all submitted up front
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ts-tml-export') as executor:
+            pending = set()
+            for chunk in self._chunks(unique_guids):
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        manifest.extend(future.result())
+                pending.add(executor.submit(self._export_chunk, chunk))
+            for future in pending:
+                manifest.extend(future.result())
+
+        manifest.sort(key=lambda r: (r['type'] or '', r['name'] or '', r['guid'] or ''))
+        manifest_path = os.path.join(self.output_dir, MANIFEST_FILE_NAME)
+        write_file_atomic(manifest_path, json.dumps(manifest, indent=2).encode('utf-8'))
+
+        return {
+            'exported': sum(1 for r in manifest if r['status'] == 'OK'),
+            'errors': sum(1 for r in manifest if r['status'] == 'ERROR'),
+            'bytes_written': sum(r['bytes'] for r in manifest),
+            'duration_seconds': time.perf_counter() - started_at,
+            'manifest_path': manifest_path
+        }
@@ -0,0 +1,206 @@
+#
+# Job manager for the asynchronous TML import endpoints of TSRestApiV2 (metadata/tml/async/import and
+# metadata/tml/async/status)
+#
+# The TMLs are split into tasks of tmls_per_task files, with up to max_tasks_in_flight tasks submitted at a time.
+# All running tasks are polled with a single status request, at an interval that starts at poll_interval and
+# grows by poll_backoff (up to poll_interval_max) while nothing changes, so short imports finish quickly and long
+# ones do not flood the server. The result for each TML is yielded as soon as its task completes:
+#
+#     manager = TmlImportJobManager(ts, import_policy='PARTIAL', checkpoint_path='import_checkpoint.json')
+#     for result in manager.run(metadata_tmls=tmls):
+#         print(result['index'], result['status_code'], result['name'], result['error_message'])
+#
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+
+from .tsrestapiv2 import TSRestApiV2
+from .tml_export import write_file_atomic, _require_v2
+
+# task_status values after which a task does not change any more
+TERMINAL_TASK_STATUSES = frozenset(['COMPLETED', 'FAILED', 'CANCELLED', 'ERROR'])
+
+
+class TmlImportJobManager:
+    """
+    - tmls_per_task: TML files sent in each metadata/tml/async/import call
+    - max_tasks_in_flight: tasks submitted and not yet finished at any time
+    - checkpoint_path: a JSON file recording the submitted tasks and which have finished. If run() is interrupted
+      and called again with the same TMLs and checkpoint_path, tasks already submitted are polled rather than
+      submitted again, and tasks whose results were all yielded are skipped
+    - import_options: other arguments of metadata_tml_async_import, e.g. {'skip_diff_check': True}
+
+    cancel() (from another thread, or from the loop consuming run()) stops the submission of further tasks and
+    ends run() at the next poll. There is no endpoint to stop a task that the server has already started
+    """
+    def __init__(self, ts: TSRestApiV2, import_policy: str = 'PARTIAL', create_new: bool = False,
+                 tmls_per_task: int = 50, max_tasks_in_flight: int = 4,
+                 poll_interval: float = 1.0, poll_interval_max: float = 30.0, poll_backoff: float = 1.5,
+                 checkpoint_path: Optional[str] = None, import_options: Optional[Dict] = None):
+        _require_v2(ts, 'TmlImportJobManager')
+        self.ts = ts
+        self.import_policy = import_policy
+        self.create_new = create_new
+        self.tmls_per_task = tmls_per_task
+        self.max_tasks_in_flight = max_tasks_in_flight
+        self.poll_interval = poll_interval
+        self.poll_interval_max = poll_interval_max
+        self.poll_backoff = poll_backoff
+        self.checkpoint_path = checkpoint_path
+        self.import_options = import_options if import_options is not None else {}
+        self._cancelled = threading.Event()
+        # task_id: {'start': int, 'end': int, 'task_status': str, 'finished': bool}
+        self.tasks: Dict[str, Dict] = {}
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    #
+    # Checkpoint file
+    #
+    @staticmethod
+    def _fingerprint(metadata_tmls: List[str]) -> str:
+        digest = hashlib.sha256()
+        for tml in metadata_tmls:
+            digest.update(tml.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _load_checkpoint(self, fingerprint: str) -> int:
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as fh:
+            checkpoint = json.load(fh)
+        if checkpoint['fingerprint'] != fingerprint:
+            raise ValueError("Checkpoint {} was written for a different set of TMLs".format(self.checkpoint_path))
+        self.tasks = checkpoint['tasks']
+        return checkpoint['next_index']
+
+    def _save_checkpoint(self, fingerprint: str, next_index: int):
+        if self.checkpoint_path is None:
+            return
+        checkpoint = {'fingerprint': fingerprint, 'next_index': next_index, 'tasks': self.tasks}
+        write_file_atomic(self.checkpoint_path, json.dumps(checkpoint, indent=2).encode('utf-8'))
+
+    #
+    # Requests
+    #
+    def _submit(self, metadata_tmls: List[str], start: int) -> List[Tuple[str, int, int]]:
+        """
+        Returns (task_id, start, end) for each task created. With the client's tml_import_max_bytes /
+        tml_import_max_objects set, the TMLs may be sent as several tasks, listed in 'task_ids' in chunk order
+        """
+        response = self.ts.metadata_tml_async_import(metadata_tmls=metadata_tmls, import_policy=self.import_policy,
+                                                     create_new=self.create_new, **self.import_options)
+        task_ids = response.get('task_ids', [response['task_id']])
+        chunks = self.ts.tml_import_chunks(metadata_tmls)
+        if len(chunks) != len(task_ids):
+            raise ValueError("{} tasks returned for {} import chunks".format(len(task_ids), len(chunks)))
+        return [(task_id, start + chunk[0], start + chunk[-1] + 1) for task_id, chunk in zip(task_ids, chunks)]
+
+    def _status(self, task_ids: List[str]) -> List[Dict]:
+        response = self.ts.metadata_tml_async_status(request={
+            'task_ids': task_ids,
+            'include_import_response': True,
+            'record_offset': 0,
+            'record_size': len(task_ids)
+        })
+        return response.get('status_list', []) if isinstance(response, dict) else response
+
+    @staticmethod
+    def _object_results(task_id: str, task: Dict, status: Dict) -> List[Dict]:
+        """
+        One result per TML of the task, in input order. index is the position in the metadata_tmls list
+        """
+        import_response = status.get('import_response') or {}
+        objects = import_response.get('object', []) if isinstance(import_response, dict) else import_response
+        results = []
+        for i, index in enumerate(range(task['start'], task['end'])):
+            if i < len(objects):
+                response = objects[i].get('response', objects[i])
+                object_status = response.get('status', {})
+                header = response.get('header', {})
+                results.append({
+                    'index': index,
+                    'task_id': task_id,
+                    'status_code': object_status.get('status_code'),
+                    'error_message': object_status.get('error_message'),
+                    'guid': header.get('id_guid', header.get('id')),
+                    'name': header.get('name'),
+                    'type': header.get('type', header.get('metadata_type')),
+                    'response': objects[i]
+                })
+            else:
+                # Task failed as a whole, or returned no result for this TML
+                results.append({
+                    'index': index,
+                    'task_id': task_id,
+                    'status_code': 'ERROR',
+                    'error_message': status.get('status_message', 'Task {}'.format(status.get('task_status'))),
+                    'guid': None,
+                    'name': None,
+                    'type': None,
+                    'response': None
+                })
+        return results
+
+    def run(self, metadata_tmls: List[str]) -> Iterator[Dict]:
+        """
+        Submits the TMLs and yields one result Dict per TML as its task finishes:
+        {'index', 'task_id', 'status_code', 'error_message', 'guid', 'name', 'type', 'response'}
+        """
+        fingerprint = self._fingerprint(metadata_tmls)
+        next_index = self._load_checkpoint(fingerprint)
+        interval = self.poll_interval
+
+        while not self.cancelled:
+            running = [task_id for task_id, task in self.tasks.items() if not task['finished']]
+
+            # Top up the tasks in flight
+            while (not self.cancelled and len(running) < self.max_tasks_in_flight
+                   and next_index < len(metadata_tmls)):
+                end = min(next_index + self.tmls_per_task, len(metadata_tmls))
+                for task_id, task_start, task_end in self._submit(metadata_tmls[next_index:end], next_index):
+                    self.tasks[task_id] = {'start': task_start, 'end': task_end, 'task_status': 'SUBMITTED',
+                                           'finished': False}
+                    running.append(task_id)
+                next_index = end
+                self._save_checkpoint(fingerprint, next_index)
+
+            if len(running) == 0:
+                return
+
+            # Returns early if cancel() is called while waiting
+            if self._cancelled.wait(interval):
+                return
+
+            changed = False
+            for status in self._status(running):
+                task_id = status.get('task_id')
+                task = self.tasks.get(task_id)
+                if task is None or task['finished']:
+                    continue
+                task_status = status.get('task_status')
+                if task_status != task['task_status']:
+                    changed = True
+                    task['task_status'] = task_status
+                if task_status in TERMINAL_TASK_STATUSES:
+                    for result in self._object_results(task_id, task, status):
+                        yield result
+                    # Recorded once every result has been handed over, so a run interrupted while the results were
+                    # being handled polls the task again and yields them again
+                    task['finished'] = True
+                    self._save_checkpoint(fingerprint, next_index)
+
+            # Poll quickly while tasks are moving, back off while they are all still running
+            if changed:
+                interval = self.poll_interval
+            else:
+                interval = min(interval * self.poll_backoff, self.poll_interval_max)
@@ -0,0 +1,293 @@
+#
+# Connection pool helpers and the requests.Session used by TSRestApiV1 and TSRestApiV2
+#
+# requests mounts an HTTPAdapter per URL prefix, and each adapter owns a urllib3 PoolManager which keeps one
+# connection pool per host. The adapters below are drop-in HTTPAdapter / TCPKeepAliveAdapter replacements whose
+# pools count how connections are used, so the pool can be sized from real numbers under load
+#
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.adapters.socket_options import TCPKeepAliveAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .instrumentation import Instrumentation, RequestRecord, endpoint_template, body_length
+from .auth import BearerTokenManager
+from .cache import ResponseCache
+from .singleflight import RequestCoalescer
+
+
+class PoolStats:
+    """
+    Thread-safe counters for the connections of one adapter (all hosts):
+
+    - connections_opened: new TCP (and TLS) connections, including reconnects of dropped connections
+    - connections_reused: requests that were served on an already open pooled connection
+    - connections_discarded: connections closed on return because the pool was already full
+      (frequent discards mean pool_maxsize is too small for the number of threads)
+    - checkouts: total connections taken from the pool, one per HTTP request attempt
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.connections_discarded = 0
+        self.checkouts = 0
+
+    def increment(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'connections_opened': self.connections_opened,
+                'connections_reused': self.connections_reused,
+                'connections_discarded': self.connections_discarded,
+                'checkouts': self.checkouts
+            }
+
+    def reset(self):
+        with self._lock:
+            self.connections_opened = 0
+            self.connections_reused = 0
+            self.connections_discarded = 0
+            self.checkouts = 0
+
+
+class _StatsPoolMixin:
+    # Bound to a PoolStats object per adapter by PoolStatsMixin.init_poolmanager()
+    pool_stats: Optional[PoolStats] = None
+
+    def _new_conn(self):
+        self.pool_stats.increment('connections_opened')
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        self.pool_stats.increment('checkouts')
+        if getattr(conn, 'ts_pooled', False):
+            # urllib3 closes dropped connections before handing them out, which then reconnect on use
+            if getattr(conn, 'sock', None) is not None:
+                self.pool_stats.increment('connections_reused')
+            else:
+                self.pool_stats.increment('connections_opened')
+        else:
+            conn.ts_pooled = True
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None and self.pool is not None and self.pool.full():
+            self.pool_stats.increment('connections_discarded')
+        return super()._put_conn(conn)
+
+
+class PoolStatsMixin:
+    """
+    Mixin for requests HTTPAdapter classes that swaps in connection pools which record PoolStats
+    """
+    pool_stats: Optional[PoolStats] = None
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # Called from HTTPAdapter.__init__ (and when unpickling), so the stats object is created here
+        if self.pool_stats is None:
+            self.pool_stats = PoolStats()
+        stats = self.pool_stats
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('StatsHTTPConnectionPool', (_StatsPoolMixin, HTTPConnectionPool), {'pool_stats': stats}),
+            'https': type('StatsHTTPSConnectionPool', (_StatsPoolMixin, HTTPSConnectionPool), {'pool_stats': stats})
+        }
+
+
+class PoolStatsAdapter(PoolStatsMixin, HTTPAdapter):
+    pass
+
+
+class TCPKeepAlivePoolStatsAdapter(PoolStatsMixin, TCPKeepAliveAdapter):
+    pass
+
+
+def build_pool_adapter(pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                       tcp_keep_alive: bool = False, keep_alive_idle: int = 120, keep_alive_count: int = 20,
+                       keep_alive_interval: int = 30) -> HTTPAdapter:
+    """
+    :param pool_connections: number of per-host pools to keep (distinct servers the client talks to)
+    :param pool_maxsize: maximum connections kept open per host. Set to at least the number of threads sharing
+        the client, otherwise connections are discarded after each request and TLS handshakes pile up
+    :param pool_block: when True, threads wait for a free connection instead of opening one beyond pool_maxsize
+    :param tcp_keep_alive: use TCPKeepAliveAdapter socket options, for long-running calls such as TML import
+    """
+    pool_args = {
+        'pool_connections': pool_connections,
+        'pool_maxsize': pool_maxsize,
+        'pool_block': pool_block
+    }
+    if tcp_keep_alive is True:
+        return TCPKeepAlivePoolStatsAdapter(idle=keep_alive_idle, count=keep_alive_count,
+                                            interval=keep_alive_interval, **pool_args)
+    return PoolStatsAdapter(**pool_args)
+
+
+def session_pool_stats(requests_session) -> Dict[str, int]:
+    """
+    Sums the PoolStats of every distinct adapter mounted on a requests.Session
+    """
+    totals = PoolStats().as_dict()
+    seen = set()
+    for adapter in requests_session.adapters.values():
+        stats = getattr(adapter, 'pool_stats', None)
+        if stats is None or id(stats) in seen:
+            continue
+        seen.add(id(stats))
+        for k, v in stats.as_dict().items():
+            totals[k] += v
+    return totals
+
+
+class TSRequestsSession(requests.Session):
+    """
+    requests.Session used by TSRestApiV1 and TSRestApiV2. Every endpoint method of both classes ends up in send(),
+    so this is where behavior that must apply to all calls (retries, rate limiting, instrumentation, bearer token
+    refresh) is implemented
+    """
+    def __init__(self, retry_policy: Optional[RetryPolicy] = None, rate_limiter: Optional[RateLimiter] = None):
+        super().__init__()
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.instrumentation = Instrumentation()
+        # When set, requests without their own Authorization header are sent with the manager's current token
+        self.token_manager: Optional[BearerTokenManager] = None
+        # Responses of read-only endpoints, see ResponseCache
+        self.response_cache: Optional[ResponseCache] = None
+        # Identical read-only requests in flight at the same time share one HTTP call, see RequestCoalescer
+        self.request_coalescer: Optional[RequestCoalescer] = None
+
+    def shared_copy(self) -> 'TSRequestsSession':
+        """
+        A new session using the same adapters (so the same connection pools), retry policy, rate limiter and
+        instrumentation, with its own headers, cookies and token_manager
+        """
+        session = TSRequestsSession(retry_policy=self.retry_policy, rate_limiter=self.rate_limiter)
+        session.instrumentation = self.instrumentation
+        session.response_cache = self.response_cache
+        session.request_coalescer = self.request_coalescer
+        for prefix, adapter in self.adapters.items():
+            session.mount(prefix, adapter)
+        session.headers.update(self.headers)
+        session.headers.pop('Authorization', None)
+        session.verify = self.verify
+        session.cert = self.cert
+        session.proxies = dict(self.proxies)
+        session.trust_env = self.trust_env
+        return session
+
+    def send_once(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        # Every attempt, including retries, counts against the rate limit
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(request.url)
+        return super().send(request, **kwargs)
+
+    # Returns the final response and the number of retries it took
+    def send_with_retries(self, request: requests.PreparedRequest, **kwargs) -> Tuple[requests.Response, int]:
+        policy = self.retry_policy
+        if policy is None:
+            return self.send_once(request, **kwargs), 0
+
+        attempt = 0
+        while True:
+            try:
+                response = self.send_once(request, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if not policy.should_retry_exception(request.method, request.url, e, attempt):
+                    raise
+                delay = policy.backoff(attempt)
+            else:
+                if not policy.should_retry_response(request.method, request.url, response.status_code, attempt):
+                    return response, attempt
+                delay = policy.delay_for_response(response.headers, attempt)
+                # Return the connection to the pool before waiting
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        manager = self.token_manager
+        # The token request of a refresh is sent as is: the old token may have expired already, and a 401 to it
+        # cannot be fixed by yet another refresh
+        if manager is None or 'Authorization' in request.headers or manager.refreshing_on_this_thread():
+            return self.send_cached(request, **kwargs)
+
+        token = manager.token()
+        if token is None:
+            return self.send_cached(request, **kwargs)
+        request.headers['Authorization'] = 'Bearer {}'.format(token)
+        response = self.send_cached(request, **kwargs)
+        if response.status_code != 401:
+            return response
+
+        # Token revoked or expired early: concurrent 401s for the same token share a single refresh
+        new_token = manager.refresh_after_unauthorized(token)
+        if new_token is None or new_token == token:
+            return response
+        response.close()
+        request.headers['Authorization'] = 'Bearer {}'.format(new_token)
+        return self.send_cached(request, **kwargs)
+
+    def send_cached(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        cache = self.response_cache
+        if cache is None:
+            return self.send_coalesced(request, **kwargs)
+        # Streamed responses are never cached, but a streamed mutating call still invalidates
+        key, response = (None, None) if kwargs.get('stream') else cache.get(request.method, request.url,
+                                                                             request.body, request.headers)
+        if response is not None:
+            return response
+        if key is None:
+            response = self.send_coalesced(request, **kwargs)
+            # Only once the change is made, so a concurrent read cannot cache the state from before it
+            cache.response_received(request.method, request.url, response.status_code)
+            return response
+        generation = cache.generation(request.url)
+        response = self.send_coalesced(request, **kwargs)
+        cache.put(key, request.url, response, generation)
+        return response
+
+    def send_coalesced(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        coalescer = self.request_coalescer
+        # Streamed responses can only be read once, so they are never shared
+        if coalescer is None or kwargs.get('stream'):
+            return self.send_recorded(request, **kwargs)
+        return coalescer.send(request.method, request.url, request.body, request.headers,
+                              lambda: self.send_recorded(request, **kwargs))
+
+    def send_recorded(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if not self.instrumentation:
+            return self.send_with_retries(request, **kwargs)[0]
+
+        start = time.perf_counter()
+        try:
+            response, retries = self.send_with_retries(request, **kwargs)
+        except Exception as e:
+            self.instrumentation.emit(RequestRecord(endpoint=endpoint_template(request.url), method=request.method,
+                                                    status=None, latency_seconds=time.perf_counter() - start,
+                                                    request_bytes=body_length(request.body), response_bytes=0,
+                                                    error=type(e).__name__))
+            raise
+        latency = time.perf_counter() - start
+
+        # Streamed responses haven't been read yet, so only the declared length is known
+        if kwargs.get('stream'):
+            response_bytes = int(response.headers.get('Content-Length', 0))
+        else:
+            response_bytes = len(response.content)
+        self.instrumentation.emit(RequestRecord(endpoint=endpoint_template(request.url), method=request.method,
+                                                status=response.status_code, latency_seconds=latency,
+                                                request_bytes=body_length(request.body),
+                                                response_bytes=response_bytes, retries=retries))
+        return response
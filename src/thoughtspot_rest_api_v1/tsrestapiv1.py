@@ -12,12 +12,26 @@
 #   and notes written throughout to help the reader understand more.
 #
 from collections import OrderedDict
-from typing import Optional, Dict, List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Union, Callable, Iterator
 import json
+import time
 
 import requests
 from requests_toolbelt.adapters.socket_options import TCPKeepAliveAdapter
 
+from .transport import build_pool_adapter, session_pool_stats, TCPKeepAlivePoolStatsAdapter, TSRequestsSession
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .auth import BearerTokenManager
+from .cache import ResponseCache
+from .singleflight import RequestCoalescer
+from .instrumentation import RequestRecord
+from .codec import JsonCodec, get_json_codec
+from .batching import split_ids_for_url, merge_responses, DEFAULT_MAX_URL_LENGTH, chunk_by_size, form_item_size
+from .pagination import iter_offset_pages, is_last_batch, page_items
+from .streaming import stream_response_to_file, iter_response_rows, FileDestination, DEFAULT_CHUNK_SIZE
+
 
 class MetadataTypes:
     """
@@ -154,7 +168,9 @@ class TSRestApiV1:
     Other than sharing a requests.Session with the appropriate settings, each method
     is written to be relatively self-contained, for those wishing to re-implement in their own code
     """
-    def __init__(self, server_url: str):
+    def __init__(self, server_url: str, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 tcp_keep_alive: bool = False, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, json_codec: Union[str, JsonCodec] = 'json'):
         # Protect from extra end slash on URL
         if server_url[-1] == '/':
             server_url = server_url[0:-1]
@@ -162,7 +178,11 @@ class TSRestApiV1:
         self.server = server_url
 
         # REST API uses cookies to maintain the session, so you need to create an open Session
-        self.requests_session = requests.Session()
+        # TSRequestsSession is a requests.Session that applies the retry_policy and rate_limiter (if any) to every call
+        self.requests_session = TSRequestsSession(retry_policy=retry_policy, rate_limiter=rate_limiter)
+        # Connection pool sizing, see configure_connection_pool()
+        self.configure_connection_pool(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                       pool_block=pool_block, tcp_keep_alive=tcp_keep_alive)
 
         # X-Requested-By             is necessary for all calls.
         # Accept: application/json   isn't necessary with requests (default: Accept: */*) but might be in other frameworks
@@ -180,19 +200,99 @@ class TSRestApiV1:
         # Flag for whether the version implements the export_fqn option of metadata/tml/export
         self.can_export_fqn = True
 
+        # JSON library for responses and TML bodies: 'json' (stdlib), 'orjson', 'ujson' or 'auto', see codec.py
+        self.json_codec = get_json_codec(json_codec)
+        # metadata_tml_export methods return the response as OrderedDicts, set to False for faster plain dicts
+        self.tml_ordered_dict = True
+
+        # GUID lists in URLs are split so each URL stays under max_url_length, with up to max_parallel_requests
+        # of the resulting requests in flight at once, see get_request_batched_ids()
+        self.max_url_length = DEFAULT_MAX_URL_LENGTH
+        self.max_parallel_requests = 8
+
+        # metadata_tml_import splits the TML into several requests of at most tml_import_max_bytes (form-encoded)
+        # and tml_import_max_objects each. None means no limit
+        self.tml_import_max_bytes: Optional[int] = None
+        self.tml_import_max_objects: Optional[int] = None
+        # Chunks validated at once with validate_only=True. Imports are ALL_OR_NONE, so their chunks are sent one
+        # after another, stopping at the first that fails
+        self.tml_import_max_parallel = 4
+
         # Can be set after initial request
         # V1 API can use bearer auth in headers just like V2.0
         self.__bearer_token = None
 
     # The following two methods allow for modifying the session for long-lived purposes, particularly TML import
     @staticmethod
-    def get_default_tcp_keep_alive_adaptor() -> TCPKeepAliveAdapter:
-        return TCPKeepAliveAdapter(idle=120, count=20, interval=30)
+    def get_default_tcp_keep_alive_adaptor(pool_connections: int = 10, pool_maxsize: int = 10,
+                                           pool_block: bool = False) -> TCPKeepAliveAdapter:
+        return TCPKeepAlivePoolStatsAdapter(idle=120, count=20, interval=30, pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize, pool_block=pool_block)
 
     def set_tcp_keep_alive_adaptor(self, tcp_keep_alive_adaptor: TCPKeepAliveAdapter):
         self.requests_session.mount('http://', tcp_keep_alive_adaptor)
         self.requests_session.mount('https://', tcp_keep_alive_adaptor)
 
+    # pool_maxsize is the number of connections kept open per host: set it to at least the number of threads
+    # sharing this object. pool_block=True makes threads wait for a free connection rather than open extra ones
+    def configure_connection_pool(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                                  tcp_keep_alive: bool = False):
+        adapter = build_pool_adapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                     pool_block=pool_block, tcp_keep_alive=tcp_keep_alive)
+        self.requests_session.mount('http://', adapter)
+        self.requests_session.mount('https://', adapter)
+
+    # Retries with exponential backoff for 429 / 5xx responses on idempotent calls, see RetryPolicy
+    @property
+    def retry_policy(self) -> Optional[RetryPolicy]:
+        return self.requests_session.retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, retry_policy: Optional[RetryPolicy]):
+        self.requests_session.retry_policy = retry_policy
+
+    # Client-side token-bucket limits, can be shared between clients, see RateLimiter
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self.requests_session.rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, rate_limiter: Optional[RateLimiter]):
+        self.requests_session.rate_limiter = rate_limiter
+
+    # hook is called with a RequestRecord (endpoint, method, status, latency, bytes, retries) after every request,
+    # e.g. a LatencyHistogram
+    def add_instrumentation_hook(self, hook: Callable[[RequestRecord], None]):
+        self.requests_session.instrumentation.add_hook(hook)
+
+    def remove_instrumentation_hook(self, hook: Callable[[RequestRecord], None]):
+        self.requests_session.instrumentation.remove_hook(hook)
+
+    # Counts of connections opened, reused and discarded (pool full) since the adapter was mounted
+    def connection_pool_stats(self) -> Dict:
+        return session_pool_stats(self.requests_session)
+
+    # For the GET endpoints that take a JSON list of GUIDs in the URL: any number of ids can be passed. The list is
+    # split into chunks that keep the encoded URL under self.max_url_length, the chunks are requested in parallel,
+    # and the responses are merged into the shape of a single response
+    def get_request_batched_ids(self, endpoint: str, url_params: Dict, ids_param: str, ids: List[str]):
+        url = self.base_url + endpoint
+        chunks = split_ids_for_url(url=url, url_params=url_params, ids_param=ids_param, ids=ids,
+                                   max_url_length=self.max_url_length)
+
+        def get_chunk(chunk: List[str]):
+            chunk_params = dict(url_params)
+            chunk_params[ids_param] = json.dumps(chunk)
+            response = self.requests_session.get(url=url, params=chunk_params)
+            response.raise_for_status()
+            return self.json_codec.loads(response.content)
+
+        if len(chunks) == 1:
+            return get_chunk(chunks[0])
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_requests, len(chunks))) as executor:
+            responses = list(executor.map(get_chunk, chunks))
+        return merge_responses(responses)
+
     #
     # Session management calls
     # - up here vs. in the SESSION section below (because these two are required)
@@ -218,8 +318,41 @@ class TSRestApiV1:
         response.raise_for_status()
         return True
 
+    # Keeps the bearer token fresh for long-running jobs, see BearerTokenManager. Replaces a token set with
+    # bearer_token: each request is sent with the manager's current token, refreshed once on concurrent 401s
+    @property
+    def token_manager(self) -> Optional[BearerTokenManager]:
+        return self.requests_session.token_manager
+
+    @token_manager.setter
+    def token_manager(self, token_manager: Optional[BearerTokenManager]):
+        self.requests_session.token_manager = token_manager
+        if token_manager is not None:
+            self.api_headers.pop('Authorization', None)
+            self.requests_session.headers.pop('Authorization', None)
+
+    # Opt-in cache of read-only responses (system config, orgs / tags / roles / metadata search...), see ResponseCache
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        return self.requests_session.response_cache
+
+    @response_cache.setter
+    def response_cache(self, response_cache: Optional[ResponseCache]):
+        self.requests_session.response_cache = response_cache
+
+    # Identical read-only requests sent at the same time by several threads share one HTTP call, see RequestCoalescer
+    @property
+    def request_coalescer(self) -> Optional[RequestCoalescer]:
+        return self.requests_session.request_coalescer
+
+    @request_coalescer.setter
+    def request_coalescer(self, request_coalescer: Optional[RequestCoalescer]):
+        self.requests_session.request_coalescer = request_coalescer
+
     @property
     def bearer_token(self):
+        if self.requests_session.token_manager is not None:
+            return self.requests_session.token_manager.token()
         return self.__bearer_token
 
     @bearer_token.setter
@@ -259,7 +392,7 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, params=url_params)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def searchdata(
         self,
@@ -284,7 +417,87 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
+
+    #
+    # Streaming versions of the DATA methods: the response is parsed as it arrives and batches of up to batch_size
+    # rows are yielded, so memory use stays flat regardless of the number of rows
+    #
+    def pinboarddata_stream(
+        self,
+        pinboard_guid: str,
+        vizids: List[str],
+        format_type: str='COMPACT',
+        batch_size: int=-1,
+        page_number: int=-1,
+        offset: int=-1,
+        rows_per_batch: int=1000
+    ) -> Iterator[Dict]:
+        """
+        Yields {'viz_id': str, 'columnNames': List or None, 'data': List} for each batch of rows
+        """
+        endpoint = 'pinboarddata'
+
+        url_params = {
+            'id': pinboard_guid,
+            'vizid': json.dumps(vizids),
+            'batchsize': str(batch_size),
+            'pagenumber': str(page_number),
+            'offset': str(offset),
+            'formattype': format_type
+        }
+
+        url = self.base_url + endpoint
+        response = self.requests_session.post(url=url, params=url_params, stream=True)
+        response.raise_for_status()
+
+        # Response is keyed by viz id: {'{vizId}': {'columnNames': [], 'data': [[]], ...}}
+        def batches():
+            for batch in iter_response_rows(response, rows_keys=('data',), capture_keys=('columnNames',),
+                                            batch_size=rows_per_batch):
+                yield {
+                    'viz_id': batch['path'][0] if len(batch['path']) > 0 else None,
+                    'columnNames': batch['fields'].get('columnNames'),
+                    'data': batch['rows']
+                }
+        return batches()
+
+    def searchdata_stream(
+        self,
+        query_string: str,
+        data_source_guid: str,
+        format_type: str='COMPACT',
+        batch_size: int=-1,
+        page_number: int=-1,
+        offset: int=-1,
+        rows_per_batch: int=1000
+    ) -> Iterator[Dict]:
+        """
+        Yields {'columnNames': List or None, 'data': List} for each batch of rows
+        """
+        endpoint = 'searchdata'
+
+        url_params = {
+            'query_string': query_string,
+            'data_source_guid': data_source_guid,
+            'batchsize': str(batch_size),
+            'pagenumber': str(page_number),
+            'offset': str(offset),
+            'formattype': format_type
+        }
+
+        url = self.base_url + endpoint
+        response = self.requests_session.post(url=url, params=url_params, stream=True)
+        response.raise_for_status()
+
+        def batches():
+            for batch in iter_response_rows(response, rows_keys=('data',), capture_keys=('columnNames',),
+                                            batch_size=rows_per_batch):
+                yield {
+                    'columnNames': batch['fields'].get('columnNames'),
+                    'data': batch['rows']
+                }
+        return batches()
 
     #
     # ADMIN Methods
@@ -298,7 +511,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def connection_list(self, category: str = 'ALL',
                         sort: str = 'DEFAULT', sort_ascending: bool = True,
@@ -324,7 +537,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def connection_create(self, connection_name: str, connection_type: str, metadata_json: str, description: str = "",
                           create_without_tables=True, use_internal_endpoint=False):
@@ -344,7 +557,7 @@ class TSRestApiV1:
             post_data['createEmpty'] = str(create_without_tables).lower()
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def connection_update(self, connection_guid: str, connection_name: str, connection_type: str, metadata_json: str,
                           description: str = "", create_without_tables=True, use_internal_endpoint=False):
@@ -366,7 +579,7 @@ class TSRestApiV1:
             post_data['createEmpty'] = str(create_without_tables).lower()
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Helper method for pulling the connection_configuration from metadata_details when type is DATA_SOURCE (connection)
     @staticmethod
@@ -403,86 +616,38 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def dependency_listincomplete(self):
         endpoint = 'dependency/listincomplete'
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def dependency_logicalcolumn(self, logical_column_guids: List[str]):
         endpoint = 'dependency/logicalcolumn'
-
-        url_params = {
-            'id': json.dumps(logical_column_guids)
-        }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        return self.get_request_batched_ids(endpoint=endpoint, url_params={}, ids_param='id', ids=logical_column_guids)
 
     def dependency_logicaltable(self, logical_table_guids: List[str]):
         endpoint = 'dependency/logicaltable'
-
-        url_params = {
-            'id': json.dumps(logical_table_guids)
-        }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        return self.get_request_batched_ids(endpoint=endpoint, url_params={}, ids_param='id', ids=logical_table_guids)
 
     def dependency_logicalrelationship(self, logical_relationship_guids: List[str]):
         endpoint = 'dependency/logicalrelationship'
-
-        url_params = {
-            'id': json.dumps(logical_relationship_guids)
-        }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        return self.get_request_batched_ids(endpoint=endpoint, url_params={}, ids_param='id', ids=logical_relationship_guids)
 
     def dependency_physicalcolumn(self, physical_column_guids: List[str]):
         endpoint = 'dependency/physicalcolumn'
-
-        url_params = {
-            'id': json.dumps(physical_column_guids)
-        }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        return self.get_request_batched_ids(endpoint=endpoint, url_params={}, ids_param='id', ids=physical_column_guids)
 
     def dependency_physicaltable(self, physical_table_guids: List[str]):
         endpoint = 'dependency/physicaltable'
-
-        url_params = {
-            'id': json.dumps(physical_table_guids)
-        }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        return self.get_request_batched_ids(endpoint=endpoint, url_params={}, ids_param='id', ids=physical_table_guids)
 
     def dependency_pinboard(self, pinboard_guids: List[str]):
         endpoint = 'dependency/pinboard'
-
-        url_params = {
-            'ids': json.dumps(pinboard_guids)
-        }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        return self.get_request_batched_ids(endpoint=endpoint, url_params={}, ids_param='ids', ids=pinboard_guids)
 
     #
     # EXPORT METHODS
@@ -534,6 +699,53 @@ class TSRestApiV1:
         # Return value is in Bytes format, so other methods can do what they want with it
         return response.content
 
+    # Same as export_pinboard_pdf, but the PDF is written to destination (file path or file-like object) as it
+    # arrives rather than held in memory. Returns {'bytes_written', 'content_type', 'duration_seconds', 'file_path'}
+    def export_pinboard_pdf_to_file(
+        self,
+        destination: FileDestination,
+        pinboard_id: str,
+        one_visualization_per_page: bool=False,
+        landscape_or_portrait: str='LANDSCAPE',
+        cover_page: bool=True,
+        logo: bool=True,
+        page_numbers: bool=False,
+        filter_page: bool=True,
+        truncate_tables: bool=False,
+        footer_text: str=None,
+        chunk_size: int=DEFAULT_CHUNK_SIZE
+    ) -> Dict:
+        endpoint = 'export/pinboard/pdf'
+
+        layout_type = 'PINBOARD'
+
+        if one_visualization_per_page is True:
+            layout_type = 'VISUALIZATION'
+
+        url_params = {
+            'id': pinboard_id,
+            'layout_type': layout_type,
+            'orientation': landscape_or_portrait.upper(),
+            'truncate_tables': str(truncate_tables).lower(),
+            'include_cover_page': str(cover_page).lower(),
+            'include_logo': str(logo).lower(),
+            'include_page_number': str(page_numbers).lower(),
+            'include_filter_page': str(filter_page).lower(),
+        }
+
+        if footer_text is not None:
+            url_params['footer_text'] = footer_text
+
+        url = self.base_url + endpoint
+
+        started_at = time.perf_counter()
+        # stream=True leaves the body on the socket until it is read in chunks
+        response = self.requests_session.post(url=url, params=url_params,
+                                              headers={'Accept': 'application/octet-stream'}, stream=True)
+        response.raise_for_status()
+        return stream_response_to_file(response=response, destination=destination, chunk_size=chunk_size,
+                                       started_at=started_at)
+
     #
     # GROUP METHODS
     #
@@ -551,7 +763,7 @@ class TSRestApiV1:
         # Requires multipart/form-data
         response = self.requests_session.post(url=url, files=files)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def group_get(self, group_guid: Optional[str] = None, name: Optional[str] = None) -> Union[Dict, List]:
         endpoint = 'group'
@@ -564,7 +776,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def group_post(self, group_name: str, display_name: str, privileges: Optional[List[str]],
                    group_type: str = 'LOCAL_GROUP',
@@ -586,7 +798,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def group_delete(self, group_guid: str):
         endpoint = 'group/{}'.format(group_guid)
@@ -607,7 +819,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.put(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Add a User to a Group
     def group_user_post(self, group_guid: str, user_guid: str):
@@ -616,7 +828,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Remove user from a group
     def group_user_delete(self, group_guid: str, user_guid: str):
@@ -633,7 +845,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def group_users_post(self, group_guid: str, user_guids: List[str]):
         endpoint = 'group/{}/users'.format(group_guid)
@@ -656,7 +868,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.delete(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Requires multipart/form-data
     def group_addprivilege(self, privilege: str, group_names: str) -> Dict:
@@ -671,7 +883,7 @@ class TSRestApiV1:
         # Requires multipart/form-data
         response = self.requests_session.post(url=url, files=files)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Starting August cloud release, this changed from session/group to group endpoint where it should be
     def group_listuser(self, group_guid: str) -> Dict:
@@ -679,7 +891,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     #
     # MATERIALIZATION Methods
@@ -690,7 +902,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     #
     # METADATA Methods
@@ -708,16 +920,13 @@ class TSRestApiV1:
 
         url_params = {
             'type': object_type,
-            'id': json.dumps(object_guids),
             'showhidden': str(show_hidden).lower(),
             'dropquestiondetails': str(drop_question_details).lower(),
             'version': str(version)
         }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        # Any number of GUIDs, split into multiple requests if the URL would be too long
+        return self.get_request_batched_ids(endpoint=endpoint, url_params=url_params, ids_param='id',
+                                            ids=object_guids)
 
     # Helper method for pulling the connection_configuration from metadata_details when type is DATA_SOURCE (connection)
     @staticmethod
@@ -790,7 +999,29 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
+
+    # Iterator version of metadata_listobjectheaders: yields the headers one at a time, requesting batchsize headers
+    # per call. The next `prefetch` batches are requested in the background while the current one is processed,
+    # so at most prefetch + 1 batches are held in memory
+    def metadata_listobjectheaders_iter(self, object_type: str, subtypes: Optional[List[str]] = None,
+                                        sort: str = 'DEFAULT', sort_ascending: bool = True,
+                                        filter: Optional[str] = None, fetchids: Optional[List[str]] = None,
+                                        skipids: Optional[List[str]] = None, tagname: Optional[List[str]] = None,
+                                        category: Optional[str] = None, batchsize: int = 500, offset: int = 0,
+                                        auto_created: Optional[bool] = None, prefetch: int = 1) -> Iterator[Dict]:
+        def fetch_page(page_offset: int, page_size: int):
+            return self.metadata_listobjectheaders(object_type=object_type, subtypes=subtypes, sort=sort,
+                                                   sort_ascending=sort_ascending, filter=filter, fetchids=fetchids,
+                                                   skipids=skipids, tagname=tagname, category=category,
+                                                   batchsize=page_size, offset=page_offset,
+                                                   auto_created=auto_created)
+
+        def headers():
+            for page in iter_offset_pages(fetch_page, page_size=batchsize, prefetch=prefetch, start_offset=offset,
+                                          is_last_page=is_last_batch('headers')):
+                yield from page_items(page, 'headers')
+        return headers()
 
     def metadata_listvizheaders(self, guid: str) -> Dict:
         endpoint = 'metadata/listvizheaders'
@@ -798,7 +1029,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # metadata/listas   used to return the set of objects a user or group can access
     def metadata_listas(self, user_or_group_guid: str, user_or_group: str, minimum_access_level: str = 'READ_ONLY',
@@ -817,7 +1048,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # /metadata/list gives the information available on the listing pages for each object type
     # can be used in the browser to generate menu systems / selector boxes for content scoped to the logged in user
@@ -869,7 +1100,29 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
+
+    # Iterator version of metadata_list: yields the headers one at a time, requesting batchsize headers per call
+    # until the response has isLastBatch: true. Read-ahead as in metadata_listobjectheaders_iter
+    def metadata_list_iter(self, object_type: str, subtypes: Optional[List[str]] = None,
+                           owner_types: Optional[List[str]] = None, category: Optional[str] = None,
+                           sort: str = 'DEFAULT', sort_ascending: bool = True, filter: Optional[str] = None,
+                           fetchids: Optional[List[str]] = None, skipids: Optional[List[str]] = None,
+                           tagname: Optional[List[str]] = None, batchsize: int = 500, offset: int = 0,
+                           auto_created: Optional[bool] = None, show_hidden: Optional[bool] = False,
+                           author_guid: Optional[str] = None, prefetch: int = 1) -> Iterator[Dict]:
+        def fetch_page(page_offset: int, page_size: int):
+            return self.metadata_list(object_type=object_type, subtypes=subtypes, owner_types=owner_types,
+                                      category=category, sort=sort, sort_ascending=sort_ascending, filter=filter,
+                                      fetchids=fetchids, skipids=skipids, tagname=tagname, batchsize=page_size,
+                                      offset=page_offset, auto_created=auto_created, show_hidden=show_hidden,
+                                      author_guid=author_guid)
+
+        def headers():
+            for page in iter_offset_pages(fetch_page, page_size=batchsize, prefetch=prefetch, start_offset=offset,
+                                          is_last_page=is_last_batch('headers')):
+                yield from page_items(page, 'headers')
+        return headers()
 
     # Helper method to find a GUID from a name
     def metadata_list_find_guid(self, object_type: str, name: str):
@@ -894,7 +1147,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def metadata_unmarkasfavoritefor(self, user_guid: str, object_guids: List[str]) -> bool:
         endpoint = 'metadata/markunmarkfavoritefor'
@@ -915,12 +1168,16 @@ class TSRestApiV1:
     #
 
     # Some errors come through as part of a HTTP 200 response, just listed in the JSON
+    # Returns the decoded response, so callers don't need to decode the (possibly very large) response again
     @staticmethod
-    def raise_tml_errors(response: requests.Response) -> Dict:
+    def raise_tml_errors(response: requests.Response, json_codec: Optional[JsonCodec] = None,
+                         ordered: bool = False) -> Dict:
         if len(response.content) == 0:
             raise Exception('No response returned at all with status code {}'.format(response.status_code))
         else:
-            j = response.json()
+            if json_codec is None:
+                json_codec = JsonCodec()
+            j = json_codec.loads(response.content, ordered=ordered)
             # JSON error response checking
 
             # It is possible in a multiple file upload that some validated and others have errors
@@ -938,9 +1195,9 @@ class TSRestApiV1:
                             # print(k['info']['status']['error_message'])
                             raise SyntaxError(j['object'])
                 # If no errors are raised, just return the regular response
-                return response.json()
+                return j
             else:
-                return response.json()
+                return j
 
     def metadata_tml_export(self, guid: str, export_associated=False, export_fqn=True) -> OrderedDict:
         # Always returns a Python Dict, converted from a request to the API to receive in JSON
@@ -960,17 +1217,16 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data, headers={'Accept': 'text/plain'})
         response.raise_for_status()
         # Extra parsing of some 'error responses' that come through in JSON response on HTTP 200
-        self.raise_tml_errors(response=response)
-
         # TML API returns a JSON response, with the TML document
-        # object_pairs_hook forces an OrderedDict
-        tml_json_response = response.json(object_pairs_hook=OrderedDict)
+        # tml_ordered_dict forces an OrderedDict
+        tml_json_response = self.raise_tml_errors(response=response, json_codec=self.json_codec,
+                                                  ordered=self.tml_ordered_dict)
         objs = tml_json_response['object']
 
         if len(objs) == 1 and export_associated is False:
             # The TML is there in full under the 'edoc' section of the API JSON response
             tml_str = objs[0]['edoc']
-            tml_obj = json.loads(tml_str)
+            tml_obj = self.json_codec.loads(tml_str)
         else:
             if export_associated is True:
                 tml_obj = tml_json_response
@@ -997,16 +1253,15 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data, headers={'Accept': 'text/plain'})
         response.raise_for_status()
         # Extra parsing of some 'error responses' that come through in JSON response on HTTP 200
-        self.raise_tml_errors(response=response)
-
         # TML API returns a JSON response, with the TML document
-        # object_pairs_hook forces an OrderedDict
-        tml_json_response = response.json(object_pairs_hook=OrderedDict)
+        # tml_ordered_dict forces an OrderedDict
+        tml_json_response = self.raise_tml_errors(response=response, json_codec=self.json_codec,
+                                                  ordered=self.tml_ordered_dict)
         objs = tml_json_response['object']
 
         # The first object will be the requested object
         tml_str = objs[0]['edoc']
-        tml_obj = json.loads(tml_str)
+        tml_obj = self.json_codec.loads(tml_str)
 
         name_guid_map = {}
 
@@ -1035,10 +1290,8 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data, headers={'Accept': 'text/plain'})
         response.raise_for_status()
         # Extra parsing of some 'error responses' that come through in JSON response on HTTP 200
-        self.raise_tml_errors(response=response)
-
         # TML API returns a JSON response, with the TML document
-        tml_json_response = response.json()
+        tml_json_response = self.raise_tml_errors(response=response, json_codec=self.json_codec)
         objs = tml_json_response['object']
 
         if len(objs) == 1:
@@ -1071,10 +1324,8 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data, headers={'Accept': 'text/plain'})
         response.raise_for_status()
         # Extra parsing of some 'error responses' that come through in JSON response on HTTP 200
-        self.raise_tml_errors(response=response)
-
         # TML API returns a JSON response, with the TML document
-        tml_json_response = response.json()
+        tml_json_response = self.raise_tml_errors(response=response, json_codec=self.json_codec)
         objs = tml_json_response['object']
 
         # The TML is there in full under the 'edoc' section of the API JSON response
@@ -1112,7 +1363,7 @@ class TSRestApiV1:
         # Assume JSON is Python object
         if formattype == 'JSON':
             for t in tml_list:
-                encoded_tmls.append(json.dumps(t))
+                encoded_tmls.append(self.json_codec.dumps_str(t))
         # YAML or JSON_STR are already string when sent in
         elif formattype in ['YAML', 'JSON_STR']:
             for t in tml_list:
@@ -1120,29 +1371,44 @@ class TSRestApiV1:
         # Assume it's just a Python object which will dump to JSON matching the TML format
         else:
             for t in tml_list:
-                encoded_tmls.append(json.dumps(t))
+                encoded_tmls.append(self.json_codec.dumps_str(t))
 
         import_policy = 'ALL_OR_NONE'
 
         if validate_only is True:
             import_policy = 'VALIDATE_ONLY'
 
-        post_data = {
-            'import_objects': str(encoded_tmls),
-            'import_policy': import_policy,
-            'force_create': str(create_new_on_server).lower()
-        }
-        if enable_block_tml_metadata_sync is not None:
-            post_data['enable_block_tml_metadata_sync'] = str(enable_block_tml_metadata_sync).lower()
-
         url = self.base_url + endpoint
 
-        # TML import is distinguished by having an {'Accept': 'text/plain'} header on the POST
-        response = self.requests_session.post(url=url, data=post_data, headers={'Accept': 'text/plain'})
-        response.raise_for_status()
-        # Extra parsing of some 'error responses' that come through in JSON response on HTTP 200
-        self.raise_tml_errors(response=response)
-        return response.json()
+        def send(chunk: List[int]) -> Dict:
+            post_data = {
+                'import_objects': self.json_codec.dumps_str([encoded_tmls[i] for i in chunk]),
+                'import_policy': import_policy,
+                'force_create': str(create_new_on_server).lower()
+            }
+            if enable_block_tml_metadata_sync is not None:
+                post_data['enable_block_tml_metadata_sync'] = str(enable_block_tml_metadata_sync).lower()
+
+            # TML import is distinguished by having an {'Accept': 'text/plain'} header on the POST
+            response = self.requests_session.post(url=url, data=post_data, headers={'Accept': 'text/plain'})
+            response.raise_for_status()
+            # Extra parsing of some 'error responses' that come through in JSON response on HTTP 200
+            return self.raise_tml_errors(response=response, json_codec=self.json_codec)
+
+        if self.tml_import_max_bytes is None and self.tml_import_max_objects is None:
+            return send(list(range(len(encoded_tmls))))
+
+        chunks = chunk_by_size(encoded_tmls, max_bytes=self.tml_import_max_bytes,
+                               max_items=self.tml_import_max_objects, size_of=form_item_size)
+        if len(chunks) == 1:
+            return send(chunks[0])
+        # ALL_OR_NONE: raise_tml_errors stops at the first chunk that fails. Chunks before it remain imported
+        if import_policy == 'ALL_OR_NONE':
+            responses = [send(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.tml_import_max_parallel, len(chunks))) as executor:
+                responses = list(executor.map(send, chunks))
+        return merge_responses(responses)
 
     # Parse the TML response from import to get the GUIDs
     def guids_from_imported_tml(self, tml_import_response) -> List[str]:
@@ -1162,7 +1428,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     #
     # SECURITY methods
@@ -1276,15 +1542,12 @@ class TSRestApiV1:
 
         url_params = {
             'type': object_type,
-            'id': json.dumps(object_guids),
             'dependentshare': str(dependent_share).lower(),
             'permissiontype': permission_type
         }
-
-        url = self.base_url + endpoint
-        response = self.requests_session.get(url=url, params=url_params)
-        response.raise_for_status()
-        return response.json()
+        # Any number of GUIDs, split into multiple requests if the URL would be too long
+        return self.get_request_batched_ids(endpoint=endpoint, url_params=url_params, ids_param='id',
+                                            ids=object_guids)
 
     def security_metadata_permissions_by_id(self, object_type: str, object_guid: str, dependent_share: bool = False,
                                       permission_type: str = 'EFFECTIVE'):
@@ -1299,7 +1562,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # ids_by_type is JSON in format { "{object_type_1} : ["{guid_1}, "{guid_2}"], "{object_type_2}" : ["{guid_3}"...] }
     def security_effectivepermissionbulk(self, ids_by_type: Dict, dependent_share: bool = False,):
@@ -1313,7 +1576,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     #
     # SESSION Methods
@@ -1337,7 +1600,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def session_homepinboard_delete(self) -> bool:
         endpoint = 'session/homepinboard'
@@ -1351,7 +1614,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def session_orgs_get(self, batchsize: int = -1, offset: int = -1) -> Dict:
         endpoint = 'session/orgs'
@@ -1364,7 +1627,18 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
+
+    # Iterator version of session_orgs_get: yields the orgs one at a time, see metadata_list_iter
+    def session_orgs_get_iter(self, batchsize: int = 100, offset: int = 0, prefetch: int = 1) -> Iterator[Dict]:
+        def fetch_page(page_offset: int, page_size: int):
+            return self.session_orgs_get(batchsize=page_size, offset=page_offset)
+
+        def orgs():
+            for page in iter_offset_pages(fetch_page, page_size=batchsize, prefetch=prefetch, start_offset=offset,
+                                          is_last_page=is_last_batch('orgs')):
+                yield from page_items(page, 'orgs')
+        return orgs()
 
     def session_orgs_put(self, org_id: int):
         endpoint = 'session/orgs'
@@ -1387,7 +1661,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # NOTE:
     #
@@ -1456,7 +1730,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def user_post(self, username: str, password: str, display_name: str, email: Optional[str] = None,
                   properties: Optional[Dict] = None,
@@ -1485,7 +1759,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def user_delete(self, user_guid: str):
         endpoint = 'user/{}'.format(user_guid)
@@ -1561,7 +1835,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.post(url=url, data=None, files=files)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def user_transfer_ownership(self, current_owner_username: str, new_owner_username: str,
                                 object_guids: Optional[List[str]] = None) -> bool:
@@ -1616,7 +1890,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def user_email(self, user_guid: str, user_email: str):
         endpoint = 'user/email'
@@ -1629,14 +1903,14 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.put(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def user_groups_get(self, user_guid: str):
         endpoint = 'user/{}/groups'.format(user_guid)
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Replaces all group membership?
     def user_groups_post(self, user_guid: str, group_guids: List[str]):
@@ -1649,7 +1923,7 @@ class TSRestApiV1:
 
         response = self.requests_session.post(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     # Adds to existing group membership?
     def user_groups_put(self, user_guid: str, group_guids: List[str]):
@@ -1705,7 +1979,7 @@ class TSRestApiV1:
 
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     #
     # ADMIN methods, many concerning Custom Actions
@@ -1717,7 +1991,7 @@ class TSRestApiV1:
 
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_configinfo_overrides(self):
         endpoint = 'admin/configinfo/overrides'
@@ -1726,7 +2000,7 @@ class TSRestApiV1:
 
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_configinfo_update(self, config_changes: Dict):
         endpoint = 'admin/configinfo/update'
@@ -1748,7 +2022,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action(self, action_guid: str):
         endpoint = 'admin/embed/actions/{}'.format(action_guid)
@@ -1756,7 +2030,7 @@ class TSRestApiV1:
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action_post(self, embed_action_definition: Dict):
         endpoint = 'admin/embed/actions'
@@ -1769,7 +2043,7 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action_put(self, action_guid: str, embed_action_definition: Dict):
         endpoint = 'admin/embed/actions/{}'.format(action_guid)
@@ -1782,7 +2056,7 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action_delete(self, action_guid: str):
         endpoint = 'admin/embed/actions/{}'.format(action_guid)
@@ -1792,7 +2066,7 @@ class TSRestApiV1:
         response = self.requests_session.delete(url=url)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action_associations_post(self, action_guid: str, action_association: Dict):
         endpoint = 'admin/embed/actions/{}/associations'.format(action_guid)
@@ -1805,7 +2079,7 @@ class TSRestApiV1:
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action_associations_get(self, action_guid: str):
         endpoint = 'admin/embed/actions/{}/associations'.format(action_guid)
@@ -1815,7 +2089,7 @@ class TSRestApiV1:
         response = self.requests_session.get(url=url)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def admin_embed_action_associations_delete(self, action_guid: str, action_association: Dict):
         endpoint = 'admin/embed/actions/{}/associations'.format(action_guid)
@@ -1828,7 +2102,7 @@ class TSRestApiV1:
         response = self.requests_session.delete(url=url, data=post_data)
         response.raise_for_status()
 
-        return response.json()
+        return self.json_codec.loads(response.content)
     #
     # Non-public endpoints
     # No guarantees for these undocumented endpoints to stay consistent
@@ -1866,7 +2140,7 @@ class TSRestApiV1:
 
         response = self.requests_session.get(url=url, params=url_params)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def connection_fetch_connection(self, connection_guid: str, include_columns=False,
                                     authentication_type='SERVICE_ACCOUNT', config_json_string: Optional[str] = None,
@@ -1901,7 +2175,7 @@ class TSRestApiV1:
 
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def connection_fetch_live_columns(self, connection_guid, database_name: str,
                                       schema_name: str, table_name: str,
@@ -1939,7 +2213,7 @@ class TSRestApiV1:
 
         response = self.requests_session.post(url=url, data=post_data)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     #
     # connection processing to generate create / update input
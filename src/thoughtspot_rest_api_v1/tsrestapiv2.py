@@ -1,11 +1,26 @@
 from collections import OrderedDict
-from typing import Optional, Dict, List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Union, Callable, Iterator
+import copy
 import json
+import time
 
 import requests
 from charset_normalizer.utils import identify_sig_or_bom
 from requests_toolbelt.adapters.socket_options import TCPKeepAliveAdapter
 
+from .transport import build_pool_adapter, session_pool_stats, TCPKeepAlivePoolStatsAdapter, TSRequestsSession
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .auth import BearerTokenManager
+from .cache import ResponseCache
+from .singleflight import RequestCoalescer
+from .instrumentation import RequestRecord
+from .codec import JsonCodec, get_json_codec
+from .batching import chunk_by_size, tml_import_has_errors, tml_import_not_sent, merge_tml_import_responses
+from .pagination import iter_offset_pages, as_page
+from .streaming import stream_response_to_file, iter_response_rows, FileDestination, DEFAULT_CHUNK_SIZE
+
 class ReportTypes:
     PDF = 'PDF'
     XLSX = 'XLSX'
@@ -33,16 +48,31 @@ class TSRestApiV2:
     V2 call the user desires. It is meant as a bridge until the official V2 SDKs are available, and a companion
     to the existing TSRestApiV1 library here
     """
-    def __init__(self, server_url: str):
+    def __init__(self, server_url: str, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 tcp_keep_alive: bool = False, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, json_codec: Union[str, JsonCodec] = 'json'):
         # Protect from extra end slash on URL
         if server_url[-1] == '/':
             server_url = server_url[0:-1]
 
         self.server = server_url
         self.api_version = '2.0'
+        # JSON library for request and response bodies: 'json' (stdlib), 'orjson', 'ujson' or 'auto', see codec.py
+        self.json_codec = get_json_codec(json_codec)
+
+        # metadata_tml_import / metadata_tml_async_import split metadata_tmls into several requests of at most
+        # tml_import_max_bytes (JSON-encoded) and tml_import_max_objects each. None means no limit
+        self.tml_import_max_bytes: Optional[int] = None
+        self.tml_import_max_objects: Optional[int] = None
+        # Chunks sent at once, except for ALL_OR_NONE imports which are sent one after another
+        self.tml_import_max_parallel = 4
 
         # REST API uses cookies to maintain the session, so you need to create an open Session
-        self.requests_session = requests.Session()
+        # TSRequestsSession is a requests.Session that applies the retry_policy and rate_limiter (if any) to every call
+        self.requests_session = TSRequestsSession(retry_policy=retry_policy, rate_limiter=rate_limiter)
+        # Connection pool sizing, see configure_connection_pool()
+        self.configure_connection_pool(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                       pool_block=pool_block, tcp_keep_alive=tcp_keep_alive)
 
         # X-Requested-By             is necessary for all calls.
         # Accept: application/json   isn't necessary with requests (default: Accept: */*) but might be in other frameworks
@@ -63,15 +93,100 @@ class TSRestApiV2:
 
     # The following two methods allow for modifying the session for long-lived purposes, particularly TML import
     @staticmethod
-    def get_default_tcp_keep_alive_adaptor() -> TCPKeepAliveAdapter:
-        return TCPKeepAliveAdapter(idle=120, count=20, interval=30)
+    def get_default_tcp_keep_alive_adaptor(pool_connections: int = 10, pool_maxsize: int = 10,
+                                           pool_block: bool = False) -> TCPKeepAliveAdapter:
+        return TCPKeepAlivePoolStatsAdapter(idle=120, count=20, interval=30, pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize, pool_block=pool_block)
 
     def set_tcp_keep_alive_adaptor(self, tcp_keep_alive_adaptor: TCPKeepAliveAdapter):
         self.requests_session.mount('http://', tcp_keep_alive_adaptor)
         self.requests_session.mount('https://', tcp_keep_alive_adaptor)
 
+    # pool_maxsize is the number of connections kept open per host: set it to at least the number of threads
+    # sharing this object. pool_block=True makes threads wait for a free connection rather than open extra ones
+    def configure_connection_pool(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                                  tcp_keep_alive: bool = False):
+        adapter = build_pool_adapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                     pool_block=pool_block, tcp_keep_alive=tcp_keep_alive)
+        self.requests_session.mount('http://', adapter)
+        self.requests_session.mount('https://', adapter)
+
+    # A new client for the same server sharing this object's connection pools, retry policy, rate limiter and
+    # instrumentation hooks, but with its own headers and authentication (e.g. one per org, see OrgClientPool).
+    # Cheap to create: no new connections are opened
+    def shared_transport_client(self) -> 'TSRestApiV2':
+        client = copy.copy(self)
+        client.api_headers = dict(self.api_headers)
+        client.api_headers.pop('Authorization', None)
+        client._TSRestApiV2__bearer_token = None
+        client.requests_session = self.requests_session.shared_copy()
+        return client
+
+    # Retries with exponential backoff for 429 / 5xx responses on idempotent calls, see RetryPolicy
+    @property
+    def retry_policy(self) -> Optional[RetryPolicy]:
+        return self.requests_session.retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, retry_policy: Optional[RetryPolicy]):
+        self.requests_session.retry_policy = retry_policy
+
+    # Client-side token-bucket limits, can be shared between clients, see RateLimiter
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self.requests_session.rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, rate_limiter: Optional[RateLimiter]):
+        self.requests_session.rate_limiter = rate_limiter
+
+    # hook is called with a RequestRecord (endpoint, method, status, latency, bytes, retries) after every request,
+    # e.g. a LatencyHistogram
+    def add_instrumentation_hook(self, hook: Callable[[RequestRecord], None]):
+        self.requests_session.instrumentation.add_hook(hook)
+
+    def remove_instrumentation_hook(self, hook: Callable[[RequestRecord], None]):
+        self.requests_session.instrumentation.remove_hook(hook)
+
+    # Counts of connections opened, reused and discarded (pool full) since the adapter was mounted
+    def connection_pool_stats(self) -> Dict:
+        return session_pool_stats(self.requests_session)
+
+    # Keeps the bearer token fresh for long-running jobs, see BearerTokenManager. Replaces a token set with
+    # bearer_token: each request is sent with the manager's current token, refreshed once on concurrent 401s
+    @property
+    def token_manager(self) -> Optional[BearerTokenManager]:
+        return self.requests_session.token_manager
+
+    @token_manager.setter
+    def token_manager(self, token_manager: Optional[BearerTokenManager]):
+        self.requests_session.token_manager = token_manager
+        if token_manager is not None:
+            self.api_headers.pop('Authorization', None)
+            self.requests_session.headers.pop('Authorization', None)
+
+    # Opt-in cache of read-only responses (system config, orgs / tags / roles / metadata search...), see ResponseCache
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        return self.requests_session.response_cache
+
+    @response_cache.setter
+    def response_cache(self, response_cache: Optional[ResponseCache]):
+        self.requests_session.response_cache = response_cache
+
+    # Identical read-only requests sent at the same time by several threads share one HTTP call, see RequestCoalescer
+    @property
+    def request_coalescer(self) -> Optional[RequestCoalescer]:
+        return self.requests_session.request_coalescer
+
+    @request_coalescer.setter
+    def request_coalescer(self, request_coalescer: Optional[RequestCoalescer]):
+        self.requests_session.request_coalescer = request_coalescer
+
     @property
     def bearer_token(self):
+        if self.requests_session.token_manager is not None:
+            return self.requests_session.token_manager.token()
         return self.__bearer_token
 
     @bearer_token.setter
@@ -143,8 +258,6 @@ class TSRestApiV2:
                         additional_request_parameters: Optional[Dict] = None) -> Dict:
         endpoint = 'auth/token/full'
 
-        url = self.base_url + endpoint
-
         json_post_data = {
             'username': username,
             'validity_time_in_sec': validity_time_in_sec
@@ -176,10 +289,7 @@ class TSRestApiV2:
             for param in additional_request_parameters:
                 json_post_data[param] = additional_request_parameters[param]
 
-        response = self.requests_session.post(url=url, json=json_post_data)
-
-        response.raise_for_status()
-        return response.json()
+        return self.post_request(endpoint=endpoint, request=json_post_data)
 
     def auth_token_object(self, username: str, object_id: str, password: Optional[str] = None,
                           org_id: Optional[int] = None,
@@ -188,8 +298,6 @@ class TSRestApiV2:
                            email: Optional[str] = None, group_identifiers: Optional[List[str]] = None) -> Dict:
         endpoint = 'auth/token/object'
 
-        url = self.base_url + endpoint
-
         json_post_data = {
             'username': username,
             'object_id': object_id,
@@ -218,10 +326,7 @@ class TSRestApiV2:
             else:
                 raise Exception("If using auto_create=True, must include display_name and email")
 
-        response = self.requests_session.post(url=url, json=json_post_data)
-
-        response.raise_for_status()
-        return response.json()
+        return self.post_request(endpoint=endpoint, request=json_post_data)
 
     # V2 API Bearer token can be used with V1 /session/login/token for Trusted Auth flow
     # or used with each API call (no session object) or used with V2 /auth/session/login to create session
@@ -235,8 +340,6 @@ class TSRestApiV2:
                         additional_request_parameters: Optional[Dict] = None) -> Dict:
         endpoint = 'auth/token/custom'
 
-        url = self.base_url + endpoint
-
         json_post_data = {
             'username': username,
             'validity_time_in_sec': validity_time_in_sec
@@ -271,17 +374,14 @@ class TSRestApiV2:
             for param in additional_request_parameters:
                 json_post_data[param] = additional_request_parameters[param]
 
-        response = self.requests_session.post(url=url, json=json_post_data)
-
-        response.raise_for_status()
-        return response.json()
+        return self.post_request(endpoint=endpoint, request=json_post_data)
 
     # If you want to use a request object rather than the hardcoded Python arguments
     # of the other methods above
     def auth_token_direct_request(self, token_type: str, request: Dict):
         endpoint = 'auth/token/' + token_type.lower()
 
-        self.post_request(endpoint=endpoint, request=request)
+        return self.post_request(endpoint=endpoint, request=request)
 
     def auth_token_revoke(self) -> bool:
         endpoint = 'auth/token/revoke'
@@ -295,44 +395,143 @@ class TSRestApiV2:
 
     def auth_token_validate(self, token: str):
         endpoint = 'auth/token/validate'
-        self.post_request(endpoint=endpoint, request={"token": token})
+        return self.post_request(endpoint=endpoint, request={"token": token})
 
     #
     # Generic wrappers for the basic HTTP methods
     # Theoretically, you can just get bearer token and issue any command with endpoint and request
     # vs. using any of the other endpoint wrapper methods
     #
+    # Request bodies are encoded with self.json_codec rather than the json= argument of requests
+    def json_body(self, request) -> Optional[bytes]:
+        if request is None:
+            return None
+        return self.json_codec.dumps(request)
+
     def get_request(self, endpoint):
         url = self.base_url + endpoint
         response = self.requests_session.get(url=url)
         response.raise_for_status()
-        return response.json()
+        return self.json_codec.loads(response.content)
 
     def post_request(self, endpoint, request=None):
         url = self.base_url + endpoint
         if request is not None:
-            response = self.requests_session.post(url=url, json=request)
+            response = self.requests_session.post(url=url, data=self.json_body(request),
+                                                  headers={'Content-Type': 'application/json'})
         else:
             response = self.requests_session.post(url=url)
 
         response.raise_for_status()
         # Most should return a JSON response, but things like deletes may just be 204s
         try:
-            return response.json()
+            return self.json_codec.loads(response.content)
         except requests.exceptions.JSONDecodeError:
             return True
 
     def post_request_binary(self, endpoint, request=None):
         url = self.base_url + endpoint
         if request is not None:
-            response = self.requests_session.post(url=url, json=request,
-                                                  headers={'Accept': 'application/octet-stream'})
+            response = self.requests_session.post(url=url, data=self.json_body(request),
+                                                  headers={'Content-Type': 'application/json',
+                                                           'Accept': 'application/octet-stream'})
         else:
             response = self.requests_session.post(url=url, headers={'Accept': 'application/octet-stream'})
 
         response.raise_for_status()
         return response.content
 
+    # Streams the binary response to destination (file path or file-like object) instead of returning the bytes
+    # Returns {'bytes_written', 'content_type', 'duration_seconds', 'file_path'}
+    def post_request_binary_to_file(self, endpoint, destination: FileDestination, request=None,
+                                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+        url = self.base_url + endpoint
+        started_at = time.perf_counter()
+        response = self.requests_session.post(url=url, data=self.json_body(request),
+                                              headers={'Content-Type': 'application/json',
+                                                       'Accept': 'application/octet-stream'},
+                                              stream=True)
+        response.raise_for_status()
+        return stream_response_to_file(response=response, destination=destination, chunk_size=chunk_size,
+                                       started_at=started_at)
+
+    # For the data endpoints: parses the response as it arrives and yields batches of up to batch_size rows as
+    # {'content_index': int, 'column_names': List or None, 'data_rows': List}, so memory use stays flat
+    # regardless of record_size
+    def post_request_stream_rows(self, endpoint, request=None, batch_size: int = 1000) -> Iterator[Dict]:
+        url = self.base_url + endpoint
+        response = self.requests_session.post(url=url, data=self.json_body(request),
+                                              headers={'Content-Type': 'application/json'}, stream=True)
+        # Raised here rather than on first iteration of the generator
+        response.raise_for_status()
+
+        def batches():
+            for batch in iter_response_rows(response, rows_keys=('data_rows',), capture_keys=('column_names',),
+                                            batch_size=batch_size):
+                yield {
+                    'content_index': batch['path'][1] if len(batch['path']) > 1 else 0,
+                    'column_names': batch['fields'].get('column_names'),
+                    'data_rows': batch['rows']
+                }
+        return batches()
+
+    # Indexes of metadata_tmls in each request, see tml_import_max_bytes / tml_import_max_objects
+    def tml_import_chunks(self, metadata_tmls: List[str]) -> List[List[int]]:
+        if self.tml_import_max_bytes is None and self.tml_import_max_objects is None:
+            return [list(range(len(metadata_tmls)))]
+        return chunk_by_size(metadata_tmls, max_bytes=self.tml_import_max_bytes,
+                             max_items=self.tml_import_max_objects)
+
+    # For the TML import endpoints: sends metadata_tmls in chunks when they exceed the tml_import_ limits, and merges
+    # the responses into one in input order. PARTIAL and VALIDATE_ONLY chunks are sent in parallel. ALL_OR_NONE
+    # chunks are sent one after another and stop at the first chunk with an error (each chunk is all or none, but
+    # chunks imported before the failure remain)
+    def post_request_tml_import(self, endpoint, request: Dict, metadata_tmls: List[str]):
+        chunks = self.tml_import_chunks(metadata_tmls)
+
+        def send(chunk: List[int]):
+            chunk_request = dict(request)
+            chunk_request['metadata_tmls'] = [metadata_tmls[i] for i in chunk]
+            return self.post_request(endpoint=endpoint, request=chunk_request)
+
+        if len(chunks) <= 1:
+            request['metadata_tmls'] = metadata_tmls
+            return self.post_request(endpoint=endpoint, request=request)
+
+        if request.get('import_policy') == 'ALL_OR_NONE':
+            responses = []
+            for n, chunk in enumerate(chunks):
+                response = send(chunk)
+                responses.append(response)
+                if tml_import_has_errors(response):
+                    responses.append(tml_import_not_sent(sum(len(c) for c in chunks[n + 1:])))
+                    break
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.tml_import_max_parallel, len(chunks))) as executor:
+                responses = list(executor.map(send, chunks))
+        return merge_tml_import_responses(responses)
+
+    # For the */search endpoints: yields the results one at a time, requesting page_size records per call with
+    # record_offset / record_size. The next `prefetch` pages are requested in the background while the current page
+    # is processed. A record_offset in request is used as the starting offset
+    def post_request_paginated(self, endpoint, request: Optional[Dict] = None, page_size: int = 100,
+                               prefetch: int = 1) -> Iterator[Dict]:
+        request = dict(request) if request is not None else {}
+        start_offset = request.pop('record_offset', 0)
+        request.pop('record_size', None)
+
+        def fetch_page(offset: int, size: int) -> List:
+            page_request = dict(request)
+            page_request['record_offset'] = offset
+            page_request['record_size'] = size
+            return as_page(self.post_request(endpoint=endpoint, request=page_request))
+
+        def records():
+            for page in iter_offset_pages(fetch_page, page_size=page_size, prefetch=prefetch,
+                                          start_offset=start_offset):
+                yield from page
+        return records()
+
     #
     # Principles of individual endpoint implementations:
     # Naming follows the endpoint with _ replacing /
@@ -360,6 +559,12 @@ class TSRestApiV2:
         endpoint = 'users/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def users_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                          prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'users/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def users_create(self, request: Dict):
         endpoint = 'users/create'
         return self.post_request(endpoint=endpoint, request=request)
@@ -452,6 +657,12 @@ class TSRestApiV2:
         endpoint = 'orgs/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def orgs_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                         prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'orgs/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def orgs_create(self, name: str, description: Optional[str] = None):
         endpoint = 'orgs/create'
         request = {
@@ -485,6 +696,20 @@ class TSRestApiV2:
 
         return self.post_request(endpoint=endpoint, request=request)
 
+    def tags_search_iter(self, tag_identifier: Optional[str] = None, name_pattern: Optional[str] = None,
+                         color: Optional[str] = None, page_size: int = 100, prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'tags/search'
+        request = {}
+        if tag_identifier is not None:
+            request['tag_identifier'] = tag_identifier
+        if color is not None:
+            request['color'] = color
+        if name_pattern is not None:
+            request['name_pattern'] = name_pattern
+
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def tags_create(self, name: str, color: Optional[str] = None):
         endpoint = 'tags/create'
         request = {
@@ -522,6 +747,12 @@ class TSRestApiV2:
         endpoint = 'groups/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def groups_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                           prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'groups/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def groups_create(self, request: Dict):
         endpoint = 'groups/create'
         return self.post_request(endpoint=endpoint, request=request)
@@ -545,6 +776,12 @@ class TSRestApiV2:
         endpoint = 'metadata/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def metadata_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                             prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'metadata/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def metadata_liveboard_sql(self, liveboard_identifier: str, visualization_identifiers: Optional[List[str]] = None):
         endpoint = 'metadata/liveboard/sql'
         request = {
@@ -572,7 +809,6 @@ class TSRestApiV2:
                             ):
         endpoint = 'metadata/tml/import'
         request = {
-            'metadata_tmls': metadata_tmls,
             'import_policy': import_policy,
             'create_new': create_new
         }
@@ -585,8 +821,7 @@ class TSRestApiV2:
         if enable_large_metadata_validation is not None:
             request['enable_large_metadata_validation'] = enable_large_metadata_validation
 
-
-        return self.post_request(endpoint=endpoint, request=request)
+        return self.post_request_tml_import(endpoint=endpoint, request=request, metadata_tmls=metadata_tmls)
 
     def metadata_tml_async_import(self, metadata_tmls: List[str],
                                   import_policy: str = 'PARTIAL',
@@ -598,7 +833,6 @@ class TSRestApiV2:
                                   ):
         endpoint = 'metadata/tml/async/import'
         request = {
-            'metadata_tmls': metadata_tmls,
             'import_policy': import_policy,
             'create_new': create_new
         }
@@ -611,7 +845,7 @@ class TSRestApiV2:
         if enable_large_metadata_validation is not None:
             request['enable_large_metadata_validation'] = enable_large_metadata_validation
 
-        return self.post_request(endpoint=endpoint, request=request)
+        return self.post_request_tml_import(endpoint=endpoint, request=request, metadata_tmls=metadata_tmls)
 
     def metadata_tml_async_status(self, request: Dict):
         endpoint = 'metadata/tml/async/status'
@@ -753,6 +987,16 @@ class TSRestApiV2:
         endpoint = 'report/answer'
         return self.post_request_binary(endpoint=endpoint, request=request)
 
+    # _to_file versions write the export to disk (or a file-like object) as it arrives, so memory use does not
+    # depend on the size of the export
+    def report_liveboard_to_file(self, request: Dict, destination: FileDestination):
+        endpoint = 'report/liveboard'
+        return self.post_request_binary_to_file(endpoint=endpoint, destination=destination, request=request)
+
+    def report_answer_to_file(self, request: Dict, destination: FileDestination):
+        endpoint = 'report/answer'
+        return self.post_request_binary_to_file(endpoint=endpoint, destination=destination, request=request)
+
 #
 # /security/ endpoints
 #
@@ -795,6 +1039,19 @@ class TSRestApiV2:
         endpoint = 'metadata/answer/data'
         return self.post_request(endpoint=endpoint, request=request)
 
+    # _stream versions yield batches of rows as they are parsed, see post_request_stream_rows()
+    def searchdata_stream(self, request: Dict, batch_size: int = 1000):
+        endpoint = 'searchdata'
+        return self.post_request_stream_rows(endpoint=endpoint, request=request, batch_size=batch_size)
+
+    def metadata_liveboard_data_stream(self, request: Dict, batch_size: int = 1000):
+        endpoint = 'metadata/liveboard/data'
+        return self.post_request_stream_rows(endpoint=endpoint, request=request, batch_size=batch_size)
+
+    def metadata_answer_data_stream(self, request: Dict, batch_size: int = 1000):
+        endpoint = 'metadata/answer/data'
+        return self.post_request_stream_rows(endpoint=endpoint, request=request, batch_size=batch_size)
+
 #
 # /logs/ endpoints
 #
@@ -821,6 +1078,12 @@ class TSRestApiV2:
         endpoint = 'vcs/git/commits/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def vcs_git_commits_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                                    prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'vcs/git/commits/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def vcs_git_config_create(self, request: Dict):
         endpoint = 'vcs/git/config/create'
         return self.post_request(endpoint=endpoint, request=request)
@@ -866,6 +1129,12 @@ class TSRestApiV2:
         endpoint = 'connection/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def connection_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                               prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'connection/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def connection_create(self, request: Dict):
         endpoint = 'connection/create'
         return self.post_request(endpoint=endpoint, request=request)
@@ -902,6 +1171,12 @@ class TSRestApiV2:
         endpoint = 'roles/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def roles_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                          prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'roles/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def roles_create(self, request: Dict):
         endpoint = 'roles/create'
         return self.post_request(endpoint=endpoint, request=request)
@@ -944,6 +1219,12 @@ class TSRestApiV2:
         endpoint = 'schedules/search'
         return self.post_request(endpoint=endpoint, request=request)
 
+    def schedules_search_iter(self, request: Optional[Dict] = None, page_size: int = 100,
+                              prefetch: int = 1) -> Iterator[Dict]:
+        endpoint = 'schedules/search'
+        return self.post_request_paginated(endpoint=endpoint, request=request, page_size=page_size,
+                                           prefetch=prefetch)
+
     def schedules_create(self, request: Dict):
         endpoint = 'schedules'
         return self.post_request(endpoint=endpoint, request=request)
@@ -0,0 +1,421 @@
+from typing import Optional, Dict, List, Tuple, Union
+import asyncio
+import codecs
+import os
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# aiohttp is an optional dependency: pip install thoughtspot_rest_api_v1[async]
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .tsrestapiv2 import TSRestApiV2
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .codec import JsonCodec
+from .instrumentation import RequestRecord, endpoint_template
+from .streaming import FileDestination, DEFAULT_CHUNK_SIZE, JsonRowsParser
+from .pagination import aiter_offset_pages, as_page
+from .batching import tml_import_has_errors, tml_import_not_sent, merge_tml_import_responses
+
+
+#
+# asyncio implementation of TSRestApiV2
+# Every endpoint method is inherited from TSRestApiV2 unchanged. Those methods only build the endpoint and request
+# and then return self.get_request() / self.post_request() / self.post_request_binary(), so overriding those three
+# 'base' methods with coroutines makes every endpoint method return an awaitable, with no copy of the endpoint
+# definitions that could drift from the sync class
+#
+class TSRestApiV2Async(TSRestApiV2):
+    """
+    Async companion to TSRestApiV2, with the same method names and arguments. Each endpoint method returns an
+    awaitable, and all calls share a single pooled aiohttp.ClientSession so thousands of requests can be in flight
+    at once:
+
+        async with TSRestApiV2Async(server_url=server) as ts:
+            ts.bearer_token = (await ts.auth_token_full(username=username, password=password))['token']
+            results = await asyncio.gather(*[ts.metadata_search(request=r) for r in requests_list])
+
+    Errors are raised as requests.exceptions.HTTPError, exactly like TSRestApiV2, so existing handling still works
+    """
+    def __init__(self, server_url: str, max_connections: int = 100, max_connections_per_host: int = 0,
+                 keepalive_timeout: float = 120, timeout: Optional[float] = None,
+                 retry_policy: Optional[RetryPolicy] = None, rate_limiter: Optional[RateLimiter] = None,
+                 json_codec: Union[str, JsonCodec] = 'json'):
+        if aiohttp is None:
+            raise ImportError("TSRestApiV2Async requires the aiohttp package: "
+                              "pip install thoughtspot_rest_api_v1[async]")
+        super().__init__(server_url=server_url, retry_policy=retry_policy, rate_limiter=rate_limiter,
+                         json_codec=json_codec)
+        # requests_session only holds the settings shared with TSRestApiV2 (retry policy, token manager, cache ...)
+        # and never sends anything: the adapters requests.Session mounts by default are dropped
+        self.requests_session.close()
+        self.requests_session.adapters.clear()
+
+        # aiohttp limits: 0 means no limit
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+
+        # Created on first request, because aiohttp sessions must be created inside a running event loop
+        self.aiohttp_session: Optional['aiohttp.ClientSession'] = None
+
+    # Connections are pooled by the aiohttp.ClientSession, sized with max_connections / max_connections_per_host
+    def configure_connection_pool(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def get_aiohttp_session(self) -> 'aiohttp.ClientSession':
+        if self.aiohttp_session is None or self.aiohttp_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                             limit_per_host=self.max_connections_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self.aiohttp_session = aiohttp.ClientSession(connector=connector,
+                                                         timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.aiohttp_session
+
+    async def close(self):
+        if self.aiohttp_session is not None and not self.aiohttp_session.closed:
+            await self.aiohttp_session.close()
+        self.aiohttp_session = None
+
+    # Translates the aiohttp response into a requests.Response so raise_for_status(), json() and the HTTPError
+    # raised on failure all behave identically to the sync class. With content None (a streamed response), the body
+    # is left unread and the aiohttp response is kept in response.raw
+    @staticmethod
+    def build_requests_response(client_response: 'aiohttp.ClientResponse',
+                                content: Optional[bytes]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = client_response.status
+        response.reason = client_response.reason
+        response.url = str(client_response.url)
+        response.headers = CaseInsensitiveDict(client_response.headers)
+        if content is None:
+            response.raw = client_response
+        else:
+            response._content = content
+        return response
+
+    async def request_with_retries(self, method: str, url: str, body: Optional[bytes], headers: Dict,
+                                   stream: bool = False) -> Tuple[requests.Response, int]:
+        session = self.get_aiohttp_session()
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve(url)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            try:
+                client_response = await session.request(method, url, data=body, headers=headers)
+                # Error responses are read even when streaming, so they can be retried or raised
+                if stream and client_response.status < 400:
+                    content = None
+                else:
+                    async with client_response:
+                        content = await client_response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                connect_failure = isinstance(e, aiohttp.ClientConnectorError)
+                if policy is None or not policy.should_retry_error(method, url, attempt,
+                                                                   connect_failure=connect_failure):
+                    raise
+                delay = policy.backoff(attempt)
+            else:
+                response = self.build_requests_response(client_response, content)
+                if policy is None or not policy.should_retry_response(method, url, response.status_code, attempt):
+                    return response, attempt
+                delay = policy.delay_for_response(response.headers, attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # stream=True leaves the body of a successful response unread, in response.raw (an aiohttp.ClientResponse).
+    # The caller must read or close() it. Streamed responses are never cached or coalesced
+    async def request(self, method: str, endpoint: str, request: Optional[Dict] = None,
+                      headers: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+        url = self.base_url + endpoint
+        request_headers = dict(self.api_headers)
+        body = self.json_body(request)
+        if body is not None:
+            request_headers['Content-Type'] = 'application/json'
+        if headers is not None:
+            request_headers.update(headers)
+
+        token = await self.apply_token(request_headers)
+        response = await self.request_cached(method, url, body, request_headers, stream=stream)
+        if token is None or response.status_code != 401:
+            return response
+
+        # Concurrent 401s for the same token share a single refresh
+        loop = asyncio.get_running_loop()
+        new_token = await loop.run_in_executor(None, self.token_manager.refresh_after_unauthorized, token)
+        if new_token is None or new_token == token:
+            return response
+        request_headers['Authorization'] = 'Bearer {}'.format(new_token)
+        return await self.request_cached(method, url, body, request_headers, stream=stream)
+
+    async def request_cached(self, method: str, url: str, body: Optional[bytes], request_headers: Dict,
+                             stream: bool = False) -> requests.Response:
+        cache = self.response_cache
+        if cache is None:
+            return await self.request_coalesced(method, url, body, request_headers, stream=stream)
+        # Streamed responses are never cached, but a streamed mutating call still invalidates
+        key, response = (None, None) if stream else cache.get(method, url, body, request_headers)
+        if response is not None:
+            return response
+        if key is None:
+            response = await self.request_coalesced(method, url, body, request_headers, stream=stream)
+            cache.response_received(method, url, response.status_code)
+            return response
+        generation = cache.generation(url)
+        response = await self.request_coalesced(method, url, body, request_headers)
+        cache.put(key, url, response, generation)
+        return response
+
+    async def request_coalesced(self, method: str, url: str, body: Optional[bytes], request_headers: Dict,
+                                stream: bool = False) -> requests.Response:
+        coalescer = self.request_coalescer
+        # Streamed responses can only be read once, so they are never shared
+        if coalescer is None or stream:
+            return await self.request_recorded(method, url, body, request_headers, stream=stream)
+        return await coalescer.send_async(method, url, body, request_headers,
+                                          lambda: self.request_recorded(method, url, body, request_headers))
+
+    # Sets the Authorization header from token_manager, unless the request has its own. Returns the token used
+    async def apply_token(self, request_headers: Dict) -> Optional[str]:
+        manager = self.token_manager
+        if manager is None or 'Authorization' in request_headers:
+            return None
+        if manager.needs_refresh():
+            # Refreshing blocks on an HTTP call, so it runs on a worker thread rather than the event loop
+            token = await asyncio.get_running_loop().run_in_executor(None, manager.token)
+        else:
+            token = manager.token()
+        if token is not None:
+            request_headers['Authorization'] = 'Bearer {}'.format(token)
+        return token
+
+    async def request_recorded(self, method: str, url: str, body: Optional[bytes], request_headers: Dict,
+                               stream: bool = False) -> requests.Response:
+        instrumentation = self.requests_session.instrumentation
+        if not instrumentation:
+            return (await self.request_with_retries(method, url, body, request_headers, stream=stream))[0]
+
+        start = time.perf_counter()
+        request_bytes = len(body) if body is not None else 0
+        try:
+            response, retries = await self.request_with_retries(method, url, body, request_headers, stream=stream)
+        except Exception as e:
+            instrumentation.emit(RequestRecord(endpoint=endpoint_template(url), method=method, status=None,
+                                               latency_seconds=time.perf_counter() - start,
+                                               request_bytes=request_bytes, response_bytes=0,
+                                               error=type(e).__name__))
+            raise
+        # Streamed responses haven't been read yet, so only the declared length is known
+        if response.raw is not None:
+            response_bytes = int(response.headers.get('Content-Length', 0))
+        else:
+            response_bytes = len(response.content)
+        instrumentation.emit(RequestRecord(endpoint=endpoint_template(url), method=method,
+                                           status=response.status_code,
+                                           latency_seconds=time.perf_counter() - start,
+                                           request_bytes=request_bytes, response_bytes=response_bytes,
+                                           retries=retries))
+        return response
+
+    #
+    # Async versions of the generic wrappers. All endpoint methods of TSRestApiV2 route through these
+    #
+    async def get_request(self, endpoint):
+        response = await self.request('GET', endpoint=endpoint)
+        response.raise_for_status()
+        return self.json_codec.loads(response.content)
+
+    async def post_request(self, endpoint, request=None):
+        response = await self.request('POST', endpoint=endpoint, request=request)
+        response.raise_for_status()
+        # Most should return a JSON response, but things like deletes may just be 204s
+        try:
+            return self.json_codec.loads(response.content)
+        except requests.exceptions.JSONDecodeError:
+            return True
+
+    async def post_request_binary(self, endpoint, request=None):
+        response = await self.request('POST', endpoint=endpoint, request=request,
+                                      headers={'Accept': 'application/octet-stream'})
+        response.raise_for_status()
+        return response.content
+
+    # Streams the binary response to destination as chunks arrive, see TSRestApiV2.post_request_binary_to_file
+    # File writes are done directly on the event loop, as local disk writes of one chunk are short
+    async def post_request_binary_to_file(self, endpoint, destination: FileDestination, request=None,
+                                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+        started_at = time.perf_counter()
+        response = await self.request('POST', endpoint=endpoint, request=request,
+                                      headers={'Accept': 'application/octet-stream'}, stream=True)
+        response.raise_for_status()
+
+        bytes_written = 0
+        file_path = None
+        async with response.raw as client_response:
+            if hasattr(destination, 'write'):
+                async for chunk in client_response.content.iter_chunked(chunk_size):
+                    destination.write(chunk)
+                    bytes_written += len(chunk)
+            else:
+                file_path = os.fspath(destination)
+                try:
+                    with open(file_path, 'wb') as fh:
+                        async for chunk in client_response.content.iter_chunked(chunk_size):
+                            fh.write(chunk)
+                            bytes_written += len(chunk)
+                except BaseException:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                    raise
+
+        return {
+            'bytes_written': bytes_written,
+            'content_type': response.headers.get('Content-Type'),
+            'duration_seconds': time.perf_counter() - started_at,
+            'file_path': file_path
+        }
+
+    # Async version of TSRestApiV2.post_request_tml_import: chunks are sent concurrently on the event loop
+    async def post_request_tml_import(self, endpoint, request: Dict, metadata_tmls: List[str]):
+        chunks = self.tml_import_chunks(metadata_tmls)
+
+        async def send(chunk: List[int]):
+            chunk_request = dict(request)
+            chunk_request['metadata_tmls'] = [metadata_tmls[i] for i in chunk]
+            return await self.post_request(endpoint=endpoint, request=chunk_request)
+
+        if len(chunks) <= 1:
+            request['metadata_tmls'] = metadata_tmls
+            return await self.post_request(endpoint=endpoint, request=request)
+
+        if request.get('import_policy') == 'ALL_OR_NONE':
+            responses = []
+            for n, chunk in enumerate(chunks):
+                response = await send(chunk)
+                responses.append(response)
+                if tml_import_has_errors(response):
+                    responses.append(tml_import_not_sent(sum(len(c) for c in chunks[n + 1:])))
+                    break
+        else:
+            responses = await self.gather([send(chunk) for chunk in chunks], concurrency=self.tml_import_max_parallel)
+        return merge_tml_import_responses(responses)
+
+    # Async generator version of TSRestApiV2.post_request_paginated, so the *_search_iter methods are used as:
+    #   async for user in ts.users_search_iter(page_size=500): ...
+    # The read-ahead pages are requested as tasks while the current page is processed
+    async def post_request_paginated(self, endpoint, request: Optional[Dict] = None, page_size: int = 100,
+                                     prefetch: int = 1):
+        request = dict(request) if request is not None else {}
+        start_offset = request.pop('record_offset', 0)
+        request.pop('record_size', None)
+
+        async def fetch_page(offset: int, size: int):
+            page_request = dict(request)
+            page_request['record_offset'] = offset
+            page_request['record_size'] = size
+            return as_page(await self.post_request(endpoint=endpoint, request=page_request))
+
+        async for page in aiter_offset_pages(fetch_page, page_size=page_size, prefetch=prefetch,
+                                             start_offset=start_offset):
+            for record in page:
+                yield record
+
+    # Async generator version of TSRestApiV2.post_request_stream_rows, so the _stream data methods are used as:
+    #   async for batch in ts.searchdata_stream(request=r): ...
+    async def post_request_stream_rows(self, endpoint, request=None, batch_size: int = 1000):
+        response = await self.request('POST', endpoint=endpoint, request=request, stream=True)
+        response.raise_for_status()
+
+        async with response.raw as client_response:
+            decoder = codecs.getincrementaldecoder(client_response.charset or 'utf-8')()
+            parser = JsonRowsParser(rows_keys=('data_rows',), capture_keys=('column_names',), batch_size=batch_size)
+            done = False
+            chunks = client_response.content.iter_chunked(256 * 1024)
+            while not done:
+                try:
+                    chunk = await chunks.__anext__()
+                    batches = parser.feed(decoder.decode(chunk))
+                except StopAsyncIteration:
+                    batches = parser.feed(decoder.decode(b'', final=True)) + parser.close()
+                    done = True
+                for batch in batches:
+                    yield {
+                        'content_index': batch['path'][1] if len(batch['path']) > 1 else 0,
+                        'column_names': batch['fields'].get('column_names'),
+                        'data_rows': batch['rows']
+                    }
+
+    #
+    # Session methods that don't return the JSON body in the sync class
+    #
+    async def auth_session_login(self, username: Optional[str] = None, password: Optional[str] = None,
+                                 remember_me: bool = True,
+                                 bearer_token: Optional[str] = None,
+                                 org_identifier: Optional[int] = None) -> 'aiohttp.ClientSession':
+        endpoint = 'auth/session/login'
+
+        if bearer_token is not None:
+            response = await self.request('POST', endpoint=endpoint,
+                                          headers={"Authorization": "Bearer {}".format(bearer_token)},
+                                          request={'remember_me': str(remember_me).lower()})
+        elif username is not None and password is not None:
+            json_post_data = {
+                'username': username,
+                'password': password,
+                'remember_me': str(remember_me).lower()
+            }
+            if org_identifier is not None:
+                json_post_data["org_identifier"] = org_identifier
+            response = await self.request('POST', endpoint=endpoint, request=json_post_data)
+        else:
+            raise Exception("If using username/password, must include both")
+
+        # HTTP 204 - success, no content. The session cookies are kept in the aiohttp cookie jar
+        response.raise_for_status()
+        return self.get_aiohttp_session()
+
+    async def auth_session_logout(self) -> bool:
+        endpoint = 'auth/session/logout'
+        response = await self.request('POST', endpoint=endpoint)
+
+        # HTTP 204 - success, no content
+        response.raise_for_status()
+        return True
+
+    async def auth_token_revoke(self) -> bool:
+        endpoint = 'auth/token/revoke'
+        response = await self.request('POST', endpoint=endpoint)
+
+        # HTTP 204 - success, no content
+        response.raise_for_status()
+        return True
+
+    # Convenience for running many calls with bounded concurrency, e.g.
+    #   await ts.gather([ts.metadata_search(request=r) for r in reqs], concurrency=50)
+    @staticmethod
+    async def gather(awaitables, concurrency: int = 0, return_exceptions: bool = False):
+        if concurrency <= 0:
+            return await asyncio.gather(*awaitables, return_exceptions=return_exceptions)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(awaitable):
+            async with semaphore:
+                return await awaitable
+
+        return await asyncio.gather(*[bounded(a) for a in awaitables], return_exceptions=return_exceptions)
@@ -0,0 +1,121 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import threading
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Transport adapter answering every request with handler(request) -> (status, body) or (status, body, headers),
+    without a network. A Dict or List body is sent as JSON. Requests are recorded in calls
+    """
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.calls = []
+
+    def send(self, request, **kwargs):
+        self.calls.append(request)
+        result = self.handler(request)
+        status, body = result[0], result[1]
+        headers = result[2] if len(result) > 2 else {}
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            headers = dict({'Content-Type': 'application/json'}, **headers)
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        # The body is already in memory, so iter_content() serves it in chunks even with stream=True
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    """
+    fake_server(requests_session, handler) mounts a FakeAdapter on the session and returns it
+    """
+    def mount(requests_session, handler) -> FakeAdapter:
+        adapter = FakeAdapter(handler)
+        requests_session.mount('https://', adapter)
+        requests_session.mount('http://', adapter)
+        return adapter
+    return mount
+
+
+@pytest.fixture
+def run_with_server():
+    """
+    run_with_server(handler, scenario) starts the aiohttp handler on a local port for all GETs and POSTs, then runs
+    scenario(server_url) on the same event loop and returns its result
+    """
+    web = pytest.importorskip('aiohttp.web')
+
+    def run(handler, scenario):
+        async def main():
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                return await scenario('http://127.0.0.1:{}'.format(port))
+            finally:
+                await runner.cleanup()
+        return asyncio.run(main())
+    return run
+
+
+@pytest.fixture
+def http_server():
+    """
+    http_server(handler) starts a local HTTP/1.1 server with keep-alive, on a thread, answering each request with
+    handler(method, path, body) -> (status, body bytes) or (status, body bytes, headers). Returns the server URL.
+    Stopped at the end of the test
+    """
+    servers = []
+
+    def start(handler) -> str:
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def answer(self):
+                length = int(self.headers.get('Content-Length', 0))
+                result = handler(self.command, self.path, self.rfile.read(length))
+                status, body = result[0], result[1]
+                self.send_response(status)
+                for name, value in (result[2] if len(result) > 2 else {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = answer
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from thoughtspot_rest_api_v1.singleflight import RequestCoalescer
+from thoughtspot_rest_api_v1.tsrestapiv2async import TSRestApiV2Async
+
+
+def test_no_requests_connection_pool():
+    ts = TSRestApiV2Async(server_url='https://ts.example.com')
+    assert ts.requests_session.adapters == {}
+    ts.configure_connection_pool(pool_maxsize=50)
+    assert ts.requests_session.adapters == {}
+    assert ts.connection_pool_stats()['checkouts'] == 0
+
+
+def test_endpoint_methods_are_awaitable(run_with_server):
+    calls = []
+
+    async def handler(request):
+        calls.append((request.method, request.path, await request.json() if request.can_read_body else None))
+        await asyncio.sleep(0.05)
+        return web.json_response([{'metadata_id': request.path}])
+
+    async def scenario(server_url):
+        async with TSRestApiV2Async(server_url) as ts:
+            ts.request_coalescer = RequestCoalescer()
+            # Identical searches in flight at the same time share one request
+            results = await asyncio.gather(*[ts.metadata_search(request={'metadata': [{'type': 'LIVEBOARD'}]})
+                                             for _ in range(5)])
+            info = await ts.get_request('system')
+            return results, info, ts.request_coalescer.stats()
+
+    results, info, stats = run_with_server(handler, scenario)
+    assert results == [[{'metadata_id': '/api/rest/2.0/metadata/search'}]] * 5
+    assert info == [{'metadata_id': '/api/rest/2.0/system'}]
+    assert [c[:2] for c in calls] == [('POST', '/api/rest/2.0/metadata/search'), ('GET', '/api/rest/2.0/system')]
+    assert calls[0][2] == {'metadata': [{'type': 'LIVEBOARD'}]}
+    assert stats['coalesced'] == 4
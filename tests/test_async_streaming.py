@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+import requests
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from thoughtspot_rest_api_v1.auth import BearerTokenManager
+from thoughtspot_rest_api_v1.retry import RetryPolicy
+from thoughtspot_rest_api_v1.tsrestapiv2async import TSRestApiV2Async
+
+ROWS = {'contents': [{'column_names': ['a'], 'data_rows': [[i] for i in range(25)]}]}
+
+
+def test_stream_rows_retries_transient_errors(run_with_server):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.path)
+        if len(calls) == 1:
+            return web.Response(status=503, headers={'Retry-After': '0'})
+        return web.json_response(ROWS)
+
+    async def scenario(server_url):
+        async with TSRestApiV2Async(server_url, retry_policy=RetryPolicy(backoff_factor=0, jitter=False)) as ts:
+            return [batch async for batch in ts.searchdata_stream(request={}, batch_size=10)]
+
+    batches = run_with_server(handler, scenario)
+    assert len(calls) == 2
+    assert [len(b['data_rows']) for b in batches] == [10, 10, 5]
+
+
+def test_binary_to_file_refreshes_token_after_401(run_with_server):
+    tokens = iter(['old', 'new'])
+
+    async def handler(request):
+        if request.headers.get('Authorization') != 'Bearer new':
+            return web.Response(status=401)
+        return web.Response(body=b'%PDF' * 1000, content_type='application/pdf')
+
+    async def scenario(server_url):
+        async with TSRestApiV2Async(server_url) as ts:
+            ts.token_manager = BearerTokenManager(fetch_token=lambda: next(tokens))
+            destination = io.BytesIO()
+            result = await ts.report_liveboard_to_file(request={}, destination=destination)
+            return result, destination.getvalue()
+
+    result, content = run_with_server(handler, scenario)
+    assert result['bytes_written'] == 4000
+    assert content == b'%PDF' * 1000
+
+
+def test_failed_stream_is_recorded(run_with_server):
+    async def handler(request):
+        return web.Response(status=500, text=json.dumps({'error': 'boom'}))
+
+    records = []
+
+    async def scenario(server_url):
+        async with TSRestApiV2Async(server_url) as ts:
+            ts.add_instrumentation_hook(records.append)
+            with pytest.raises(requests.exceptions.HTTPError):
+                async for _ in ts.searchdata_stream(request={}):
+                    pass
+            await ts.report_liveboard_to_file(request={}, destination=io.BytesIO())
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        run_with_server(handler, scenario)
+    assert [(r.endpoint, r.status) for r in records] == [('searchdata', 500), ('report/liveboard', 500)]
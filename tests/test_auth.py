@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+
+import pytest
+
+from thoughtspot_rest_api_v1 import TSRestApiV2
+from thoughtspot_rest_api_v1.auth import BearerTokenManager, token_expiry
+
+SERVER = 'https://ts.example.com'
+
+
+def counting_fetcher(validity_seconds=None):
+    calls = []
+
+    def fetch():
+        calls.append(time.time())
+        time.sleep(0.01)
+        token = 'token-{}'.format(len(calls))
+        if validity_seconds is None:
+            return token
+        # As returned by auth/token/full
+        now_ms = int(time.time() * 1000)
+        return {'token': token, 'creation_time_in_millis': now_ms,
+                'expiration_time_in_millis': now_ms + validity_seconds * 1000}
+    return fetch, calls
+
+
+def test_token_expiry():
+    assert token_expiry({'expiration_time_in_millis': 5000, 'creation_time_in_millis': 1000}, 0, 300) == 5.0
+    assert token_expiry({'creation_time_in_millis': 1000}, 0, 300) == 301.0
+    assert token_expiry('token', 100, 300) == 400
+
+
+def test_token_is_reused_until_refresh_margin():
+    fetch, calls = counting_fetcher()
+    manager = BearerTokenManager(fetch, refresh_margin=60, token_validity=3600)
+    assert manager.token() == 'token-1'
+    assert manager.token() == 'token-1'
+    assert len(calls) == 1
+
+
+def test_expiry_is_read_from_the_response():
+    fetch, calls = counting_fetcher(validity_seconds=30)
+    # token_validity would keep the token for an hour: the response says 30 seconds
+    manager = BearerTokenManager(fetch, refresh_margin=60, token_validity=3600)
+    assert manager.token() == 'token-1'
+    assert manager.expires_at == pytest.approx(calls[0] + 30, abs=1)
+    # Valid for less than the margin: refreshed on every use
+    assert manager.token() == 'token-2'
+
+    fetch, calls = counting_fetcher(validity_seconds=3600)
+    manager = BearerTokenManager(fetch, refresh_margin=60, token_validity=30)
+    manager.token()
+    assert manager.expires_at == pytest.approx(calls[0] + 3600, abs=1)
+    assert manager.token() == 'token-1'
+
+
+def test_concurrent_401s_share_one_refresh():
+    fetch, calls = counting_fetcher()
+    manager = BearerTokenManager(fetch, token_validity=3600)
+    rejected = manager.token()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.refresh_after_unauthorized(rejected)))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ['token-2'] * 10
+    assert len(calls) == 2
+
+
+def test_refresh_through_the_same_client(fake_server):
+    # The server revokes token-1 early. auth/token/full rejects any bearer token it does not accept
+    valid_tokens = {'token-1'}
+    issued = []
+    token_requests = []
+
+    def handler(request):
+        authorization = request.headers.get('Authorization')
+        if request.url.endswith('auth/token/full'):
+            token_requests.append(authorization)
+            if authorization is not None and authorization[len('Bearer '):] not in valid_tokens:
+                return 401, b''
+            token = 'token-{}'.format(len(issued) + 1)
+            issued.append(token)
+            valid_tokens.add(token)
+            now_ms = int(time.time() * 1000)
+            return 200, {'token': token, 'creation_time_in_millis': now_ms,
+                         'expiration_time_in_millis': now_ms + 3600 * 1000}
+        if authorization is None or authorization[len('Bearer '):] not in valid_tokens:
+            return 401, b''
+        return 200, {'authorization': authorization}
+
+    ts = TSRestApiV2(server_url=SERVER)
+    fake_server(ts.requests_session, handler)
+    ts.token_manager = BearerTokenManager.for_auth_token_full(ts, username='u', secret_key='s',
+                                                              validity_time_in_sec=3600)
+    assert ts.get_request('auth/session/user') == {'authorization': 'Bearer token-1'}
+    valid_tokens.discard('token-1')
+    assert ts.get_request('auth/session/user') == {'authorization': 'Bearer token-2'}
+    # Neither token request carried the old token
+    assert token_requests == [None, None]
+    assert ts.token_manager.refresh_count == 2
+    assert json.loads(ts.requests_session.adapters['https://'].calls[0].body)['username'] == 'u'
@@ -0,0 +1,62 @@
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+from thoughtspot_rest_api_v1.batching import (split_ids_for_url, merge_responses, chunk_by_size,
+                                              merge_tml_import_responses, tml_import_has_errors, json_item_size)
+
+URL = 'https://ts.example.com/callosum/v1/tspublic/v1/metadata/details'
+PARAMS = {'type': 'PINBOARD_ANSWER_BOOK', 'showhidden': 'false'}
+
+
+def encoded_url_length(chunk):
+    # As requests encodes the query string
+    return len(URL) + 1 + len(urlencode(dict(PARAMS, id=json.dumps(chunk))))
+
+
+@pytest.mark.parametrize('max_url_length', [500, 1000, 7500])
+def test_split_ids_stays_under_max_url_length(max_url_length):
+    ids = ['{:08x}-0000-0000-0000-{:012x}'.format(i, i) for i in range(300)]
+    chunks = split_ids_for_url(URL, PARAMS, 'id', ids, max_url_length=max_url_length)
+    assert [i for chunk in chunks for i in chunk] == ids
+    assert all(encoded_url_length(chunk) <= max_url_length for chunk in chunks)
+    # Chunks are filled: adding the next id would go over the limit
+    for chunk, next_chunk in zip(chunks, chunks[1:]):
+        assert encoded_url_length(chunk + next_chunk[:1]) > max_url_length
+
+
+def test_split_ids_edge_cases():
+    assert split_ids_for_url(URL, PARAMS, 'id', []) == [[]]
+    assert split_ids_for_url(URL, PARAMS, 'id', ['a', 'b']) == [['a', 'b']]
+    # An id too long for the limit gets a chunk of its own
+    assert split_ids_for_url(URL, PARAMS, 'id', ['a', 'x' * 1000, 'b'], max_url_length=200) == [['a'], ['x' * 1000],
+                                                                                                  ['b']]
+
+
+def test_merge_responses():
+    assert merge_responses([[1, 2], [3]]) == [1, 2, 3]
+    assert merge_responses([{'storables': [{'id': 'a'}]}, {'storables': [{'id': 'b'}]}]) == {
+        'storables': [{'id': 'a'}, {'id': 'b'}]}
+    # Objects keyed by GUID are merged key by key, recursively. Scalars keep the first value
+    assert merge_responses([{'g1': {'USER': ['u1']}, 'debug': 1}, {'g1': {'GROUP': ['g']}, 'g2': {}, 'debug': 2}]) == {
+        'g1': {'USER': ['u1'], 'GROUP': ['g']}, 'g2': {}, 'debug': 1}
+    assert merge_responses([{'a': [1]}]) == {'a': [1]}
+
+
+def test_chunk_by_size():
+    items = ['a' * 10, 'b' * 10, 'c' * 100, 'd']
+    size = json_item_size('a' * 10)
+    assert chunk_by_size(items, max_bytes=2 * size) == [[0, 1], [2], [3]]
+    assert chunk_by_size(items, max_bytes=None, max_items=3) == [[0, 1, 2], [3]]
+    assert chunk_by_size(items, max_bytes=None) == [[0, 1, 2, 3]]
+
+
+def test_merge_tml_import_responses():
+    ok = {'response': {'status': {'status_code': 'OK'}}}
+    error = {'response': {'status': {'status_code': 'ERROR'}}}
+    assert merge_tml_import_responses([[ok], [error]]) == [ok, error]
+    assert tml_import_has_errors([ok, error]) and not tml_import_has_errors([ok])
+    assert merge_tml_import_responses([{'task_id': 't1'}, {'task_id': 't2'}]) == {'task_id': 't1',
+                                                                                   'task_ids': ['t1', 't2']}
+    assert merge_tml_import_responses([{'object': [ok]}, {'object': [error]}]) == {'object': [ok, error]}
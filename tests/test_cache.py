@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+
+from thoughtspot_rest_api_v1.cache import ResponseCache
+from thoughtspot_rest_api_v1.transport import TSRequestsSession
+
+SERVER = 'https://ts.example.com/api/rest/2.0/'
+
+
+@pytest.fixture
+def session_with(fake_server):
+    def make(handler, cache):
+        session = TSRequestsSession()
+        session.response_cache = cache
+        return session, fake_server(session, handler)
+    return make
+
+
+def test_hit_and_miss(session_with):
+    cache = ResponseCache()
+    session, adapter = session_with(lambda r: (200, b'{"tags": []}'), cache)
+    for _ in range(3):
+        assert session.post(SERVER + 'tags/search', json={}).content == b'{"tags": []}'
+    assert len(adapter.calls) == 1
+    # A different body or other credentials is another entry
+    session.post(SERVER + 'tags/search', json={'tag_identifier': 'a'})
+    session.post(SERVER + 'tags/search', json={}, headers={'Authorization': 'Bearer other'})
+    assert len(adapter.calls) == 3
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 3, 3)
+
+
+def test_errors_and_other_endpoints_are_not_cached(session_with):
+    cache = ResponseCache()
+    session, adapter = session_with(lambda r: (500, b'') if 'tags' in r.url else (200, b'[]'), cache)
+    session.post(SERVER + 'tags/search', json={})
+    session.post(SERVER + 'tags/search', json={})
+    session.post(SERVER + 'users/search', json={})
+    session.post(SERVER + 'users/search', json={})
+    assert len(adapter.calls) == 4
+    assert cache.stats()['entries'] == 0
+
+
+def test_ttl_expiry(monkeypatch, session_with):
+    now = [1000.0]
+    monkeypatch.setattr('thoughtspot_rest_api_v1.cache.time.monotonic', lambda: now[0])
+    cache = ResponseCache(ttls={'tags/search': 60})
+    session, adapter = session_with(lambda r: (200, b'[]'), cache)
+    session.post(SERVER + 'tags/search', json={})
+    now[0] += 59
+    session.post(SERVER + 'tags/search', json={})
+    assert len(adapter.calls) == 1
+    now[0] += 2
+    session.post(SERVER + 'tags/search', json={})
+    assert len(adapter.calls) == 2
+
+
+def test_lru_eviction(session_with):
+    cache = ResponseCache(max_bytes=25)
+    session, adapter = session_with(lambda r: (200, b'x' * 10), cache)
+    session.post(SERVER + 'tags/search', json={'a': 1})
+    session.post(SERVER + 'roles/search', json={'a': 1})
+    session.post(SERVER + 'orgs/search', json={'a': 1})
+    assert cache.stats()['entries'] == 1
+    session.post(SERVER + 'orgs/search', json={'a': 1})
+    assert len(adapter.calls) == 3
+
+
+def test_successful_mutation_invalidates_family(session_with):
+    cache = ResponseCache()
+    status = {'tags/create': 500}
+    session, adapter = session_with(lambda r: (status.get(r.url[len(SERVER):], 200), b'[]'), cache)
+    session.post(SERVER + 'tags/search', json={})
+    session.post(SERVER + 'metadata/search', json={})
+    session.post(SERVER + 'orgs/search', json={})
+
+    # A failed mutation changed nothing
+    session.post(SERVER + 'tags/create', json={'name': 't'})
+    assert cache.stats()['entries'] == 3
+
+    status['tags/create'] = 200
+    session.post(SERVER + 'tags/create', json={'name': 't'})
+    # tags also invalidates metadata
+    assert cache.stats()['entries'] == 1
+    session.post(SERVER + 'orgs/search', json={})
+    session.post(SERVER + 'tags/search', json={})
+    assert [r.url for r in adapter.calls].count(SERVER + 'tags/search') == 2
+    assert [r.url for r in adapter.calls].count(SERVER + 'orgs/search') == 1
+
+
+def test_read_during_mutation_is_not_served_stale(session_with):
+    cache = ResponseCache()
+    tags = ['old']
+    mutation_started = threading.Event()
+    release_mutation = threading.Event()
+
+    def handler(request):
+        if request.url.endswith('tags/create'):
+            mutation_started.set()
+            release_mutation.wait(5)
+            tags.append('new')
+        return 200, ','.join(tags).encode()
+
+    session, adapter = session_with(handler, cache)
+    session.post(SERVER + 'tags/search', json={})
+    mutation = threading.Thread(target=lambda: session.post(SERVER + 'tags/create', json={'name': 'new'}))
+    mutation.start()
+    mutation_started.wait(5)
+    # Read while the mutation is in progress: the old state, cached again
+    assert session.post(SERVER + 'tags/search', json={}).content == b'old'
+    release_mutation.set()
+    mutation.join()
+    assert session.post(SERVER + 'tags/search', json={}).content == b'old,new'
+
+
+def test_read_in_flight_during_invalidation_is_not_cached(session_with):
+    cache = ResponseCache()
+    tags = ['old']
+    read_sent = threading.Event()
+    release_read = threading.Event()
+
+    def handler(request):
+        if request.url.endswith('tags/create'):
+            tags.append('new')
+            return 200, b''
+        content = ','.join(tags).encode()
+        read_sent.set()
+        release_read.wait(5)
+        return 200, content
+
+    session, adapter = session_with(handler, cache)
+    results = []
+    read = threading.Thread(target=lambda: results.append(session.post(SERVER + 'tags/search', json={}).content))
+    read.start()
+    read_sent.wait(5)
+    session.post(SERVER + 'tags/create', json={'name': 'new'})
+    release_read.set()
+    read.join()
+    # The read was answered before the change: returned to its caller but not cached
+    assert results == [b'old']
+    assert session.post(SERVER + 'tags/search', json={}).content == b'old,new'
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+import json
+
+import pytest
+import requests
+
+from thoughtspot_rest_api_v1 import TSRestApiV2, JsonCodec, get_json_codec
+from thoughtspot_rest_api_v1 import codec as codec_module
+from thoughtspot_rest_api_v1.codec import OrjsonCodec, UjsonCodec
+
+DOC = {'name': 'Sales – 2024', 'ids': [1, 2.5, None, True], 'nested': {'b': 1, 'a': 'x/y'}}
+
+AVAILABLE = ['json'] + [name for name, module in (('orjson', codec_module.orjson), ('ujson', codec_module.ujson))
+                        if module is not None]
+
+
+@pytest.mark.parametrize('name', AVAILABLE)
+def test_round_trip(name):
+    codec = get_json_codec(name)
+    assert codec.name == name
+    encoded = codec.dumps(DOC)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == DOC
+    assert codec.loads(encoded) == DOC
+    assert codec.loads(encoded.decode('utf-8')) == DOC
+    ordered = codec.loads(encoded, ordered=True)
+    assert isinstance(ordered['nested'], OrderedDict) and list(ordered['nested']) == ['b', 'a']
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        codec.loads(b'{"truncated": ')
+
+
+def test_codec_selection(monkeypatch):
+    assert type(get_json_codec()) is JsonCodec
+    custom = JsonCodec()
+    assert get_json_codec(custom) is custom
+    with pytest.raises(ValueError):
+        get_json_codec('simplejson')
+
+    monkeypatch.setattr(codec_module, 'orjson', None)
+    monkeypatch.setattr(codec_module, 'ujson', None)
+    assert type(get_json_codec('auto')) is JsonCodec
+    with pytest.raises(ImportError):
+        get_json_codec('orjson')
+    monkeypatch.setattr(codec_module, 'ujson', object())
+    assert type(get_json_codec('auto')) is UjsonCodec
+    monkeypatch.setattr(codec_module, 'orjson', object())
+    assert type(get_json_codec('auto')) is OrjsonCodec
+
+
+class CountingCodec(JsonCodec):
+    def __init__(self):
+        self.encoded = []
+        self.decoded = 0
+
+    def dumps(self, obj):
+        self.encoded.append(obj)
+        return super().dumps(obj)
+
+    def loads(self, data, ordered=False):
+        self.decoded += 1
+        return super().loads(data, ordered=ordered)
+
+
+def test_client_uses_its_codec(fake_server):
+    codec = CountingCodec()
+    ts = TSRestApiV2(server_url='https://ts.example.com', json_codec=codec)
+    adapter = fake_server(ts.requests_session, lambda r: (200, [{'metadata_id': 'g1'}]))
+    request = {'metadata': [{'type': 'LIVEBOARD'}], 'record_size': 10}
+    assert ts.metadata_search(request=request) == [{'metadata_id': 'g1'}]
+    assert codec.encoded == [request]
+    assert codec.decoded == 1
+    assert json.loads(adapter.calls[0].body) == request
+    assert adapter.calls[0].headers['Content-Type'] == 'application/json'
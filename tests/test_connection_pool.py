@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from thoughtspot_rest_api_v1 import TSRestApiV1, TSRestApiV2
+from thoughtspot_rest_api_v1.transport import PoolStatsAdapter, TCPKeepAlivePoolStatsAdapter
+
+
+def test_connections_are_reused(http_server):
+    server_url = http_server(lambda method, path, body: (200, b'{}'))
+    ts = TSRestApiV2(server_url=server_url)
+    for _ in range(5):
+        ts.get_request('system')
+    stats = ts.connection_pool_stats()
+    assert stats == {'connections_opened': 1, 'connections_reused': 4, 'connections_discarded': 0, 'checkouts': 5}
+
+
+def test_small_pool_discards_connections(http_server):
+    all_in = threading.Barrier(4, timeout=5)
+
+    def handler(method, path, body):
+        # Keeps the 4 requests in flight at once, so 4 connections are needed
+        all_in.wait()
+        return 200, b'{}'
+
+    server_url = http_server(handler)
+    ts = TSRestApiV2(server_url=server_url, pool_maxsize=2)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: ts.get_request('system'), range(4)))
+    stats = ts.connection_pool_stats()
+    assert stats['connections_opened'] == 4
+    # Only pool_maxsize of them are kept
+    assert stats['connections_discarded'] == 2
+
+
+def test_pool_configuration():
+    ts = TSRestApiV1(server_url='https://ts.example.com', pool_maxsize=25, tcp_keep_alive=True)
+    adapter = ts.requests_session.get_adapter('https://ts.example.com')
+    assert isinstance(adapter, TCPKeepAlivePoolStatsAdapter)
+    assert adapter._pool_maxsize == 25
+    ts.configure_connection_pool(pool_maxsize=4, pool_block=True)
+    adapter = ts.requests_session.get_adapter('https://ts.example.com')
+    assert type(adapter) is PoolStatsAdapter
+    assert (adapter._pool_maxsize, adapter._pool_block) == (4, True)
+    assert ts.connection_pool_stats()['checkouts'] == 0
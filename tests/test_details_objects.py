@@ -0,0 +1,72 @@
+import pytest
+
+from thoughtspot_rest_api_v1 import details_objects
+from thoughtspot_rest_api_v1.details_objects import UserDetails, GroupDetails, LiveboardDetails
+
+
+def user(name, privileges):
+    return {'privileges': list(privileges), 'assignedGroups': ['g1'], 'inheritedGroups': ['g1', 'g2'],
+            'state': 'ACTIVE', 'isSuperUser': False,
+            'header': {'name': name, 'displayName': name.title(), 'created': 1, 'modified': 2}}
+
+
+def liveboard(guid, tables):
+    columns = [{'column': {'referencedTableHeaders': [{'id': t, 'name': t.upper()}]}} for t in tables]
+    columns.append({'referencedTableHeaders': [{'id': tables[0], 'name': tables[0].upper()}]})
+    return {'header': {'id': guid, 'name': guid, 'resolvedObjects': {
+        'viz1': {'reportContent': {'sheets': [{'sheetContent': {'visualizations': [
+            {'vizContent': {'columns': columns}}, {'vizContent': {}}]}}]}},
+        'viz2': {'reportContent': {}}}}}
+
+
+def test_user_fields():
+    details = UserDetails(user('alice', ['A', 'B']))
+    assert details.privileges() == ['A', 'B']
+    assert details.inherited_groups() == ['g1', 'g2']
+    assert details.username() == 'alice'
+    assert details.display_name() == 'Alice'
+    assert details.is_user_superuser() is False
+
+
+def test_whole_response_is_accepted():
+    assert GroupDetails({'storables': [user('g', ['X'])]}).privileges() == ['X']
+
+
+def test_compact_releases_response():
+    details = UserDetails(user('alice', ['A']), compact=True)
+    assert details.details_obj is None
+    assert details.privileges() == ['A']
+    assert details.last_modified_timestamp() == 2
+
+
+def test_objects_of_one_response_share_lists():
+    response = {'storables': [user('u{}'.format(i), ['A', 'B']) for i in range(3)]}
+    users = UserDetails.from_details_response(response, compact=True)
+    assert users[0]._privileges is users[1]._privileges is users[2]._privileges
+    assert users[0].privileges() == ['A', 'B']
+
+
+def test_no_module_level_pool():
+    # Sharing is scoped to one from_details_response() call: nothing is kept once the objects are gone
+    users = UserDetails.from_details_response({'storables': [user('u', ['A'])]})
+    others = UserDetails.from_details_response({'storables': [user('v', ['A'])]})
+    assert users[0].privileges() == others[0].privileges()
+    assert users[0]._privileges is not others[0]._privileges
+    assert not any(isinstance(v, dict) and len(v) > 0 for k, v in vars(details_objects).items()
+                   if not k.startswith('__'))
+
+
+def test_liveboard_data_sources():
+    liveboards = LiveboardDetails.from_details_response(
+        {'storables': [liveboard('lb1', ['t1', 't2']), liveboard('lb2', ['t2'])]}, compact=True)
+    assert [lb.guid() for lb in liveboards] == ['lb1', 'lb2']
+    assert liveboards[0].referenced_data_sources() == ['t1', 't2']
+    assert liveboards[0].referenced_data_source_names() == {'t1': 'T1', 't2': 'T2'}
+    assert liveboards[1].referenced_data_sources() == ['t2']
+
+
+def test_field_not_read_before_compact():
+    details = LiveboardDetails(liveboard('lb1', ['t1']), compact=True)
+    details._name = details_objects._UNSET
+    with pytest.raises(ValueError):
+        details.name()
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+import requests
+
+from thoughtspot_rest_api_v1.endpoints import is_read_only
+from thoughtspot_rest_api_v1.retry import RetryPolicy
+from thoughtspot_rest_api_v1.singleflight import RequestCoalescer
+from thoughtspot_rest_api_v1.cache import ResponseCache
+from thoughtspot_rest_api_v1.transport import TSRequestsSession
+
+V2 = 'https://ts.example.com/api/rest/2.0/'
+V1 = 'https://ts.example.com/callosum/v1/tspublic/v1/'
+
+READ_ONLY = [
+    ('GET', V1 + 'metadata/listobjectheaders'),
+    ('POST', V2 + 'metadata/search'),
+    ('POST', V2 + 'vcs/git/commits/search'),
+    ('POST', V2 + 'searchdata'),
+    ('POST', V2 + 'metadata/liveboard/data'),
+    ('POST', V2 + 'metadata/answer/sql'),
+    ('POST', V2 + 'metadata/tml/export'),
+    ('POST', V2 + 'metadata/tml/async/status'),
+    ('POST', V2 + 'security/metadata/fetch-permissions'),
+    ('POST', V2 + 'report/liveboard'),
+    ('POST', V2 + 'auth/token/validate'),
+    ('POST', V1 + 'pinboarddata'),
+    ('POST', V1 + 'metadata/tml/export'),
+    ('POST', V1 + 'export/pinboard/pdf'),
+    ('POST', V1 + 'security/effectivepermissionbulk'),
+    ('POST', 'https://ts.example.com/callosum/v1/connection/fetchConnection'),
+]
+
+MUTATING = [
+    ('POST', V2 + 'tags/create'),
+    ('POST', V2 + 'metadata/tml/import'),
+    ('POST', V2 + 'auth/token/revoke'),
+    ('POST', V2 + 'auth/token/full'),
+    ('POST', V2 + 'auth/token/object'),
+    ('POST', V2 + 'auth/token/custom'),
+    ('POST', V2 + 'users/abc/update'),
+    ('DELETE', V2 + 'metadata/search'),
+    ('POST', V1 + 'metadata/tml/import'),
+    ('POST', V1 + 'user/transfer/ownership'),
+]
+
+
+@pytest.mark.parametrize('method, url', READ_ONLY)
+def test_read_only_everywhere(method, url):
+    assert is_read_only(method, url)
+    assert RetryPolicy().is_idempotent(method, url)
+    assert RequestCoalescer.is_coalesced(method, url)
+
+
+@pytest.mark.parametrize('method, url', MUTATING)
+def test_mutating_everywhere(method, url):
+    assert not is_read_only(method, url)
+    assert not RetryPolicy().is_idempotent(method, url)
+    assert not RequestCoalescer.is_coalesced(method, url)
+
+
+def test_cache_invalidates_only_on_mutating_calls():
+    cache = ResponseCache(ttls={'tags/search': 60})
+    key, cached = cache.get('POST', V2 + 'tags/search', b'{}', {})
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'[]'
+    cache.put(key, V2 + 'tags/search', response)
+    # security is a family that invalidates metadata, but fetch-permissions only reads
+    cache.response_received('POST', V2 + 'security/metadata/fetch-permissions', 200)
+    cache.get('POST', V2 + 'tags/search', b'{}', {})
+    assert cache.stats()['hits'] == 1
+    cache.response_received('POST', V2 + 'tags/create', 200)
+    assert cache.stats()['entries'] == 0
+
+
+def test_concurrent_token_requests_are_not_shared(fake_server):
+    session = TSRequestsSession()
+    session.request_coalescer = RequestCoalescer()
+    both_sent = threading.Barrier(2, timeout=5)
+    issued = []
+
+    def handler(request):
+        # Only returns once both requests reached the server
+        both_sent.wait()
+        issued.append('token-{}'.format(len(issued) + 1))
+        return 200, {'token': issued[-1]}
+
+    fake_server(session, handler)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(
+        session.post(V2 + 'auth/token/full', json={'username': 'u'}).json()['token'])) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(tokens) == ['token-1', 'token-2']
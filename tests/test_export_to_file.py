@@ -0,0 +1,73 @@
+import io
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import requests
+
+from thoughtspot_rest_api_v1 import TSRestApiV1, TSRestApiV2
+from thoughtspot_rest_api_v1.streaming import stream_response_to_file
+
+PDF = b'%PDF-1.7\n' + bytes(range(256)) * 4096
+
+
+def pdf_server(http_server, requests_seen):
+    def handler(method, path, body):
+        requests_seen.append((method, path, body))
+        if 'missing' in path or b'missing' in body:
+            return 404, b'{"error": "not found"}'
+        return 200, PDF, {'Content-Type': 'application/pdf'}
+    return http_server(handler)
+
+
+def test_report_to_file(http_server, tmp_path):
+    seen = []
+    ts = TSRestApiV2(server_url=pdf_server(http_server, seen))
+    file_path = tmp_path / 'report.pdf'
+    result = ts.report_liveboard_to_file(request={'metadata_identifier': 'lb', 'file_format': 'PDF'},
+                                         destination=str(file_path))
+    assert file_path.read_bytes() == PDF
+    assert result['bytes_written'] == len(PDF)
+    assert result['content_type'] == 'application/pdf'
+    assert result['file_path'] == str(file_path)
+    assert seen[0][:2] == ('POST', '/api/rest/2.0/report/liveboard')
+
+
+def test_v1_pdf_to_file_object(http_server):
+    seen = []
+    ts = TSRestApiV1(server_url=pdf_server(http_server, seen))
+    destination = io.BytesIO()
+    result = ts.export_pinboard_pdf_to_file(destination, pinboard_id='pb1', one_visualization_per_page=True,
+                                            chunk_size=1000)
+    assert destination.getvalue() == PDF
+    assert (result['bytes_written'], result['file_path']) == (len(PDF), None)
+    params = parse_qs(urlparse(seen[0][1]).query)
+    assert (params['id'], params['layout_type']) == (['pb1'], ['VISUALIZATION'])
+
+
+def test_error_response_writes_no_file(http_server, tmp_path):
+    ts = TSRestApiV2(server_url=pdf_server(http_server, []))
+    file_path = tmp_path / 'report.pdf'
+    with pytest.raises(requests.exceptions.HTTPError):
+        ts.report_answer_to_file(request={'metadata_identifier': 'missing'}, destination=str(file_path))
+    assert not file_path.exists()
+
+
+class BrokenResponse:
+    # Fails after the first chunk, like a connection dropped mid-transfer
+    headers = {}
+
+    def iter_content(self, chunk_size):
+        yield b'partial'
+        raise requests.exceptions.ChunkedEncodingError('connection dropped')
+
+    def close(self):
+        self.closed = True
+
+
+def test_partial_file_is_removed(tmp_path):
+    response = BrokenResponse()
+    file_path = tmp_path / 'report.pdf'
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        stream_response_to_file(response, str(file_path))
+    assert not file_path.exists()
+    assert response.closed
@@ -0,0 +1,77 @@
+import pytest
+import requests
+
+from thoughtspot_rest_api_v1 import TSRestApiV2, RetryPolicy
+from thoughtspot_rest_api_v1.instrumentation import (LatencyHistogram, PrometheusFileExporter, RequestRecord,
+                                                     endpoint_template)
+
+V2 = 'https://ts.example.com/api/rest/2.0/'
+GUID = '0f3b4bb8-4a67-4a62-9a0f-1d3e2b7c6f10'
+
+
+def test_endpoint_template():
+    assert endpoint_template(V2 + 'users/jane.doe/update') == 'users/{}/update'
+    assert endpoint_template(V2 + 'metadata/liveboard/' + GUID) == 'metadata/liveboard/{}'
+    assert endpoint_template('https://ts.example.com/callosum/v1/tspublic/v1/group/g1/user/u1') == 'group/{}/user/{}'
+    assert endpoint_template(V2 + 'metadata/search') == 'metadata/search'
+
+
+def test_every_call_is_recorded(fake_server):
+    ts = TSRestApiV2(server_url='https://ts.example.com', retry_policy=RetryPolicy(backoff_factor=0, jitter=False))
+    statuses = iter([503, 200, 200, 404])
+    fake_server(ts.requests_session, lambda r: (next(statuses), b'{"ok": true}'))
+    records = []
+    histogram = LatencyHistogram()
+    ts.add_instrumentation_hook(records.append)
+    ts.add_instrumentation_hook(histogram)
+    # A failing hook does not break the call
+    ts.add_instrumentation_hook(lambda record: 1 / 0)
+
+    ts.metadata_search(request={'metadata': [{'type': 'LIVEBOARD'}]})
+    ts.post_request('users/{}/update'.format('jane'), request={'name': 'x'})
+    with pytest.raises(requests.exceptions.HTTPError):
+        ts.post_request('users/{}/update'.format('john'), request={'name': 'x'})
+
+    assert [(r.endpoint, r.method, r.status, r.retries) for r in records] == [
+        ('metadata/search', 'POST', 200, 1), ('users/{}/update', 'POST', 200, 0), ('users/{}/update', 'POST', 404, 0)]
+    assert records[0].request_bytes == len(b'{"metadata": [{"type": "LIVEBOARD"}]}')
+    assert all(r.response_bytes == len(b'{"ok": true}') for r in records)
+
+    summary = {row['endpoint']: row for row in histogram.summary()}
+    assert summary['users/{}/update']['count'] == 2
+    assert summary['users/{}/update']['statuses'] == {'200': 1, '404': 1}
+    assert summary['metadata/search']['retries'] == 1
+
+
+def test_failed_call_is_recorded(fake_server):
+    ts = TSRestApiV2(server_url='https://ts.example.com')
+
+    def handler(request):
+        raise requests.exceptions.ConnectionError('refused')
+
+    fake_server(ts.requests_session, handler)
+    records = []
+    ts.add_instrumentation_hook(records.append)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        ts.get_request('system')
+    assert (records[0].status, records[0].error, records[0].response_bytes) == (None, 'ConnectionError', 0)
+
+
+def test_histogram_quantiles_and_prometheus_file(tmp_path):
+    histogram = LatencyHistogram(buckets=(0.1, 1.0, 10.0))
+    for latency in [0.05] * 90 + [0.5] * 9 + [5.0]:
+        histogram(RequestRecord('metadata/search', 'POST', 200, latency, request_bytes=10, response_bytes=100))
+    row = histogram.summary()[0]
+    assert (row['p50_seconds'], row['p95_seconds'], row['p99_seconds'], row['max_seconds']) == (0.1, 1.0, 1.0, 5.0)
+    assert row['response_bytes'] == 10000
+
+    file_path = tmp_path / 'thoughtspot_api.prom'
+    PrometheusFileExporter(histogram, str(file_path)).write()
+    lines = file_path.read_text().splitlines()
+    labels = '{endpoint="metadata/search",method="POST"'
+    assert 'thoughtspot_api_request_duration_seconds_bucket' + labels + ',le="0.1"} 90' in lines
+    assert 'thoughtspot_api_request_duration_seconds_bucket' + labels + ',le="1.0"} 99' in lines
+    assert 'thoughtspot_api_request_duration_seconds_bucket' + labels + ',le="+Inf"} 100' in lines
+    assert 'thoughtspot_api_request_duration_seconds_count' + labels + '} 100' in lines
+    assert 'thoughtspot_api_responses_total' + labels + ',status="200"} 100' in lines
+    assert '# TYPE thoughtspot_api_retries_total counter' in lines
@@ -0,0 +1,61 @@
+import json
+
+from thoughtspot_rest_api_v1 import TSRestApiV2
+from thoughtspot_rest_api_v1.tsrestapiv1 import TSRestApiV1
+from thoughtspot_rest_api_v1.metadata_headers import client_types, iter_guids, iter_headers
+
+# metadata/search results, most recently modified first
+SEARCH_RESULTS = [
+    {'metadata_id': 'lb{}'.format(i), 'metadata_type': 'LIVEBOARD', 'metadata_name': 'Board {}'.format(i),
+     'metadata_header': {'modified': 1000 - i * 10, 'author': 'u1', 'authorName': 'jane', 'owner': 'u2',
+                         'tags': [{'name': 'finance'}]}}
+    for i in range(10)]
+
+
+def search_server(fake_server):
+    ts = TSRestApiV2(server_url='https://ts.example.com')
+    requests_seen = []
+
+    def handler(request):
+        body = json.loads(request.body)
+        requests_seen.append(body)
+        results = SEARCH_RESULTS
+        if not body.get('include_headers'):
+            results = [{k: v for k, v in r.items() if k != 'metadata_header'} for r in results]
+        offset, size = body['record_offset'], body['record_size']
+        return 200, results[offset:offset + size]
+
+    fake_server(ts.requests_session, handler)
+    return ts, requests_seen
+
+
+def test_v2_headers_are_normalized(fake_server):
+    ts, requests_seen = search_server(fake_server)
+    headers = list(iter_headers(ts, 'LIVEBOARD', page_size=4))
+    assert len(headers) == 10
+    assert headers[0] == {'guid': 'lb0', 'type': 'LIVEBOARD', 'name': 'Board 0', 'obj_id': None, 'modified': 1000,
+                          'author': 'u1', 'author_name': 'jane', 'owner': 'u2', 'tags': ['finance']}
+    assert all(r['include_headers'] is True for r in requests_seen)
+    assert requests_seen[0]['sort_options'] == {'field_name': 'MODIFIED', 'order': 'DESC'}
+
+
+def test_modified_since_stops_paging(fake_server):
+    ts, requests_seen = search_server(fake_server)
+    # Modified times are 1000, 990, ... 910; the first page of 4 goes down to 970
+    headers = list(iter_headers(ts, 'LIVEBOARD', modified_since=980, page_size=4, prefetch=0))
+    assert [h['modified'] for h in headers] == [1000, 990, 980]
+    assert len(requests_seen) == 1
+
+
+def test_guids_without_headers(fake_server):
+    ts, requests_seen = search_server(fake_server)
+    assert list(iter_guids(ts, 'LIVEBOARD')) == ['lb{}'.format(i) for i in range(10)]
+    assert requests_seen[0]['include_headers'] is False
+
+
+def test_client_types():
+    v1 = TSRestApiV1(server_url='https://ts.example.com')
+    v2 = TSRestApiV2(server_url='https://ts.example.com')
+    assert client_types(v1, ['LIVEBOARD', 'ANSWER', 'LOGICAL_TABLE', 'PINBOARD_ANSWER_BOOK']) == \
+        ['PINBOARD_ANSWER_BOOK', 'QUESTION_ANSWER_BOOK', 'LOGICAL_TABLE']
+    assert client_types(v2, ['LIVEBOARD', 'LOGICAL_TABLE']) == ['LIVEBOARD', 'LOGICAL_TABLE']
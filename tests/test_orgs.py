@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+
+import pytest
+
+from thoughtspot_rest_api_v1 import TSRestApiV2
+from thoughtspot_rest_api_v1.orgs import OrgClientPool, OrgFanOutExecutor
+
+SERVER = 'https://ts.example.com'
+
+
+class OrgServer:
+    """
+    auth/token/full issues a token for the org_id requested, other endpoints answer with the org of the token
+    they were sent with. Orgs in failing_orgs reject the token request
+    """
+    def __init__(self, failing_orgs=()):
+        self.failing_orgs = set(failing_orgs)
+        self.token_requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        if request.url.endswith('auth/token/full'):
+            body = json.loads(request.body)
+            with self._lock:
+                self.token_requests.append(body)
+            if body['org_id'] in self.failing_orgs:
+                return 403, {'error': 'no access to org {}'.format(body['org_id'])}
+            now_ms = int(time.time() * 1000)
+            return 200, {'token': 'token-org{}'.format(body['org_id']), 'creation_time_in_millis': now_ms,
+                         'expiration_time_in_millis': now_ms + body['validity_time_in_sec'] * 1000}
+        authorization = request.headers.get('Authorization')
+        if authorization is None:
+            return 401, b''
+        return 200, {'org': authorization[len('Bearer token-org'):]}
+
+
+def test_client_per_org_with_its_own_token(fake_server):
+    server = OrgServer()
+    ts = TSRestApiV2(server_url=SERVER)
+    adapter = fake_server(ts.requests_session, server)
+    orgs = OrgClientPool(ts, username='admin', secret_key='secret', validity_time_in_sec=600)
+
+    # No request until a client is used
+    assert orgs.client(1) is orgs[1]
+    assert server.token_requests == []
+
+    assert orgs[1].get_request('auth/session/user') == {'org': '1'}
+    assert orgs[2].get_request('auth/session/user') == {'org': '2'}
+    assert orgs[1].get_request('auth/session/user') == {'org': '1'}
+    assert [r['org_id'] for r in server.token_requests] == [1, 2]
+    assert server.token_requests[0]['secret_key'] == 'secret'
+    assert server.token_requests[0]['validity_time_in_sec'] == 600
+    assert sorted(orgs.org_ids) == [1, 2]
+
+    # Every request went over the connection pools of the base client, which got no token itself
+    assert orgs[1].requests_session.adapters['https://'] is adapter
+    assert len(adapter.calls) == 5
+    assert 'Authorization' not in ts.requests_session.headers
+    assert ts.token_manager is None
+
+
+def test_login_reports_errors_per_org(fake_server):
+    server = OrgServer(failing_orgs=[3])
+    ts = TSRestApiV2(server_url=SERVER)
+    fake_server(ts.requests_session, server)
+    orgs = OrgClientPool(ts, username='admin', password='password')
+
+    errors = orgs.login([1, 2, 3], workers=3)
+    assert errors[1] is None and errors[2] is None
+    assert errors[3].response.status_code == 403
+    assert sorted(r['org_id'] for r in server.token_requests) == [1, 2, 3]
+    # The tokens fetched by login() are used without another token request
+    assert orgs[2].get_request('auth/session/user') == {'org': '2'}
+    assert len(server.token_requests) == 3
+
+
+def test_remove_drops_the_client(fake_server):
+    ts = TSRestApiV2(server_url=SERVER)
+    fake_server(ts.requests_session, OrgServer())
+    orgs = OrgClientPool(ts, username='admin', secret_key='secret')
+    client = orgs[1]
+    orgs.remove(1)
+    assert orgs.org_ids == []
+    assert orgs[1] is not client
+
+
+def test_password_or_secret_key_required():
+    with pytest.raises(ValueError):
+        OrgClientPool(TSRestApiV2(server_url=SERVER), username='admin')
+
+
+def test_fan_out_keeps_order_and_records_errors(fake_server):
+    server = OrgServer(failing_orgs=[2])
+    ts = TSRestApiV2(server_url=SERVER)
+    fake_server(ts.requests_session, server)
+    running = []
+    most_running = []
+    lock = threading.Lock()
+
+    def func(org_ts):
+        with lock:
+            running.append(1)
+            most_running.append(len(running))
+        try:
+            time.sleep(0.02)
+            return org_ts.get_request('auth/session/user')['org']
+        finally:
+            with lock:
+                running.pop()
+
+    progress = []
+    executor = OrgFanOutExecutor(OrgClientPool(ts, username='admin', secret_key='secret'), workers=2)
+    rows = executor.run(func, orgs=[{'id': 1, 'name': 'Sales'}, 2, 3, 4],
+                        progress=lambda done, total, row: progress.append((done, total, row['org_id'])))
+
+    assert [r['org_id'] for r in rows] == [1, 2, 3, 4]
+    assert rows[0]['org_name'] == 'Sales' and rows[1]['org_name'] is None
+    assert [r['status'] for r in rows] == ['OK', 'ERROR', 'OK', 'OK']
+    assert [r['result'] for r in rows] == ['1', None, '3', '4']
+    assert rows[1]['error'].startswith('HTTP 403: ')
+    assert rows[1]['exception'].response.status_code == 403
+    assert 'exception' not in rows[0]
+    assert all(r['duration_seconds'] > 0 for r in rows)
+    assert max(most_running) <= 2
+    assert [p[0] for p in progress] == [1, 2, 3, 4]
+    assert sorted(p[2] for p in progress) == [1, 2, 3, 4]
+    assert all(p[1] == 4 for p in progress)
+    assert OrgFanOutExecutor.summary(rows) == {'orgs': 4, 'succeeded': 3, 'failed': 1, 'failed_org_ids': [2]}
+
+
+def test_fan_out_defaults_to_all_orgs(fake_server):
+    server = OrgServer()
+
+    def handler(request):
+        if request.url.endswith('orgs/search'):
+            return 200, [{'id': 5, 'name': 'East'}, {'id': 6, 'name': 'West'}]
+        return server(request)
+
+    ts = TSRestApiV2(server_url=SERVER)
+    fake_server(ts.requests_session, handler)
+    executor = OrgFanOutExecutor(OrgClientPool(ts, username='admin', secret_key='secret'))
+    rows = executor.run(lambda org_ts: org_ts.get_request('auth/session/user')['org'])
+    assert [(r['org_id'], r['org_name'], r['result']) for r in rows] == [(5, 'East', '5'), (6, 'West', '6')]
+    assert executor.run(lambda org_ts: None, orgs=[]) == []
@@ -0,0 +1,143 @@
+from urllib.parse import urlparse, parse_qs
+import json
+import threading
+
+import pytest
+
+from thoughtspot_rest_api_v1 import TSRestApiV2
+from thoughtspot_rest_api_v1.pagination import iter_offset_pages
+
+RECORDS = [{'metadata_id': 'g{}'.format(i)} for i in range(250)]
+
+
+def search_server(fake_server, ignore_paging=False):
+    ts = TSRestApiV2(server_url='https://ts.example.com')
+    requests_seen = []
+
+    def handler(request):
+        body = json.loads(request.body)
+        requests_seen.append(body)
+        if ignore_paging:
+            return 200, RECORDS
+        offset, size = body['record_offset'], body['record_size']
+        return 200, RECORDS[offset:offset + size]
+
+    fake_server(ts.requests_session, handler)
+    return ts, requests_seen
+
+
+def test_search_iter_pages_through_everything(fake_server):
+    ts, requests_seen = search_server(fake_server)
+    records = list(ts.metadata_search_iter(request={'metadata': [{'type': 'LIVEBOARD'}], 'record_size': 5},
+                                           page_size=100))
+    assert records == RECORDS
+    assert [(r['record_offset'], r['record_size']) for r in requests_seen] == [(0, 100), (100, 100), (200, 100)]
+    assert all(r['metadata'] == [{'type': 'LIVEBOARD'}] for r in requests_seen)
+
+
+def test_search_iter_starts_at_record_offset(fake_server):
+    ts, requests_seen = search_server(fake_server)
+    assert list(ts.users_search_iter(request={'record_offset': 240}, page_size=100)) == RECORDS[240:]
+    assert len(requests_seen) == 1
+
+
+def test_endpoint_ignoring_paging_is_read_once(fake_server):
+    ts, requests_seen = search_server(fake_server, ignore_paging=True)
+    assert list(ts.tags_search_iter(page_size=100)) == RECORDS
+    assert len(requests_seen) == 1
+
+
+def test_read_ahead_is_bounded():
+    fetched = []
+    lock = threading.Lock()
+    fetched_enough = threading.Event()
+
+    def fetch_page(offset, size):
+        with lock:
+            fetched.append(offset)
+            if len(fetched) >= 3:
+                fetched_enough.set()
+        return list(range(offset, min(offset + size, 1000)))
+
+    pages = iter_offset_pages(fetch_page, page_size=10, prefetch=2)
+    assert next(pages) == list(range(10))
+    # The first page, plus 2 read ahead while it is processed
+    fetched_enough.wait(5)
+    assert sorted(fetched) == [0, 10, 20]
+    assert sum(len(page) for page in pages) == 990
+    pages.close()
+
+    fetched.clear()
+    pages = iter_offset_pages(fetch_page, page_size=10, prefetch=0)
+    next(pages)
+    assert fetched == [0]
+
+
+def test_repeated_page_ends_iteration():
+    pages = list(iter_offset_pages(lambda offset, size: [1, 2], page_size=2, prefetch=0))
+    assert pages == [[1, 2]]
+    with pytest.raises(ValueError):
+        list(iter_offset_pages(lambda offset, size: [], page_size=0))
+
+
+def test_async_search_iter(run_with_server):
+    web = pytest.importorskip('aiohttp.web')
+    from thoughtspot_rest_api_v1 import TSRestApiV2Async
+
+    async def handler(request):
+        body = await request.json()
+        offset, size = body['record_offset'], body['record_size']
+        return web.json_response(RECORDS[offset:offset + size])
+
+    async def scenario(server_url):
+        async with TSRestApiV2Async(server_url) as ts:
+            return [r async for r in ts.metadata_search_iter(request={}, page_size=30, prefetch=2)]
+
+    assert run_with_server(handler, scenario) == RECORDS
+
+
+def v1_list_server(fake_server, endpoint_answers):
+    from thoughtspot_rest_api_v1 import TSRestApiV1
+    ts = TSRestApiV1(server_url='https://ts.example.com')
+    requests_seen = []
+
+    def handler(request):
+        url = urlparse(request.url)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        requests_seen.append((url.path.rsplit('tspublic/v1/', 1)[1], params))
+        return 200, endpoint_answers(int(params['offset']), int(params['batchsize']))
+
+    fake_server(ts.requests_session, handler)
+    return ts, requests_seen
+
+
+def test_v1_metadata_list_iter_stops_at_last_batch(fake_server):
+    def answer(offset, size):
+        headers = RECORDS[offset:offset + size]
+        return {'headers': headers, 'isLastBatch': offset + size >= len(RECORDS)}
+
+    ts, requests_seen = v1_list_server(fake_server, answer)
+    # 250 records in batches of 125: the second batch is full but flagged as the last
+    assert list(ts.metadata_list_iter(object_type='PINBOARD_ANSWER_BOOK', batchsize=125)) == RECORDS
+    assert [(p, r['offset'], r['batchsize']) for p, r in requests_seen] == [('metadata/list', '0', '125'),
+                                                                            ('metadata/list', '125', '125')]
+    assert requests_seen[0][1]['type'] == 'PINBOARD_ANSWER_BOOK'
+
+
+def test_v1_listobjectheaders_iter_stops_on_short_batch(fake_server):
+    ts, requests_seen = v1_list_server(fake_server, lambda offset, size: RECORDS[offset:offset + size])
+    assert list(ts.metadata_listobjectheaders_iter(object_type='USER', batchsize=100, offset=70)) == RECORDS[70:]
+    # A bare list: the short batch of 80 is the last
+    assert [r['offset'] for p, r in requests_seen] == ['70', '170']
+
+
+def test_v1_session_orgs_get_iter(fake_server):
+    orgs = [{'orgId': i} for i in range(7)]
+
+    def answer(offset, size):
+        return {'orgs': orgs[offset:offset + size]}
+
+    ts, requests_seen = v1_list_server(fake_server, answer)
+    assert list(ts.session_orgs_get_iter(batchsize=7)) == orgs
+    # A full batch without isLastBatch: the empty one after it ends the loop
+    assert [r['offset'] for p, r in requests_seen] == ['0', '7']
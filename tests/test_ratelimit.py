@@ -0,0 +1,32 @@
+from thoughtspot_rest_api_v1.ratelimit import RateLimiter, TokenBucket, endpoint_from_url
+
+
+def test_endpoint_from_url():
+    assert endpoint_from_url('https://ts.example.com/api/rest/2.0/metadata/tml/import') == 'metadata/tml/import'
+    assert endpoint_from_url('https://ts.example.com/callosum/v1/tspublic/v1/metadata/tml/import') == \
+        'metadata/tml/import'
+
+
+def test_token_bucket_reservations_queue_up():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # The balance goes negative: each further caller waits one more token's worth
+    assert 0.09 <= bucket.reserve() <= 0.1
+    assert 0.19 <= bucket.reserve() <= 0.2
+
+
+def test_family_budgets():
+    limiter = RateLimiter(families={'metadata/tml/*': (1, 1)})
+    tml = 'https://ts.example.com/api/rest/2.0/metadata/tml/export'
+    assert limiter.family_for_endpoint('metadata/tml/export') == 'metadata/tml/*'
+    assert limiter.reserve(tml) == 0
+    assert limiter.reserve(tml) > 0.9
+    # Other endpoints are not limited
+    assert limiter.reserve('https://ts.example.com/api/rest/2.0/users/search') == 0
+    assert limiter.stats()['delayed_calls'] == 1
+
+
+def test_for_server_shares_one_limiter():
+    a = RateLimiter.for_server('https://shared.example.com/', rate=5)
+    assert RateLimiter.for_server('https://SHARED.example.com') is a
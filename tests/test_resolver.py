@@ -0,0 +1,54 @@
+import pytest
+
+from thoughtspot_rest_api_v1.tsrestapiv1 import TSRestApiV1
+from thoughtspot_rest_api_v1.resolver import GuidResolver
+
+V1_HEADERS = {
+    'LOGICAL_TABLE': [{'id': 't1', 'name': 'Sales', 'objId': 'conn.db.sales', 'modified': 20}],
+    'PINBOARD_ANSWER_BOOK': [{'id': 'lb1', 'name': 'Sales', 'modified': 30}],
+    'QUESTION_ANSWER_BOOK': [{'id': 'a1', 'name': 'Top customers', 'modified': 10}],
+    'DATA_SOURCE': [{'id': 'c1', 'name': 'Snowflake', 'modified': 5}],
+}
+
+
+class FakeV1(TSRestApiV1):
+    def __init__(self):
+        super().__init__(server_url='https://ts.example.com')
+        self.requested_types = []
+
+    def metadata_listobjectheaders_iter(self, object_type, **kwargs):
+        if object_type not in V1_HEADERS:
+            raise ValueError("Unknown type {}".format(object_type))
+        self.requested_types.append(object_type)
+        headers = sorted(V1_HEADERS[object_type], key=lambda h: h['modified'], reverse=True)
+        return (header for header in headers)
+
+
+def test_v1_client_uses_v1_type_names():
+    ts = FakeV1()
+    resolver = GuidResolver(ts)
+    assert resolver.refresh() == {'LOGICAL_TABLE': 1, 'PINBOARD_ANSWER_BOOK': 1, 'QUESTION_ANSWER_BOOK': 1,
+                                  'DATA_SOURCE': 1}
+    assert sorted(ts.requested_types) == sorted(V1_HEADERS)
+    assert resolver.guids('Sales') == ['lb1', 't1']
+    # V2 and V1 type names both filter the lookups
+    assert resolver.guid('Sales', metadata_type='LIVEBOARD') == 'lb1'
+    assert resolver.guid('Sales', metadata_type='PINBOARD_ANSWER_BOOK') == 'lb1'
+    assert resolver.guid_for_obj_id('conn.db.sales') == 't1'
+    assert resolver.guid('snowflake', case_sensitive=False) == 'c1'
+    with pytest.raises(LookupError):
+        resolver.guid('Sales')
+
+
+def test_v1_incremental_refresh():
+    ts = FakeV1()
+    resolver = GuidResolver(ts, types=['LOGICAL_TABLE'])
+    resolver.refresh()
+    assert resolver.watermarks == {'LOGICAL_TABLE': 20}
+    V1_HEADERS['LOGICAL_TABLE'].append({'id': 't2', 'name': 'Returns', 'modified': 40})
+    try:
+        assert resolver.refresh() == {'LOGICAL_TABLE': 2}
+        assert resolver.guid('Returns') == 't2'
+        assert resolver.watermarks == {'LOGICAL_TABLE': 40}
+    finally:
+        V1_HEADERS['LOGICAL_TABLE'].pop()
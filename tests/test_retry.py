@@ -0,0 +1,37 @@
+import email.utils
+import time
+
+from thoughtspot_rest_api_v1.retry import RetryPolicy
+
+SEARCH = 'https://ts.example.com/api/rest/2.0/metadata/search'
+IMPORT = 'https://ts.example.com/api/rest/2.0/metadata/tml/import'
+
+
+def test_retries_idempotent_calls_only():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry_response('POST', SEARCH, 503, 0)
+    assert not policy.should_retry_response('POST', IMPORT, 503, 0)
+    # 429: the server did not process the request
+    assert policy.should_retry_response('POST', IMPORT, 429, 0)
+    assert not policy.should_retry_response('POST', SEARCH, 500, 0)
+    assert not policy.should_retry_response('POST', SEARCH, 503, 2)
+    assert policy.should_retry_error('POST', IMPORT, 0, connect_failure=True)
+    assert not policy.should_retry_error('POST', IMPORT, 0)
+
+
+def test_retry_budget():
+    policy = RetryPolicy(retry_budget=2)
+    assert [policy.should_retry_response('GET', SEARCH, 503, 0) for _ in range(3)] == [True, True, False]
+    policy.reset_budget()
+    assert policy.should_retry_response('GET', SEARCH, 503, 0)
+
+
+def test_backoff_and_retry_after():
+    policy = RetryPolicy(backoff_factor=1, backoff_max=5, jitter=False)
+    assert [policy.backoff(a) for a in range(4)] == [1, 2, 4, 5]
+    assert policy.delay_for_response({'Retry-After': '3'}, 0) == 3
+    assert policy.delay_for_response({}, 1) == 2
+    in_10s = email.utils.formatdate(time.time() + 10, usegmt=True)
+    assert 8 <= policy.parse_retry_after(in_10s) <= 10
+    assert policy.parse_retry_after('not a date') is None
+    assert all(0 <= RetryPolicy(backoff_factor=1).backoff(2) <= 4 for _ in range(20))
@@ -0,0 +1,83 @@
+from thoughtspot_rest_api_v1.snapshot import MetadataSnapshot
+
+
+class FakeV2:
+    """
+    Answers metadata_search_iter() like TSRestApiV2 from a dict of guid: (name, modified)
+    """
+    def __init__(self, objects):
+        self.objects = objects
+
+    def metadata_search_iter(self, request, page_size=500, prefetch=1):
+        items = sorted(self.objects.items(), key=lambda kv: kv[1][1], reverse=True)
+        return (self._item(guid, name, modified) for guid, (name, modified) in items)
+
+    @staticmethod
+    def _item(guid, name, modified):
+        return {'metadata_id': guid, 'metadata_name': name, 'metadata_type': 'LIVEBOARD',
+                'metadata_header': {'id': guid, 'name': name, 'modified': modified, 'author': 'u1',
+                                    'authorName': 'alice', 'owner': guid, 'tags': [{'name': 'Finance'}]}}
+
+
+def make_snapshot(objects):
+    ts = FakeV2(objects)
+    return ts, MetadataSnapshot(ts, types=['LIVEBOARD'])
+
+
+def test_first_sync_adds_everything():
+    ts, snapshot = make_snapshot({'g{}'.format(i): ('LB {}'.format(i), 1000 + i) for i in range(5)})
+    result = snapshot.sync()
+    assert (result['added'], result['updated'], result['deleted']) == (5, 0, 0)
+    assert len(snapshot.find(metadata_type='LIVEBOARD', tag='Finance')) == 5
+    assert snapshot.watermark('LIVEBOARD') == 1004
+
+
+def test_full_sync_keeps_unchanged_objects():
+    ts, snapshot = make_snapshot({'g{}'.format(i): ('LB {}'.format(i), 1000 + i) for i in range(5)})
+    snapshot.sync()
+    result = snapshot.sync(full=True)
+    assert (result['added'], result['updated'], result['deleted']) == (0, 0, 0)
+    assert len(snapshot.find()) == 5
+    assert snapshot.watermark('LIVEBOARD') == 1004
+
+
+def test_full_sync_detects_deletions_and_changes():
+    ts, snapshot = make_snapshot({'g{}'.format(i): ('LB {}'.format(i), 1000 + i) for i in range(5)})
+    snapshot.sync()
+    del ts.objects['g0']
+    ts.objects['g1'] = ('Renamed', 2000)
+    result = snapshot.sync(full=True)
+    assert (result['added'], result['updated'], result['deleted']) == (0, 1, 1)
+    assert snapshot.get('g1')['name'] == 'Renamed'
+    assert len(snapshot.find()) == 4
+
+
+def test_incremental_sync():
+    ts, snapshot = make_snapshot({'g{}'.format(i): ('LB {}'.format(i), 1000 + i) for i in range(5)})
+    snapshot.sync()
+    ts.objects['g5'] = ('New', 3000)
+    ts.objects['g2'] = ('Changed', 3001)
+    del ts.objects['g0']
+    result = snapshot.sync()
+    assert result['types'][0]['full'] is False
+    assert (result['added'], result['updated'], result['deleted']) == (1, 1, 1)
+    assert snapshot.watermark('LIVEBOARD') == 3001
+    # Nothing changed since: the object at the watermark is not counted again
+    result = snapshot.sync()
+    assert (result['added'], result['updated'], result['deleted']) == (0, 0, 0)
+    assert len(snapshot.find()) == 5
+
+
+def test_v1_client_uses_v1_type_names():
+    from thoughtspot_rest_api_v1.tsrestapiv1 import TSRestApiV1
+
+    class FakeV1(TSRestApiV1):
+        def metadata_listobjectheaders_iter(self, object_type, **kwargs):
+            assert object_type == 'PINBOARD_ANSWER_BOOK'
+            return (h for h in [{'id': 'lb1', 'name': 'Sales', 'modified': 10, 'authorName': 'alice'}])
+
+    snapshot = MetadataSnapshot(FakeV1(server_url='https://ts.example.com'), types=['LIVEBOARD'])
+    assert snapshot.types == ['PINBOARD_ANSWER_BOOK']
+    assert snapshot.sync()['added'] == 1
+    assert [o['guid'] for o in snapshot.find(metadata_type='LIVEBOARD', author='alice')] == ['lb1']
+    assert snapshot.watermark('LIVEBOARD') == 10
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from thoughtspot_rest_api_v1.streaming import JsonRowsParser
+
+DOCUMENT = json.dumps({
+    'contents': [{
+        'column_names': ['a', 'b', 'c'],
+        'data_rows': [[1, -1.25, 'x'], [1e-05, 2.5e+20, None], [True, False, '[,]'], [-0.5, 100, 'é']],
+        'z': -1.25,
+        'row_count': 4
+    }]
+})
+
+
+def parse(chunks, batch_size=2):
+    parser = JsonRowsParser(batch_size=batch_size)
+    batches = []
+    for chunk in chunks:
+        batches.extend(parser.feed(chunk))
+    batches.extend(parser.close())
+    return batches
+
+
+def rows_of(batches):
+    return [row for batch in batches for row in batch['rows']]
+
+
+def test_whole_document():
+    batches = parse([DOCUMENT])
+    assert rows_of(batches) == json.loads(DOCUMENT)['contents'][0]['data_rows']
+    assert batches[0]['path'] == ('contents', 0)
+    assert batches[0]['fields'] == {'column_names': ['a', 'b', 'c']}
+    assert [len(b['rows']) for b in batches] == [2, 2]
+
+
+@pytest.mark.parametrize('split', range(1, len(DOCUMENT)))
+def test_every_chunk_boundary(split):
+    batches = parse([DOCUMENT[:split], DOCUMENT[split:]])
+    assert rows_of(batches) == json.loads(DOCUMENT)['contents'][0]['data_rows']
+
+
+def test_one_character_at_a_time():
+    assert rows_of(parse(DOCUMENT)) == json.loads(DOCUMENT)['contents'][0]['data_rows']
+
+
+@pytest.mark.parametrize('chunks', [
+    ['{"data_rows": [1.', '5, 2]}'],
+    ['{"data_rows": [1', 'e3, 2]}'],
+    ['{"data_rows": [1.5e', '-3, 2]}'],
+    ['{"data_rows": [-', '1, 2]}'],
+    ['{"data_rows": [2, 1', '0]}'],
+])
+def test_number_split_across_chunks(chunks):
+    assert rows_of(parse(chunks, batch_size=10)) == json.loads(''.join(chunks))['data_rows']
+
+
+def test_scalar_outside_rows_split_across_chunks():
+    assert rows_of(parse(['{"z": -1.', '25, "data_rows": [[1]]}'])) == [[1]]
+
+
+def test_incomplete_document():
+    parser = JsonRowsParser()
+    parser.feed('{"data_rows": [[1], [2')
+    with pytest.raises(ValueError):
+        parser.close()
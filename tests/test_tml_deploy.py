@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from thoughtspot_rest_api_v1.tsrestapiv1 import TSRestApiV1
+from thoughtspot_rest_api_v1.tsrestapiv2 import TSRestApiV2
+from thoughtspot_rest_api_v1.tml_deploy import IncrementalTmlDeployer, TmlWaveImporter, set_tml_guid, parse_tml
+
+
+class FakeServer(TSRestApiV2):
+    """
+    metadata_tml_import() creates an object for a TML without a known guid, and updates the object otherwise
+    """
+    def __init__(self):
+        super().__init__(server_url='https://ts.example.com')
+        self.objects = {}
+
+    def metadata_tml_import(self, metadata_tmls, import_policy='PARTIAL', create_new=False, **kwargs):
+        response = []
+        for tml in metadata_tmls:
+            doc = parse_tml(tml)
+            guid = doc.get('guid')
+            if guid not in self.objects:
+                guid = 'guid-{}'.format(len(self.objects))
+            self.objects[guid] = doc
+            response.append({'response': {'status': {'status_code': 'OK'},
+                                          'header': {'id_guid': guid, 'name': doc['table']['name']}}})
+        return response
+
+
+def table(name, description):
+    return json.dumps({'table': {'name': name, 'description': description}})
+
+
+def test_redeploy_updates_instead_of_creating(tmp_path):
+    ts = FakeServer()
+    deployer = IncrementalTmlDeployer(ts, state_path=str(tmp_path / 'state.json'))
+    keys = ['sales.table.tml', 'returns.table.tml']
+
+    first = deployer.deploy([table('Sales', 'v1'), table('Returns', 'v1')], keys=keys)
+    assert [r['guid'] for r in first['results']] == ['guid-0', 'guid-1']
+
+    second = deployer.deploy([table('Sales', 'v2'), table('Returns', 'v1')], keys=keys)
+    assert second['changed'] == [0]
+    assert [r['guid'] for r in second['results']] == ['guid-0']
+    assert len(ts.objects) == 2
+    assert ts.objects['guid-0']['table']['description'] == 'v2'
+
+    deployer.deploy([table('Sales', 'v3'), table('Returns', 'v2')], keys=keys, force=True)
+    assert len(ts.objects) == 2
+
+
+def test_set_tml_guid():
+    doc = json.loads(set_tml_guid(table('Sales', 'x'), 'abc'))
+    assert doc == {'guid': 'abc', 'table': {'name': 'Sales', 'description': 'x'}}
+    assert set_tml_guid('table:\n  name: Sales\n', 'abc') == 'guid: abc\ntable:\n  name: Sales\n'
+    assert set_tml_guid('guid: old\ntable:\n  guid: nested\n', 'abc') == 'guid: abc\ntable:\n  guid: nested\n'
+
+
+def test_v2_client_required(tmp_path):
+    ts = TSRestApiV1(server_url='https://ts.example.com')
+    with pytest.raises(TypeError):
+        IncrementalTmlDeployer(ts, state_path=str(tmp_path / 'state.json'))
+    with pytest.raises(TypeError):
+        TmlWaveImporter(ts)
@@ -0,0 +1,40 @@
+import hashlib
+import json
+
+import pytest
+
+from thoughtspot_rest_api_v1 import TSRestApiV1, TSRestApiV2, TSRestApiV2Async, TmlExporter
+
+
+def export_handler(broken_guids):
+    # metadata/tml/export fails as a whole when any object in it cannot be exported
+    def handler(request):
+        guids = [m['identifier'] for m in json.loads(request.body)['metadata']]
+        if any(g in broken_guids for g in guids):
+            return 400, b'cannot export'
+        return 200, [{'info': {'id': g, 'name': 'Table {}'.format(g), 'type': 'table',
+                               'status': {'status_code': 'OK'}},
+                      'edoc': 'table:\n  name: {}\n'.format(g)} for g in guids]
+    return handler
+
+
+def test_export_writes_files_and_manifest(tmp_path, fake_server):
+    ts = TSRestApiV2(server_url='https://ts.example.com')
+    adapter = fake_server(ts.requests_session, export_handler({'g3'}))
+    exporter = TmlExporter(ts, output_dir=str(tmp_path), workers=2, objects_per_request=2)
+    summary = exporter.export(guids=['g1', 'g2', 'g3', 'g4', 'g1'])
+
+    assert (summary['exported'], summary['errors']) == (3, 1)
+    manifest = {row['guid']: row for row in json.loads((tmp_path / 'manifest.json').read_text())}
+    assert manifest['g3']['status'] == 'ERROR' and manifest['g3']['error'].startswith('HTTP 400')
+    content = (tmp_path / 'g1.table.tml').read_bytes()
+    assert content == b'table:\n  name: g1\n'
+    assert manifest['g1']['sha256'] == hashlib.sha256(content).hexdigest()
+    # 2 chunks, then the failing chunk again one object at a time
+    assert len(adapter.calls) == 4
+
+
+@pytest.mark.parametrize('client_class', [TSRestApiV1, TSRestApiV2Async])
+def test_v2_client_required(tmp_path, client_class):
+    with pytest.raises(TypeError):
+        TmlExporter(client_class(server_url='https://ts.example.com'), output_dir=str(tmp_path))
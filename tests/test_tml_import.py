@@ -0,0 +1,84 @@
+import pytest
+
+from thoughtspot_rest_api_v1.tsrestapiv1 import TSRestApiV1
+from thoughtspot_rest_api_v1.tsrestapiv2 import TSRestApiV2
+from thoughtspot_rest_api_v1.tml_import import TmlImportJobManager
+
+
+class FakeServer(TSRestApiV2):
+    """
+    Answers the async TML import endpoints: every task completes at the first status request
+    """
+    def __init__(self):
+        super().__init__(server_url='https://ts.example.com')
+        self.tasks = {}
+
+    def post_request(self, endpoint, request=None):
+        if endpoint == 'metadata/tml/async/import':
+            task_id = 'task-{}'.format(len(self.tasks))
+            self.tasks[task_id] = list(request['metadata_tmls'])
+            return {'task_id': task_id}
+        if endpoint == 'metadata/tml/async/status':
+            return {'status_list': [{
+                'task_id': task_id,
+                'task_status': 'COMPLETED',
+                'import_response': {'object': [
+                    {'response': {'status': {'status_code': 'OK'}, 'header': {'id_guid': tml, 'name': tml}}}
+                    for tml in self.tasks[task_id]
+                ]}
+            } for task_id in request['task_ids']]}
+        raise AssertionError(endpoint)
+
+
+def run_import(ts, tmls, tmls_per_task):
+    manager = TmlImportJobManager(ts, tmls_per_task=tmls_per_task, max_tasks_in_flight=2, poll_interval=0.001)
+    return manager, sorted(manager.run(metadata_tmls=tmls), key=lambda r: r['index'])
+
+
+def test_one_task_per_batch():
+    ts = FakeServer()
+    tmls = ['tml{}'.format(i) for i in range(7)]
+    manager, results = run_import(ts, tmls, tmls_per_task=3)
+    assert len(ts.tasks) == 3
+    assert [r['name'] for r in results] == tmls
+    assert [r['index'] for r in results] == list(range(7))
+
+
+def test_chunked_import_tracks_every_task():
+    ts = FakeServer()
+    ts.tml_import_max_objects = 2
+    tmls = ['tml{}'.format(i) for i in range(7)]
+    manager, results = run_import(ts, tmls, tmls_per_task=5)
+    # Batches of 5 and 2 TMLs, the first sent as 3 chunks of at most 2
+    assert len(ts.tasks) == 4
+    assert set(manager.tasks) == set(ts.tasks)
+    assert all(task['finished'] for task in manager.tasks.values())
+    assert [r['name'] for r in results] == tmls
+    assert [r['task_id'] for r in results] == ['task-0', 'task-0', 'task-1', 'task-1', 'task-2', 'task-3', 'task-3']
+
+
+def test_results_of_an_interrupted_run_are_yielded_again(tmp_path):
+    ts = FakeServer()
+    tmls = ['tml{}'.format(i) for i in range(4)]
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    manager = TmlImportJobManager(ts, tmls_per_task=2, max_tasks_in_flight=1, poll_interval=0.001,
+                                  checkpoint_path=checkpoint_path)
+    handled = []
+    # The consumer fails while handling the second result of the first task
+    with pytest.raises(RuntimeError):
+        for result in manager.run(metadata_tmls=tmls):
+            if result['index'] == 1:
+                raise RuntimeError('consumer failed')
+            handled.append(result['index'])
+
+    manager = TmlImportJobManager(ts, tmls_per_task=2, max_tasks_in_flight=1, poll_interval=0.001,
+                                  checkpoint_path=checkpoint_path)
+    handled.extend(r['index'] for r in manager.run(metadata_tmls=tmls))
+    assert sorted(set(handled)) == [0, 1, 2, 3]
+    # The first task was polled again rather than submitted again
+    assert len(ts.tasks) == 2
+
+
+def test_v2_client_required():
+    with pytest.raises(TypeError):
+        TmlImportJobManager(TSRestApiV1(server_url='https://ts.example.com'))
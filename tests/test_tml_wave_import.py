@@ -0,0 +1,117 @@
+import json
+import threading
+
+from thoughtspot_rest_api_v1.tsrestapiv2 import TSRestApiV2
+from thoughtspot_rest_api_v1.tml_deploy import TmlDependencyGraph, TmlWaveImporter, parse_tml, tml_type
+
+
+class FakeServer(TSRestApiV2):
+    """
+    metadata_tml_import() records the names sent in each call. Objects named in failing always fail, those in
+    fail_once fail on their first import only
+    """
+    def __init__(self, failing=(), fail_once=()):
+        super().__init__(server_url='https://ts.example.com')
+        self.failing = set(failing)
+        self.fail_once = set(fail_once)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def metadata_tml_import(self, metadata_tmls, import_policy='PARTIAL', create_new=False, **kwargs):
+        response = []
+        names = []
+        for tml in metadata_tmls:
+            doc = parse_tml(tml)
+            name = doc[tml_type(doc)]['name']
+            names.append(name)
+            with self._lock:
+                failed = name in self.failing or name in self.fail_once
+                self.fail_once.discard(name)
+            if failed:
+                response.append({'response': {'status': {'status_code': 'ERROR', 'error_message': 'bad'}}})
+            else:
+                response.append({'response': {'status': {'status_code': 'OK'},
+                                              'header': {'id_guid': 'guid-' + name, 'name': name}}})
+        with self._lock:
+            self.calls.append(names)
+        return response
+
+
+def table(name):
+    return json.dumps({'table': {'name': name}})
+
+
+def worksheet(name, *tables):
+    return json.dumps({'worksheet': {'name': name, 'tables': [{'name': t} for t in tables]}})
+
+
+def liveboard(name, *worksheets):
+    return json.dumps({'liveboard': {'name': name, 'visualizations': [
+        {'answer': {'name': 'viz', 'tables': [{'name': w}]}} for w in worksheets]}})
+
+
+# Indexes: 0 liveboard, 1 worksheet, 2 and 3 tables, 4 unrelated table
+TMLS = [liveboard('Board', 'Sales WS'), worksheet('Sales WS', 'Sales', 'Region'), table('Sales'), table('Region'),
+        table('Other')]
+
+
+def test_waves_follow_dependencies():
+    graph = TmlDependencyGraph(TMLS)
+    assert graph.parents[1] == {2, 3}
+    assert graph.parents[0] == {1}
+    assert graph.waves() == [[2, 3, 4], [1], [0]]
+    assert graph.waves({0, 1}) == [[1], [0]]
+    assert graph.dependents({2}) == {0, 1}
+    assert graph.dependents({4}) == set()
+
+
+def test_reference_by_guid_before_name():
+    tmls = [json.dumps({'guid': 'g1', 'table': {'name': 'Sales'}}),
+            json.dumps({'guid': 'g2', 'table': {'name': 'Sales'}}),
+            json.dumps({'worksheet': {'name': 'WS', 'tables': [{'name': 'Sales', 'fqn': 'g2'}]}})]
+    assert TmlDependencyGraph(tmls).parents[2] == {1}
+
+
+def test_cycle_goes_in_final_wave():
+    tmls = [worksheet('A', 'B'), worksheet('B', 'A'), table('T'), worksheet('C', 'T')]
+    assert TmlDependencyGraph(tmls).waves() == [[2], [3], [0, 1]]
+
+
+def test_run_imports_waves_in_order():
+    ts = FakeServer()
+    results = TmlWaveImporter(ts, workers=1).run(TMLS)
+    assert ts.calls == [['Sales', 'Region', 'Other'], ['Sales WS'], ['Board']]
+    assert [r['index'] for r in results] == [0, 1, 2, 3, 4]
+    assert [r['wave'] for r in results] == [2, 1, 0, 0, 0]
+    assert all(r['status_code'] == 'OK' and r['attempts'] == 1 for r in results)
+    assert results[1]['guid'] == 'guid-Sales WS'
+
+
+def test_dependents_of_failed_object_are_skipped():
+    ts = FakeServer(failing=['Sales'])
+    results = TmlWaveImporter(ts, workers=1, max_retries=1).run(TMLS)
+    # Retried once, and nothing built on it is imported
+    assert ts.calls == [['Sales', 'Region', 'Other'], ['Sales']]
+    assert results[2]['status_code'] == 'ERROR'
+    assert results[2]['attempts'] == 2
+    assert [results[i]['status_code'] for i in (0, 1)] == ['SKIPPED', 'SKIPPED']
+    assert results[0]['attempts'] == 0
+    assert [results[i]['status_code'] for i in (3, 4)] == ['OK', 'OK']
+
+
+def test_failed_object_retried_alone():
+    ts = FakeServer(fail_once=['Region'])
+    results = TmlWaveImporter(ts, workers=1, max_retries=1).run(TMLS)
+    assert ts.calls == [['Sales', 'Region', 'Other'], ['Region'], ['Sales WS'], ['Board']]
+    assert results[3]['status_code'] == 'OK'
+    assert results[3]['attempts'] == 2
+    assert results[0]['status_code'] == 'OK'
+
+
+def test_waves_split_by_max_tmls_per_request():
+    ts = FakeServer()
+    tmls = [table('T{}'.format(i)) for i in range(5)]
+    results = TmlWaveImporter(ts, workers=2, max_tmls_per_request=2).run(tmls)
+    assert sorted(len(c) for c in ts.calls) == [1, 2, 2]
+    assert sorted(name for c in ts.calls for name in c) == ['T0', 'T1', 'T2', 'T3', 'T4']
+    assert [r['name'] for r in results] == ['T0', 'T1', 'T2', 'T3', 'T4']
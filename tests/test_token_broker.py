@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from thoughtspot_rest_api_v1.auth import TrustedAuthTokenBroker
+
+
+class FakeTokenServer:
+    """
+    auth_token_full / auth_token_object / auth_token_custom mint a new token on every call, valid for
+    validity_time_in_sec as auth/token/* responses state it
+    """
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+        # When set, minting waits for it, to hold a request in flight
+        self.release = None
+
+    def _mint(self, token_type, **kwargs):
+        if self.release is not None:
+            self.release.wait(5)
+        with self._lock:
+            self.calls.append((token_type, kwargs))
+            token = '{}-{}'.format(token_type, len(self.calls))
+        now_ms = int(time.time() * 1000)
+        return {'token': token, 'creation_time_in_millis': now_ms,
+                'expiration_time_in_millis': now_ms + kwargs['validity_time_in_sec'] * 1000}
+
+    def auth_token_full(self, **kwargs):
+        return self._mint('full', **kwargs)
+
+    def auth_token_object(self, **kwargs):
+        return self._mint('object', **kwargs)
+
+    def auth_token_custom(self, **kwargs):
+        return self._mint('custom', **kwargs)
+
+
+def test_tokens_cached_per_user_org_and_type():
+    ts = FakeTokenServer()
+    broker = TrustedAuthTokenBroker(ts, secret_key='secret', validity_time_in_sec=600)
+    token = broker.full_token(username='jane', org_id=2)
+    assert broker.full_token(username='jane', org_id=2) == token
+    assert broker.full_token(username='jane', org_id=3) != token
+    assert broker.full_token(username='joe', org_id=2) != token
+    assert broker.object_token(username='jane', org_id=2, object_id='lb-1').startswith('object-')
+    assert broker.stats() == {'entries': 4, 'hits': 1, 'misses': 4, 'coalesced': 0}
+    token_type, args = ts.calls[0]
+    assert args == {'username': 'jane', 'org_id': 2, 'secret_key': 'secret', 'validity_time_in_sec': 600}
+    assert ts.calls[3][1]['object_id'] == 'lb-1'
+
+
+def test_abac_parameters_in_any_order_share_a_token():
+    ts = FakeTokenServer()
+    broker = TrustedAuthTokenBroker(ts, secret_key='secret')
+    first = broker.custom_token(username='jane', additional_request_parameters={'region': 'West', 'tier': 'gold'})
+    second = broker.custom_token(username='jane', additional_request_parameters={'tier': 'gold', 'region': 'West'})
+    third = broker.custom_token(username='jane', additional_request_parameters={'tier': 'gold', 'region': 'East'})
+    assert first == second
+    assert third != first
+    assert len(ts.calls) == 2
+    assert ts.calls[0][1]['additional_request_parameters'] == {'region': 'West', 'tier': 'gold'}
+
+
+def test_token_inside_refresh_margin_is_minted_again():
+    ts = FakeTokenServer()
+    # Every token is valid for less than the margin, so none is handed out twice
+    broker = TrustedAuthTokenBroker(ts, secret_key='secret', validity_time_in_sec=20, refresh_margin=30)
+    first = broker.full_token(username='jane')
+    second = broker.full_token(username='jane')
+    assert second != first
+    # With 20 seconds of validity left over a 10 second margin, the last token is handed out again
+    broker.refresh_margin = 10
+    assert broker.full_token(username='jane') == second
+    assert len(ts.calls) == 2
+
+
+def test_least_recently_used_tokens_are_dropped():
+    ts = FakeTokenServer()
+    broker = TrustedAuthTokenBroker(ts, secret_key='secret', max_entries=2)
+    a = broker.full_token(username='a')
+    broker.full_token(username='b')
+    assert broker.full_token(username='a') == a
+    broker.full_token(username='c')
+    assert broker.stats()['entries'] == 2
+    # b was used least recently
+    assert broker.full_token(username='a') == a
+    broker.full_token(username='b')
+    assert len(ts.calls) == 4
+
+
+def test_concurrent_requests_share_one_mint():
+    ts = FakeTokenServer()
+    ts.release = threading.Event()
+    broker = TrustedAuthTokenBroker(ts, secret_key='secret')
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(broker.full_token(username='jane', org_id=2)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 5
+    while broker.stats()['coalesced'] < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    ts.release.set()
+    for t in threads:
+        t.join()
+    assert len(ts.calls) == 1
+    assert tokens == ['full-1'] * 5
+    assert broker.stats() == {'entries': 1, 'hits': 0, 'misses': 1, 'coalesced': 4}
+
+
+def test_mint_error_is_raised_and_not_cached():
+    class FailingServer(FakeTokenServer):
+        def auth_token_full(self, **kwargs):
+            self.calls.append(('full', kwargs))
+            raise RuntimeError('bad secret')
+
+    broker = TrustedAuthTokenBroker(FailingServer(), secret_key='secret')
+    with pytest.raises(RuntimeError):
+        broker.full_token(username='jane')
+    with pytest.raises(RuntimeError):
+        broker.full_token(username='jane')
+    assert len(broker.ts.calls) == 2
+    assert broker.stats()['entries'] == 0
+
+
+def test_invalidate_user_or_all():
+    ts = FakeTokenServer()
+    broker = TrustedAuthTokenBroker(ts, secret_key='secret')
+    jane = broker.full_token(username='jane')
+    broker.object_token(username='jane', object_id='lb-1')
+    joe = broker.full_token(username='joe')
+    broker.invalidate('jane')
+    assert broker.stats()['entries'] == 1
+    assert broker.full_token(username='joe') == joe
+    assert broker.full_token(username='jane') != jane
+    broker.invalidate()
+    assert broker.stats()['entries'] == 0